@@ -2,7 +2,7 @@
 # FlashGBX
 # Author: Lesserkuma (github.com/lesserkuma)
 
-import sys, os, glob, re, json, zlib, argparse, zipfile, traceback, platform, datetime, copy
+import sys, os, glob, re, json, zlib, argparse, zipfile, traceback, platform, datetime
 from . import Util
 
 def ReadConfigFiles(args):
@@ -58,25 +58,55 @@ def LoadConfig(args):
 			print("WARNING: {:s} not found. This is required to load new flash cartridge type configurations after updating.".format(app_path + "/res/config.zip"))
 	
 	# Read flash cart types
+	fc_cache = LoadFlashCartCache(config_path)
+	fc_cache_new = {}
 	for file in fc_files:
 		if os.path.exists(file):
-			with open(file, encoding='utf-8') as f:
-				data = f.read()
-				specs_int = re.sub("(0x[0-9A-F]+)", lambda m: str(int(m.group(1), 16)), data) # hex numbers to int numbers, otherwise not valid json
-				try:
-					specs = json.loads(specs_int)
-				except:
-					ret.append([2, "The flashchip type file “{:s}” could not be parsed and needs to be fixed before it can be used.".format(os.path.basename(file))])
-					continue
-				if "names" not in specs: continue
-				for name in specs["names"]:
-					if not specs["type"] in flashcarts: continue # only DMG and AGB are supported right now
-					temp = copy.deepcopy(specs)
-					temp["names"] = [name]
-					flashcarts[specs["type"]][name] = temp
+			stat = os.stat(file)
+			fc_key = [ stat.st_mtime_ns, stat.st_size ]
+			fc_name = os.path.basename(file)
+			if fc_name in fc_cache and fc_cache[fc_name][0] == fc_key:
+				specs = fc_cache[fc_name][1]
+			else:
+				with open(file, encoding='utf-8') as f:
+					data = f.read()
+					specs_int = re.sub("(0x[0-9A-F]+)", lambda m: str(int(m.group(1), 16)), data) # hex numbers to int numbers, otherwise not valid json
+					try:
+						specs = json.loads(specs_int)
+					except:
+						specs = None
+			fc_cache_new[fc_name] = [ fc_key, specs ]
+			if specs is None:
+				ret.append([2, "The flashchip type file “{:s}” could not be parsed and needs to be fixed before it can be used.".format(fc_name)])
+				continue
+			if "names" not in specs: continue
+			for name in specs["names"]:
+				if not specs["type"] in flashcarts: continue # only DMG and AGB are supported right now
+				temp = dict(specs) # aliases share the nested definition data, which is treated as read-only
+				temp["names"] = [name]
+				flashcarts[specs["type"]][name] = temp
+	
+	if fc_cache_new.keys() != fc_cache.keys() or any(fc_cache_new[k][0] != fc_cache[k][0] for k in fc_cache_new):
+		SaveFlashCartCache(config_path, fc_cache_new)
 	
 	return { "flashcarts":flashcarts, "config_ret":ret }
 
+def LoadFlashCartCache(config_path):
+	try:
+		with open(config_path + "/fc_cache.json", "rb") as f:
+			cache = json.loads(f.read().decode("UTF-8"))
+		if not isinstance(cache, dict) or cache["version"] != Util.VERSION or not isinstance(cache["files"], dict): return {}
+		return { k:v for (k, v) in cache["files"].items() if isinstance(v, list) and len(v) == 2 }
+	except (OSError, ValueError, KeyError):
+		return {}
+
+def SaveFlashCartCache(config_path, files):
+	try:
+		with open(config_path + "/fc_cache.json", "wb") as f:
+			f.write(json.dumps({ "version":Util.VERSION, "files":files }).encode("UTF-8"))
+	except OSError:
+		print("WARNING: Couldn’t write the flash cartridge type cache file.")
+
 class ArgParseCustomFormatter(argparse.ArgumentDefaultsHelpFormatter, argparse.RawDescriptionHelpFormatter): pass
 def main(portableMode=False):
 	if platform.system() == "Windows":
@@ -144,12 +174,15 @@ def main(portableMode=False):
 	ap_cli2.add_argument("--prefer-chip-erase", action="store_true", help="prefer full chip erase over sector erase when both available")
 	ap_cli2.add_argument("--force-5v", action="store_true", help="force 5V when writing Game Boy flash cartridges")
 	ap_cli2.add_argument("--no-verify-write", action="store_true", help="do not verify written data")
+	ap_cli2.add_argument("--compare-sectors", action="store_true", help="only write ROM and save data chunks that differ from the cartridge")
+	ap_cli2.add_argument("--full-detect", action="store_true", help="ignore cached cartridge detection results and run the full detection")
 	ap_cli2.add_argument("--generate-dump-report", action="store_true", help="generate dump reports when making a ROM backup")
 	ap_cli2.add_argument("--save-filename-add-datetime", action="store_true", help="adds a timestamp to the file name of save data backups")
 	ap_cli2.add_argument("--gbcamera-palette", choices=["grayscale", "dmg", "sgb", "cgb1", "cgb2", "cgb3"], type=str.lower, default="grayscale", help="sets the palette of pictures extracted from Game Boy Camera saves")
 	ap_cli2.add_argument("--gbcamera-outfile-format", choices=["png", "bmp", "gif", "jpg"], type=str.lower, default="png", help="sets the file format of saved pictures extracted from Game Boy Camera saves")
 	ap_cli2.add_argument("--device-port", help="override device port", default=None)
 	ap_cli2.add_argument("--device-limit-baudrate", action="store_true", help="limit connection to a slower baud rate")
+	ap_cli2.add_argument("--all-devices", action="store_true", help="run the selected action on all connected devices at the same time")
 	args = parser.parse_args()
 	
 	if "appdata" in cp:
@@ -2,7 +2,7 @@
 # FlashGBX
 # Author: Lesserkuma (github.com/lesserkuma)
 
-import datetime, shutil, platform, os, math, traceback, re, time, serial, zipfile
+import datetime, shutil, platform, os, sys, math, traceback, re, time, serial, zipfile, threading, copy
 try:
 	# pylint: disable=import-error
 	import readline
@@ -19,6 +19,46 @@ from . import Util
 from . import hw_GBxCartRW, hw_GBFlash, hw_JoeyJr
 hw_devices = [hw_GBxCartRW, hw_GBFlash, hw_JoeyJr]
 
+class WorkerConsole():
+	STDOUT = None
+	STDIN = None
+	TARGETS = {}
+	MUTEX = None
+
+	def __init__(self, stdout, stdin):
+		self.STDOUT = stdout
+		self.STDIN = stdin
+		self.TARGETS = {}
+		self.MUTEX = threading.Lock()
+	
+	def Register(self, target):
+		with self.MUTEX:
+			self.TARGETS[threading.get_ident()] = target
+	
+	def Unregister(self):
+		with self.MUTEX:
+			self.TARGETS.pop(threading.get_ident(), None)
+	
+	def GetTarget(self):
+		with self.MUTEX:
+			return self.TARGETS.get(threading.get_ident())
+	
+	def write(self, text):
+		target = self.GetTarget()
+		if target is None: return self.STDOUT.write(text)
+		text = re.sub(r"\x1b\[[0-9;]*[A-Za-z]", "", text).replace("\r", "\n")
+		return target.write(text)
+	
+	def flush(self):
+		target = self.GetTarget()
+		if target is None: return self.STDOUT.flush()
+		return target.flush()
+	
+	def readline(self):
+		# Workers can’t be answered interactively, so every prompt gets its default answer
+		if self.GetTarget() is None: return self.STDIN.readline()
+		return "\n"
+
 class FlashGBX_CLI():
 	ARGS = {}
 	CONFIG_PATH = ""
@@ -28,6 +68,8 @@ class FlashGBX_CLI():
 	PROGRESS = None
 	FWUPD_R = False
 	INI = None
+	STATUS = None
+	FILE_SUFFIX = ""
 
 	def __init__(self, args):
 		self.ARGS = args
@@ -76,8 +118,11 @@ class FlashGBX_CLI():
 		else:
 			self.ARGS["called_with_args"] = True
 		
+		if args.all_devices:
+			return self.RunAllDevices(args)
+		
 		if args.action is None or args.action not in ("gbcamera-extract", "fwupdate-gbxcartrw", "fwupdate-gbflash", "fwupdate-joeyjr"):
-			if not self.FindDevices(port=args.device_port):
+			if self.DEVICE is None and not self.FindDevices(port=args.device_port):
 				print("No devices found.")
 				return
 			else:
@@ -222,6 +267,10 @@ class FlashGBX_CLI():
 			msg = "\n\n"
 			msg += args["msg"]
 			msg += "\n\nPress ENTER or RETURN to continue.\n"
+			if self.STATUS is not None:
+				print(msg)
+				self.CONN.USER_ANSWER = False
+				return
 			answer = input(msg).strip().lower()
 			if len(answer.strip()) != 0:
 				self.CONN.USER_ANSWER = False
@@ -231,6 +280,10 @@ class FlashGBX_CLI():
 	def UpdateProgress(self, args):
 		if args is None: return
 		
+		if self.STATUS is not None:
+			self.UpdateStatus(args)
+			if "action" in args and args["action"] in ("PROGRESS", "ERASE", "UNLOCK", "SECTOR_ERASE"): return
+		
 		if "error" in args:
 			print("{:s}{:s}{:s}".format(ANSI.RED, args["error"], ANSI.RESET))
 			return
@@ -260,6 +313,8 @@ class FlashGBX_CLI():
 				print("\033[KErasing flash sector at address 0x{:X}...".format(args["sector_pos"]), end="\r")
 			elif args["action"] == "UPDATE_RTC":
 				print("\nUpdating Real Time Clock...")
+			elif args["action"] == "UPDATE_INFO":
+				print("{:s}{:s}".format(ANSI.CLEAR_LINE, args["text"]))
 			elif args["action"] == "ERROR":
 				print("{:s}{:s}{:s}{:s}".format(ANSI.CLEAR_LINE, ANSI.RED, args["text"], ANSI.RESET))
 			elif args["action"] == "ABORTING":
@@ -296,6 +351,22 @@ class FlashGBX_CLI():
 				except:
 					pass
 	
+	def UpdateStatus(self, args):
+		if "action" not in args: return
+		if args["action"] == "INITIALIZE":
+			self.STATUS["state"] = "Verifying" if args["method"] in ("ROM_WRITE_VERIFY", "SAVE_WRITE_VERIFY") else "Starting"
+		elif args["action"] == "PROGRESS" and "size" in args and args["size"] > 0:
+			self.STATUS["state"] = "{:d}% {:.2f} KiB/s".format(int(min(1, max(0, args["pos"] / args["size"])) * 100), args["speed"] if "speed" in args else 0)
+		elif args["action"] in ("ERASE", "SECTOR_ERASE"):
+			self.STATUS["state"] = "Erasing"
+		elif args["action"] == "UNLOCK":
+			self.STATUS["state"] = "Unlocking"
+		elif args["action"] == "FINISHED":
+			self.STATUS["result"] = "Done"
+		elif args["action"] == "ABORT":
+			self.STATUS["result"] = "Stopped"
+			if "info_msg" in args: self.STATUS["info"] = args["info_msg"]
+	
 	def FinishOperation(self):
 		time_elapsed = None
 		speed = None
@@ -371,7 +442,7 @@ class FlashGBX_CLI():
 
 		elif self.CONN.INFO["last_action"] == 2: # Backup RAM
 			self.CONN.INFO["last_action"] = 0
-			if not "debug" in self.ARGS and self.CONN.GetMode() == "DMG" and self.CONN.INFO["mapper_raw"] == 252 and self.CONN.INFO["transferred"] == 0x20000 or (self.CONN.INFO["transferred"] == 0x100000 and self.CONN.INFO["dump_info"]["header"]["ram_size_raw"] == 0x204):
+			if self.STATUS is None and not "debug" in self.ARGS and self.CONN.GetMode() == "DMG" and self.CONN.INFO["mapper_raw"] == 252 and self.CONN.INFO["transferred"] == 0x20000 or (self.CONN.INFO["transferred"] == 0x100000 and self.CONN.INFO["dump_info"]["header"]["ram_size_raw"] == 0x204):
 				answer = input("Would you like to extract Game Boy Camera pictures to “{:s}” now? [Y/n]: ".format(Util.formatPathOS(os.path.abspath(os.path.splitext(self.CONN.INFO["last_path"])[0]), end_sep=True) + "IMG_PC**.{:s}".format(self.ARGS["argparsed"].gbcamera_outfile_format))).strip().lower()
 				if answer != "n":
 					if self.CONN.INFO["transferred"] == 0x100000:
@@ -416,28 +487,111 @@ class FlashGBX_CLI():
 	def FindDevices(self, port=None):
 		# pylint: disable=global-variable-not-assigned
 		global hw_devices
-		for hw_device in hw_devices:
-			dev = hw_device.GbxDevice()
-			ret = dev.Initialize(self.FLASHCARTS, port=port, max_baud=1000000 if self.ARGS["argparsed"].device_limit_baudrate else 2000000)
-			if ret is False:
+		(devices, ret) = Util.ProbeDevices(hw_devices, flashcarts=self.FLASHCARTS, port=port, max_baud=1000000 if self.ARGS["argparsed"].device_limit_baudrate else 2000000)
+		if len(ret) > 0: print("\n")
+		for i in range(0, len(ret)):
+			status = ret[i][0]
+			msg = re.sub('<[^<]+?>', '', ret[i][1])
+			if status == 3:
+				print("{:s}{:s}{:s}".format(ANSI.RED, msg.replace("\n\n", "\n"), ANSI.RESET))
 				self.CONN = None
-			elif isinstance(ret, list):
-				if len(ret) > 0: print("\n")
-				for i in range(0, len(ret)):
-					status = ret[i][0]
-					msg = re.sub('<[^<]+?>', '', ret[i][1])
-					if status == 3:
-						print("{:s}{:s}{:s}".format(ANSI.RED, msg.replace("\n\n", "\n"), ANSI.RESET))
-						self.CONN = None
-			
-			if dev.IsConnected():
-				self.DEVICE = (dev.GetFullNameExtended(), dev)
-				dev.Close()
-				break
+		
+		for dev in devices:
+			dev.Close()
+		if len(devices) > 0:
+			self.DEVICE = (devices[0].GetFullNameExtended(), devices[0])
 		
 		if self.DEVICE is None: return False
 		return True
 	
+	def RunAllDevices(self, args):
+		if args.action not in ("info", "backup-rom", "flash-rom", "backup-save", "restore-save", "erase-save") or args.mode is None:
+			print("{:s}Running on all devices requires the “--mode” and “--action” command line switches. Supported actions are info, backup-rom, flash-rom, backup-save, restore-save and erase-save.{:s}".format(ANSI.RED, ANSI.RESET))
+			return
+		if args.action in ("flash-rom", "restore-save") and args.path == "auto":
+			print("{:s}Running on all devices requires the path of the source file.{:s}".format(ANSI.RED, ANSI.RESET))
+			return
+		
+		(devices, _) = Util.ProbeDevices(hw_devices, flashcarts=self.FLASHCARTS, port=args.device_port, max_baud=1000000 if args.device_limit_baudrate else 2000000)
+		for dev in devices:
+			dev.Close()
+		if len(devices) == 0:
+			print("No devices found.")
+			return
+		
+		log_path = Util.CONFIG_PATH + "/logs"
+		os.makedirs(log_path, exist_ok=True)
+		timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+		console = WorkerConsole(sys.stdout, sys.stdin)
+		workers = []
+		for dev in devices:
+			suffix = re.sub(r"[^A-Za-z0-9]", "", os.path.basename(dev.GetPort()))
+			worker_args = dict(self.ARGS)
+			worker_args["argparsed"] = copy.copy(args)
+			worker_args["argparsed"].all_devices = False
+			cli = FlashGBX_CLI(worker_args)
+			cli.DEVICE = (dev.GetFullNameExtended(), dev)
+			cli.FILE_SUFFIX = suffix
+			cli.STATUS = { "name":dev.GetFullNameExtended(), "state":"Waiting", "result":None, "info":None, "log":Util.formatPathOS("{:s}/{:s}_{:s}.log".format(log_path, timestamp, suffix)) }
+			thread = threading.Thread(target=self.RunWorker, args=(cli, console), daemon=True)
+			workers.append((thread, cli))
+		
+		print("Running “{:s}” on {:d} device(s):".format(args.action, len(workers)))
+		for i in range(0, len(workers)):
+			print("[{:d}] {:s}".format(i+1, workers[i][1].STATUS["name"]))
+		print("")
+		
+		sys.stdout = console
+		sys.stdin = console
+		try:
+			for (thread, _) in workers:
+				thread.start()
+			while any(thread.is_alive() for (thread, _) in workers):
+				line = " | ".join("[{:d}] {:s}".format(i+1, workers[i][1].STATUS["state"]) for i in range(0, len(workers)))
+				console.STDOUT.write(ANSI.CLEAR_LINE + line[:shutil.get_terminal_size((80, 20))[0] - 1] + "\r")
+				console.STDOUT.flush()
+				time.sleep(0.5)
+		except KeyboardInterrupt:
+			console.STDOUT.write("\nStopping...\n")
+			for (_, cli) in workers:
+				if cli.CONN is not None: cli.CONN.AbortOperation()
+			for (thread, _) in workers:
+				thread.join()
+		finally:
+			sys.stdout = console.STDOUT
+			sys.stdin = console.STDIN
+		
+		print(ANSI.CLEAR_LINE)
+		for i in range(0, len(workers)):
+			status = workers[i][1].STATUS
+			if status["result"] == "Done":
+				color = ANSI.GREEN
+			elif status["result"] == "Error":
+				color = ANSI.RED
+			else:
+				color = ANSI.YELLOW
+			print("[{:d}] {:s}: {:s}{:s}{:s}".format(i+1, status["name"], color, status["result"], ANSI.RESET))
+			if status["info"] is not None:
+				print("    {:s}".format(status["info"]))
+			print("    Log: {:s}".format(status["log"]))
+		return 0
+	
+	def RunWorker(self, cli, console):
+		with open(cli.STATUS["log"], "w", encoding="UTF-8") as f:
+			console.Register(f)
+			ret = None
+			try:
+				ret = cli.run()
+			except Exception:
+				print(traceback.format_exc())
+				cli.STATUS["result"] = "Error"
+			finally:
+				cli.DisconnectDevice()
+				console.Unregister()
+		if cli.STATUS["result"] is None:
+			cli.STATUS["result"] = "Done" if ret == 0 and cli.ARGS["argparsed"].action == "info" else "Canceled"
+		cli.STATUS["state"] = cli.STATUS["result"]
+	
 	def ConnectDevice(self):
 		dev = self.DEVICE[1]
 		port = dev.GetPort()
@@ -628,7 +782,7 @@ class FlashGBX_CLI():
 		
 		header = self.CONN.ReadInfo()
 		self.ReadCartridge(header)
-		self.CONN._DetectCartridge(args={"limitVoltage":limitVoltage, "checkSaveType":True})
+		self.CONN._DetectCartridge(args={"limitVoltage":limitVoltage, "checkSaveType":True, "forceFull":self.ARGS["argparsed"].full_detect is True})
 		ret = self.CONN.INFO["detect_cart"]
 		(header, _, save_type, save_chip, sram_unstable, cart_types, cart_type_id, cfi_s, _, flash_id, detected_size) = ret
 
@@ -793,6 +947,8 @@ class FlashGBX_CLI():
 				path = args.path
 		
 		if (path == ""): return
+		if self.FILE_SUFFIX != "":
+			path = "{:s}_{:s}{:s}".format(os.path.splitext(path)[0], self.FILE_SUFFIX, os.path.splitext(path)[1])
 		if not args.overwrite and os.path.exists(os.path.abspath(path)):
 			answer = input("The target file “{:s}” already exists.\nDo you want to overwrite it? [y/N]: ".format(os.path.abspath(path))).strip().lower()
 			print("")
@@ -1028,6 +1184,7 @@ class FlashGBX_CLI():
 			args = { "mode":4, "path":"", "buffer":buffer, "cart_type":cart_type, "override_voltage":override_voltage, "prefer_chip_erase":prefer_chip_erase, "fast_read_mode":True, "verify_write":verify_write, "fix_header":fix_header, "fix_bootlogo":fix_bootlogo, "mbc":mbc }
 		else:
 			args = { "mode":4, "path":path, "cart_type":cart_type, "override_voltage":override_voltage, "prefer_chip_erase":prefer_chip_erase, "fast_read_mode":True, "verify_write":verify_write, "fix_header":fix_header, "fix_bootlogo":fix_bootlogo, "mbc":mbc }
+		args["compare_sectors"] = self.ARGS["argparsed"].compare_sectors is True
 		self.CONN.TransferData(signal=self.PROGRESS.SetProgress, args=args)
 
 		buffer = None
@@ -1117,6 +1274,8 @@ class FlashGBX_CLI():
 				path = args.path
 		
 		if (path == ""): return
+		if self.FILE_SUFFIX != "" and args.action == "backup-save":
+			path = "{:s}_{:s}{:s}".format(os.path.splitext(path)[0], self.FILE_SUFFIX, os.path.splitext(path)[1])
 		
 		buffer = None
 		s_mbc = ""
@@ -1192,13 +1351,13 @@ class FlashGBX_CLI():
 			self.CONN.TransferData(args={ 'mode':2, 'path':path, 'mbc':mbc, 'save_type':save_type, 'rtc':rtc }, signal=self.PROGRESS.SetProgress)
 		elif args.action == "restore-save":
 			verify_write = args.no_verify_write is False
-			targs = { 'mode':3, 'path':path, 'mbc':mbc, 'save_type':save_type, 'erase':False, 'rtc':rtc, 'verify_write':verify_write, 'cart_type':cart_type }
+			targs = { 'mode':3, 'path':path, 'mbc':mbc, 'save_type':save_type, 'erase':False, 'rtc':rtc, 'verify_write':verify_write, 'cart_type':cart_type, 'compare_sectors':args.compare_sectors is True }
 			if buffer is not None:
 				targs["buffer"] = buffer
 				targs["path"] = None
 			self.CONN.TransferData(args=targs, signal=self.PROGRESS.SetProgress)
 		elif args.action == "erase-save":
-			self.CONN.TransferData(args={ 'mode':3, 'path':path, 'mbc':mbc, 'save_type':save_type, 'erase':True, 'rtc':rtc, 'cart_type':cart_type }, signal=self.PROGRESS.SetProgress)
+			self.CONN.TransferData(args={ 'mode':3, 'path':path, 'mbc':mbc, 'save_type':save_type, 'erase':True, 'rtc':rtc, 'cart_type':cart_type, 'compare_sectors':args.compare_sectors is True }, signal=self.PROGRESS.SetProgress)
 		elif args.action == "debug-test-save": # debug
 			self.ARGS["debug"] = True
 
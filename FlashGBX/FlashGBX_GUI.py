@@ -203,8 +203,9 @@ class FlashGBX_GUI(QtWidgets.QWidget):
 		self.mnuConfig.addAction("Always &generate ROM dump reports", lambda: self.SETTINGS.setValue("GenerateDumpReports", str(self.mnuConfig.actions()[6].isChecked()).lower().replace("true", "enabled").replace("false", "disabled")))
 		self.mnuConfig.addAction("Use &No-Intro file names", lambda: self.SETTINGS.setValue("UseNoIntroFilenames", str(self.mnuConfig.actions()[7].isChecked()).lower().replace("true", "enabled").replace("false", "disabled")))
 		self.mnuConfig.addAction("Automatic cartridge &power off", lambda: [ self.SETTINGS.setValue("AutoPowerOff", str(self.mnuConfig.actions()[8].isChecked()).lower().replace("true", "350").replace("false", "0")), self.SetAutoPowerOff() ])
-		self.mnuConfig.addAction("Skip writing matching ROM chunk&s", lambda: self.SETTINGS.setValue("CompareSectors", str(self.mnuConfig.actions()[9].isChecked()).lower().replace("true", "enabled").replace("false", "disabled")))
+		self.mnuConfig.addAction("Skip writing matching ROM and save data chunk&s", lambda: self.SETTINGS.setValue("CompareSectors", str(self.mnuConfig.actions()[9].isChecked()).lower().replace("true", "enabled").replace("false", "disabled")))
 		self.mnuConfig.addAction("Alternative address set mode (can fix or cause write errors)", lambda: self.SETTINGS.setValue("ForceWrPullup", str(self.mnuConfig.actions()[10].isChecked()).lower().replace("true", "enabled").replace("false", "disabled")))
+		self.mnuConfig.addAction("Cac&he cartridge detection results", lambda: self.SETTINGS.setValue("DetectionCacheTTL", str(self.mnuConfig.actions()[11].isChecked()).lower().replace("true", str(Util.DETECT_CACHE_TTL)).replace("false", "0")))
 		self.mnuConfig.addSeparator()
 		self.mnuConfigReadModeAGB = QtWidgets.QMenu("&Read Method (Game Boy Advance)")
 		self.mnuConfigReadModeAGB.addAction("S&tream", lambda: [ self.SETTINGS.setValue("AGBReadMethod", str(self.mnuConfigReadModeAGB.actions()[1].isChecked()).lower().replace("true", "2")), self.SetAGBReadMethod() ])
@@ -224,6 +225,7 @@ class FlashGBX_GUI(QtWidgets.QWidget):
 		self.mnuConfig.addMenu(self.mnuConfigReadModeAGB)
 		self.mnuConfig.addSeparator()
 		self.mnuConfig.addAction("Re-&enable suppressed messages", self.ReEnableMessages)
+		self.mnuConfig.addAction("Clear cartridge &detection cache", Util.ClearDetectionCache)
 		self.mnuConfig.actions()[0].setCheckable(True)
 		self.mnuConfig.actions()[1].setCheckable(True)
 		self.mnuConfig.actions()[2].setCheckable(True)
@@ -235,6 +237,7 @@ class FlashGBX_GUI(QtWidgets.QWidget):
 		self.mnuConfig.actions()[8].setCheckable(True)
 		self.mnuConfig.actions()[9].setCheckable(True)
 		self.mnuConfig.actions()[10].setCheckable(True)
+		self.mnuConfig.actions()[11].setCheckable(True)
 		self.mnuConfig.actions()[0].setChecked(self.SETTINGS.value("UpdateCheck") == "enabled")
 		self.mnuConfig.actions()[1].setChecked(self.SETTINGS.value("SaveFileNameAddDateTime", default="disabled") == "enabled")
 		self.mnuConfig.actions()[2].setChecked(self.SETTINGS.value("PreferChipErase", default="disabled") == "enabled")
@@ -246,6 +249,7 @@ class FlashGBX_GUI(QtWidgets.QWidget):
 		self.mnuConfig.actions()[8].setChecked(self.SETTINGS.value("AutoPowerOff", default="350") != "0")
 		self.mnuConfig.actions()[9].setChecked(self.SETTINGS.value("CompareSectors", default="enabled") == "enabled")
 		self.mnuConfig.actions()[10].setChecked(self.SETTINGS.value("ForceWrPullup", default="disabled") == "enabled")
+		self.mnuConfig.actions()[11].setChecked(self.SETTINGS.value("DetectionCacheTTL", default=str(Util.DETECT_CACHE_TTL)) != "0")
 
 		self.mnuThirdParty = QtWidgets.QMenu("Third Party &Notices")
 		self.mnuThirdParty.addAction("About &Qt", lambda: [ QtWidgets.QMessageBox.aboutQt(None) ])
@@ -934,35 +938,21 @@ class FlashGBX_GUI(QtWidgets.QWidget):
 
 		# pylint: disable=global-variable-not-assigned
 		global hw_devices
-		for hw_device in hw_devices:
-			ports = []
-			while True: # for finding other devices of the same type
-				dev = hw_device.GbxDevice()
-				if str(self.SETTINGS.value("LimitBaudRate", default="disabled")).lower() == "enabled":
-					max_baud = 1000000
-				else:
-					max_baud = 2000000
-				ret = dev.Initialize(self.FLASHCARTS, port=port, max_baud=max_baud)
-				if ret is False or dev.CheckActive() is False:
-					self.CONN = None
-					break
-				elif isinstance(ret, list):
-					for i in range(0, len(ret)):
-						status = ret[i][0]
-						msg = ret[i][1]
-						if msg in messages: # don’t show the same message twice
-							continue
-						if status == 3:
-							messages.append(msg)
-							self.CONN = None
-
-				if dev.GetPort() in ports:
-					break
-				ports.append(dev.GetPort())
-				
-				if dev.IsConnected():
-					self.DEVICES[dev.GetFullNameExtended()] = dev
-					if dev.GetPort() in ports: break
+		if str(self.SETTINGS.value("LimitBaudRate", default="disabled")).lower() == "enabled":
+			max_baud = 1000000
+		else:
+			max_baud = 2000000
+		(devices, ret) = Util.ProbeDevices(hw_devices, flashcarts=self.FLASHCARTS, port=port, max_baud=max_baud)
+		for i in range(0, len(ret)):
+			status = ret[i][0]
+			msg = ret[i][1]
+			if msg in messages: # don’t show the same message twice
+				continue
+			if status == 3:
+				messages.append(msg)
+				self.CONN = None
+		for dev in devices:
+			self.DEVICES[dev.GetFullNameExtended()] = dev
 		
 		for dev in self.DEVICES.values():
 			dev.Close()
@@ -2214,6 +2204,7 @@ class FlashGBX_GUI(QtWidgets.QWidget):
 
 			else:
 				args = { "path":path, "mbc":mbc, "save_type":save_type, "rtc":rtc, "rtc_advance":rtc_advance, "erase":erase, "verify_write":verify_write, "cart_type":cart_type }
+				args["compare_sectors"] = self.SETTINGS.value("CompareSectors", default="disabled").lower() == "enabled"
 				if buffer is not None:
 					args["buffer"] = buffer
 					args["path"] = None
@@ -2949,7 +2940,12 @@ class FlashGBX_GUI(QtWidgets.QWidget):
 		
 		if "can_skip_message" not in self.STATUS: self.STATUS["can_skip_message"] = False
 		limitVoltage = str(self.SETTINGS.value("AutoDetectLimitVoltage", default="disabled")).lower() == "enabled"
-		self.CONN.DetectCartridge(fncSetProgress=self.PROGRESS.SetProgress, args={"limitVoltage":limitVoltage, "checkSaveType":checkSaveType})
+		forceFull = QtWidgets.QApplication.keyboardModifiers() == QtCore.Qt.ShiftModifier # hold Shift to bypass the detection cache
+		try:
+			cacheTTL = int(self.SETTINGS.value("DetectionCacheTTL", default=str(Util.DETECT_CACHE_TTL)))
+		except ValueError:
+			cacheTTL = Util.DETECT_CACHE_TTL
+		self.CONN.DetectCartridge(fncSetProgress=self.PROGRESS.SetProgress, args={"limitVoltage":limitVoltage, "checkSaveType":checkSaveType, "forceFull":forceFull, "cacheTTL":cacheTTL})
 	
 	def FinishDetectCartridge(self, ret):
 		self.lblStatus1aResult.setText("–")
@@ -2,8 +2,77 @@
 # FlashGBX
 # Author: Lesserkuma (github.com/lesserkuma)
 
-import time, copy, math, struct
+import time, copy, math, struct, statistics, collections, threading
 from .Util import dprint, bitswap
+from . import Util
+
+ERASE_TIMES = None # observed erase times per chip and sector size, loaded from the config directory on first use
+ERASE_TIMES_LOCK = threading.RLock()
+
+def GetEraseTimes():
+	global ERASE_TIMES
+	with ERASE_TIMES_LOCK:
+		if ERASE_TIMES is None:
+			ERASE_TIMES = { k:collections.deque(v, maxlen=64) for (k, v) in Util.LoadEraseTimes().items() if isinstance(v, list) }
+		return ERASE_TIMES
+
+def SaveEraseTimes():
+	with ERASE_TIMES_LOCK:
+		if ERASE_TIMES is None: return
+		times = { k:list(v) for (k, v) in ERASE_TIMES.items() }
+	Util.SaveEraseTimes(times)
+
+class EraseScheduler:
+	# Decides when to poll the status register while an erase operation is running, based on
+	# the CFI timings of the flash chip and the erase times that were observed before
+	KEY = None
+	TIME_START = 0
+	FIRST_WAIT = 0.05
+	INTERVAL = 0.01
+	MAX_INTERVAL = 0.1
+	TIMEOUT = 5
+	POLLS = 0
+
+	def __init__(self, key, time_avg=None, time_max=None, first_wait=0.05, max_interval=0.1, min_timeout=5):
+		self.KEY = key
+		self.MAX_INTERVAL = max_interval
+		self.POLLS = 0
+		with ERASE_TIMES_LOCK:
+			erase_times = GetEraseTimes()
+			history = list(erase_times[key]) if key in erase_times else None
+		if history:
+			self.FIRST_WAIT = statistics.median(history) * 0.8
+			self.TIMEOUT = max(min_timeout, max(history) * 4)
+		elif time_avg:
+			self.FIRST_WAIT = time_avg / 1000 * 0.8
+			self.TIMEOUT = max(min_timeout, time_max / 1000 * 2 if time_max else 0)
+		else:
+			self.FIRST_WAIT = first_wait
+			self.TIMEOUT = min_timeout
+		self.INTERVAL = min(self.MAX_INTERVAL, max(0.005, self.FIRST_WAIT / 8))
+		self.TIME_START = time.time()
+		dprint("Erase scheduler for {:s}: first poll after {:.3f}s, timeout after {:.1f}s".format(str(key), self.FIRST_WAIT, self.TIMEOUT))
+	
+	def Wait(self):
+		if self.POLLS == 0:
+			time.sleep(self.FIRST_WAIT)
+		else:
+			time.sleep(self.INTERVAL)
+			self.INTERVAL = min(self.MAX_INTERVAL, self.INTERVAL * 1.5)
+		self.POLLS += 1
+	
+	def TimedOut(self):
+		return (time.time() - self.TIME_START) > self.TIMEOUT
+	
+	def Done(self):
+		elapsed = time.time() - self.TIME_START
+		with ERASE_TIMES_LOCK:
+			erase_times = GetEraseTimes()
+			if self.KEY not in erase_times:
+				erase_times[self.KEY] = collections.deque(maxlen=64)
+			erase_times[self.KEY].append(elapsed)
+		dprint("Erase took {:.3f}s after {:d} poll(s)".format(elapsed, self.POLLS))
+		return elapsed
 
 class Flashcart:
 	CONFIG = {}
@@ -17,13 +86,14 @@ class Flashcart:
 	SET_WE_PIN_AUDIO = None
 	DEFAULT_WE = None
 	SECTOR_COUNT = 0
-	SECTOR_POS = 0
 	SECTOR_MAP = None
 	CFI = None
 	LAST_SR = 0x00
+	PROGRAMS = None
 
 	def __init__(self, config=None, fncptr=None):
 		if config is None: config = {}
+		self.PROGRAMS = {}
 		self.CART_WRITE_FNCPTR = fncptr["cart_write_fncptr"]
 		self.CART_WRITE_FAST_FNCPTR = fncptr["cart_write_fast_fncptr"]
 		self.CART_READ_FNCPTR = fncptr["cart_read_fncptr"]
@@ -63,6 +133,54 @@ class Flashcart:
 				value = command[1]
 				self.CART_WRITE_FNCPTR(address, value, flashcart=fast_write, sram=sram)
 	
+	def _parse_address(self, address):
+		# Returns (relative to sector address, offset) for addresses like 0x555, "SA" or "SA+2"
+		if isinstance(address, str):
+			if address == "SA": return (True, 0)
+			if address.startswith("SA+"): return (True, int(address[3:], 0))
+			raise ValueError("Unknown address placeholder “{:s}”".format(address))
+		return (False, address)
+
+	def _resolve_address(self, address, pos=0):
+		(relative, offset) = self._parse_address(address)
+		return pos + offset if relative else offset
+
+	def GetProgram(self, key, wait_key=None):
+		# Compiles a command list from the cartridge definition once, grouping consecutive writes
+		# that use the same WE pin, and splitting it at every command that needs to be waited for
+		if key in self.PROGRAMS: return self.PROGRAMS[key]
+		program = []
+		groups = []
+		for i in range(0, len(self.CONFIG["commands"][key])):
+			command = self.CONFIG["commands"][key][i]
+			we = command[2] if len(command) > 2 else None
+			if command[0] is not None:
+				write = self._parse_address(command[0]) + (command[1],)
+				if len(groups) > 0 and groups[-1][0] == we:
+					groups[-1][1].append(write)
+				else:
+					groups.append([ we, [ write ] ])
+			if wait_key is not None and self.CONFIG["commands"][wait_key][i][0] is not None:
+				program.append((groups, i))
+				groups = []
+		if len(groups) > 0 or len(program) == 0:
+			program.append((groups, None))
+		self.PROGRAMS[key] = program
+		return program
+
+	def RunProgramWrites(self, groups, pos=0):
+		for (we, writes) in groups:
+			if we == "WR":
+				self.SET_WE_PIN_WR()
+			elif we == "AUDIO":
+				self.SET_WE_PIN_AUDIO()
+			self.CartWrite([ [ pos + offset if relative else offset, data ] for (relative, offset, data) in writes ])
+			if we is not None:
+				if self.DEFAULT_WE == "WR":
+					self.SET_WE_PIN_WR()
+				elif self.DEFAULT_WE == "AUDIO":
+					self.SET_WE_PIN_AUDIO()
+
 	def GetCommandSetType(self):
 		return self.CONFIG["_command_set"].upper()
 
@@ -189,12 +307,14 @@ class Flashcart:
 			time.sleep(0.001)
 			if self.Unlock() is False: return False
 		elif full_reset and "reset_every" in self.CONFIG and "flash_size" in self.CONFIG:
+			commands = []
 			for j in range(0, self.CONFIG["flash_size"], self.CONFIG["reset_every"]):
 				if j >= max_address: break
 				dprint("reset_every @ 0x{:X}".format(j))
 				for command in self.CONFIG["commands"]["reset"]:
-					self.CartWrite([[j + command[0], command[1]]])
-					#time.sleep(0.01)
+					commands.append([j + command[0], command[1]])
+			for i in range(0, len(commands), 128):
+				self.CartWrite(commands[i:i+128])
 		elif "reset" in self.CONFIG["commands"]:
 			self.CartWrite(self.CONFIG["commands"]["reset"])
 			#time.sleep(0.001)
@@ -313,162 +433,133 @@ class Flashcart:
 		else:
 			return False
 
+	def _get_erase_scheduler(self, chip_erase=False, sector_size=None):
+		cfi = self.CONFIG["cfi"] if "cfi" in self.CONFIG and isinstance(self.CONFIG["cfi"], dict) else {}
+		name = self.CONFIG["names"][0] if "names" in self.CONFIG else ""
+		if chip_erase:
+			if cfi.get("chip_erase") is not True: cfi = {}
+			return EraseScheduler(key="{:s}/chip".format(name), time_avg=cfi.get("chip_erase_time_avg"), time_max=cfi.get("chip_erase_time_max"), first_wait=0.1, max_interval=0.5, min_timeout=self.CONFIG["chip_erase_timeout"])
+		else:
+			if cfi.get("sector_erase") is not True: cfi = {}
+			if sector_size is None:
+				sector_size = self.CONFIG["sector_size"]
+				if isinstance(sector_size, list): sector_size = sector_size[0][0]
+			return EraseScheduler(key="{:s}/sector/{:s}".format(name, str(sector_size)), time_avg=cfi.get("sector_erase_time_avg"), time_max=cfi.get("sector_erase_time_max"))
+
 	def ChipErase(self):
 		self.Reset(full_reset=True)
 		time_start = time.time()
 		if self.PROGRESS_FNCPTR is not None: self.PROGRESS_FNCPTR({"action":"ERASE", "time_start":time_start, "time_estimated": self.CONFIG["chip_erase_timeout"], "abortable":False})
-		for i in range(0, len(self.CONFIG["commands"]["chip_erase"])):
-			addr = self.CONFIG["commands"]["chip_erase"][i][0]
-			data = self.CONFIG["commands"]["chip_erase"][i][1]
-			if len(self.CONFIG["commands"]["chip_erase"][i]) > 2:
-				we = self.CONFIG["commands"]["chip_erase"][i][2]
-			else:
-				we = None
+		for (groups, i) in self.GetProgram("chip_erase", wait_key="chip_erase_wait_for"):
+			self.RunProgramWrites(groups)
 			
-			if not addr == None:
-				if we == "WR":
-					self.SET_WE_PIN_WR()
-				elif we == "AUDIO":
-					self.SET_WE_PIN_AUDIO()
-				self.CartWrite([[addr, data]])
-				if we is not None:
-					if self.DEFAULT_WE == "WR":
-						self.SET_WE_PIN_WR()
-					elif self.DEFAULT_WE == "AUDIO":
-						self.SET_WE_PIN_AUDIO()
-			
-			time.sleep(0.1)
-			if self.CONFIG["commands"]["chip_erase_wait_for"][i][0] != None:
-				addr = self.CONFIG["commands"]["chip_erase_wait_for"][i][0]
+			if i is None:
+				time.sleep(0.1)
+			else:
+				command = self.CONFIG["commands"]["chip_erase"][i]
+				we = command[2] if len(command) > 2 else None
+				addr = self._resolve_address(self.CONFIG["commands"]["chip_erase_wait_for"][i][0])
 				data = self.CONFIG["commands"]["chip_erase_wait_for"][i][1]
-				timeout = self.CONFIG["chip_erase_timeout"]
+				scheduler = self._get_erase_scheduler(chip_erase=True)
+				first_poll = True
 				while True:
+					scheduler.Wait()
 					if self.PROGRESS_FNCPTR is not None: self.PROGRESS_FNCPTR({"action":"ERASE", "time_start":time_start, "time_estimated": self.CONFIG["chip_erase_timeout"], "abortable":False})
-					if "wait_read_status_register" in self.CONFIG and self.CONFIG["wait_read_status_register"]:
-						for j in range(0, len(self.CONFIG["commands"]["read_status_register"])):
-							sr_data = self.CONFIG["commands"]["read_status_register"][j][1]
-							
-							if we == "WR":
-								self.SET_WE_PIN_WR()
-							elif we == "AUDIO":
-								self.SET_WE_PIN_AUDIO()
-							self.CartWrite([[addr, sr_data]])
-							if we is not None:
-								if self.DEFAULT_WE == "WR":
+					if first_poll:
+						if "wait_read_status_register" in self.CONFIG and self.CONFIG["wait_read_status_register"]:
+							for j in range(0, len(self.CONFIG["commands"]["read_status_register"])):
+								sr_data = self.CONFIG["commands"]["read_status_register"][j][1]
+								
+								if we == "WR":
 									self.SET_WE_PIN_WR()
-								elif self.DEFAULT_WE == "AUDIO":
+								elif we == "AUDIO":
 									self.SET_WE_PIN_AUDIO()
+								self.CartWrite([[addr, sr_data]])
+								if we is not None:
+									if self.DEFAULT_WE == "WR":
+										self.SET_WE_PIN_WR()
+									elif self.DEFAULT_WE == "AUDIO":
+										self.SET_WE_PIN_AUDIO()
+						self.CartRead(addr, 2) # dummy read (fixes some bootlegs)
+						first_poll = False
 					
-					self.CartRead(addr, 2) # dummy read (fixes some bootlegs)
 					wait_for = struct.unpack("<H", self.CartRead(addr, 2))[0]
 					self.LAST_SR = wait_for
 					dprint("Status Register Check: 0x{:X} & 0x{:X} == 0x{:X}? {:s}".format(wait_for, self.CONFIG["commands"]["chip_erase_wait_for"][i][2], data, str((wait_for & self.CONFIG["commands"]["chip_erase_wait_for"][i][2]) == data)))
 					wait_for = wait_for & self.CONFIG["commands"]["chip_erase_wait_for"][i][2]
-					if wait_for == data: break
-					time.sleep(0.5)
-					timeout -= 0.5
-					if timeout <= 0:
+					if wait_for == data:
+						scheduler.Done()
+						break
+					if scheduler.TimedOut():
 						self.PROGRESS_FNCPTR({"action":"ABORT", "info_type":"msgbox_critical", "info_msg":"Erasing the flash chip timed out. The last status register value was 0x{:X}.\n\nPlease make sure that the cartridge contacts are clean, and that the selected cartridge type and settings are correct.".format(self.LAST_SR), "abortable":False})
 						return False
 		self.Reset(full_reset=True)
 		return True
 
-	def SectorErase(self, pos=0, buffer_pos=0, skip=False):
+	def SectorErase(self, pos=0, buffer_pos=0, skip=False, sector_size=None):
 		if not skip:
 			self.Reset(full_reset=False)
 			if "sector_erase" not in self.CONFIG["commands"]: return False
 			if "sector_size" not in self.CONFIG: return False
-			for i in range(0, len(self.CONFIG["commands"]["sector_erase"])):
-				addr = self.CONFIG["commands"]["sector_erase"][i][0]
-				data = self.CONFIG["commands"]["sector_erase"][i][1]
-				if len(self.CONFIG["commands"]["sector_erase"][i]) > 2:
-					we = self.CONFIG["commands"]["sector_erase"][i][2]
-				else:
-					we = None
-				
-				if addr == "SA": addr = pos
-				if addr == "SA+1": addr = pos + 1
-				if addr == "SA+2": addr = pos + 2
-				if addr == "SA+16384": addr = pos + 0x4000
-				if addr == "SA+28672": addr = pos + 0x7000
-				if addr == "SA+66": addr = pos + 0x42
-				if addr == "SA+132": addr = pos + 0x84
-				if not addr == None:
-					if we == "WR":
-						self.SET_WE_PIN_WR()
-					elif we == "AUDIO":
-						self.SET_WE_PIN_AUDIO()
-					self.CartWrite([[addr, data]])
-					if we is not None:
-						if self.DEFAULT_WE == "WR":
-							self.SET_WE_PIN_WR()
-						elif self.DEFAULT_WE == "AUDIO":
-							self.SET_WE_PIN_AUDIO()
+			for (groups, i) in self.GetProgram("sector_erase", wait_key="sector_erase_wait_for"):
+				self.RunProgramWrites(groups, pos=pos)
 				
-				if self.CONFIG["commands"]["sector_erase_wait_for"][i][0] != None:
-					addr = self.CONFIG["commands"]["sector_erase_wait_for"][i][0]
+				if i is not None:
+					command = self.CONFIG["commands"]["sector_erase"][i]
+					we = command[2] if len(command) > 2 else None
+					addr = self._resolve_address(self.CONFIG["commands"]["sector_erase_wait_for"][i][0], pos=pos)
 					data = self.CONFIG["commands"]["sector_erase_wait_for"][i][1]
-					if addr == "SA": addr = pos
-					if addr == "SA+1": addr = pos + 1
-					if addr == "SA+2": addr = pos + 2
-					if addr == "SA+16384": addr = pos + 0x4000
-					if addr == "SA+28672": addr = pos + 0x7000
-					if addr == "SA+66": addr = pos + 0x42
-					if addr == "SA+132": addr = pos + 0x84
-					time.sleep(0.05)
-					timeout = 100
+					scheduler = self._get_erase_scheduler(sector_size=sector_size)
+					first_poll = True
 					while True:
-						if "wait_read_status_register" in self.CONFIG and self.CONFIG["wait_read_status_register"] == True:
-							for j in range(0, len(self.CONFIG["commands"]["read_status_register"])):
-								sr_addr = self.CONFIG["commands"]["read_status_register"][j][0]
-								sr_data = self.CONFIG["commands"]["read_status_register"][j][1]
+						scheduler.Wait()
+						if first_poll:
+							if "wait_read_status_register" in self.CONFIG and self.CONFIG["wait_read_status_register"] == True:
+								for j in range(0, len(self.CONFIG["commands"]["read_status_register"])):
+									sr_addr = self.CONFIG["commands"]["read_status_register"][j][0]
+									sr_data = self.CONFIG["commands"]["read_status_register"][j][1]
 
-								if we == "WR":
-									self.SET_WE_PIN_WR()
-								elif we == "AUDIO":
-									self.SET_WE_PIN_AUDIO()
-								self.CartWrite([[sr_addr, sr_data]])
-								if we is not None:
-									if self.DEFAULT_WE == "WR":
+									if we == "WR":
 										self.SET_WE_PIN_WR()
-									elif self.DEFAULT_WE == "AUDIO":
+									elif we == "AUDIO":
 										self.SET_WE_PIN_AUDIO()
+									self.CartWrite([[sr_addr, sr_data]])
+									if we is not None:
+										if self.DEFAULT_WE == "WR":
+											self.SET_WE_PIN_WR()
+										elif self.DEFAULT_WE == "AUDIO":
+											self.SET_WE_PIN_AUDIO()
+							
+							temp = self.CartRead(addr, 2) # dummy read (fixes some bootlegs)
+							if len(temp) != 2:
+								dprint("Communication error 1 in SectorErase():", temp)
+								return False
+							first_poll = False
 						
-						self.CartRead(addr, 2) # dummy read (fixes some bootlegs)
-						temp = self.CartRead(addr, 2)
-						if len(temp) != 2:
-							dprint("Communication error 1 in SectorErase():", temp)
-							return False
 						wait_for = self.CartRead(addr, 2)
 						if len(wait_for) != 2:
-							dprint("Communication error 2 in SectorErase():", temp)
+							dprint("Communication error 2 in SectorErase():", wait_for)
 							return False
 						wait_for = struct.unpack("<H", wait_for)[0]
 						self.LAST_SR = wait_for
 						dprint("Status Register Check: 0x{:X} & 0x{:X} == 0x{:X}? {:s}".format(wait_for, self.CONFIG["commands"]["sector_erase_wait_for"][i][2], data, str(wait_for & self.CONFIG["commands"]["sector_erase_wait_for"][i][2] == data)))
 						wait_for = wait_for & self.CONFIG["commands"]["sector_erase_wait_for"][i][2]
-						time.sleep(0.05)
-						timeout -= 1
-						if timeout < 1:
+						if wait_for == data:
+							scheduler.Done()
+							break
+						if scheduler.TimedOut():
 							dprint(f"Timeout error in SectorErase(): 0x{self.LAST_SR:X}")
 							#self.PROGRESS_FNCPTR({"action":"ABORT", "info_type":"msgbox_critical", "info_msg":"The sector erase attempt timed out. The last status register value was 0x{:X}.\n\nPlease make sure that the cartridge contacts are clean, and that the selected cartridge type and settings are correct.".format(self.LAST_SR), "abortable":False})
 							return False
-						if wait_for == data: break
 						self.PROGRESS_FNCPTR({"action":"SECTOR_ERASE", "sector_pos":buffer_pos, "time_start":time.time(), "abortable":True})
 					dprint("Done waiting!")
 
 			self.Reset(full_reset=False)
 		
-		if isinstance(self.CONFIG["sector_size"], list):
-			self.CONFIG["sector_size"][self.SECTOR_POS][1] -= 1
-			if (self.CONFIG["sector_size"][self.SECTOR_POS][1] == 0) and (len(self.CONFIG["sector_size"]) > self.SECTOR_POS + 1):
-				self.SECTOR_POS += 1
-			try:
-				sector_size = self.CONFIG["sector_size"][self.SECTOR_POS][0]
-			except:
-				dprint("Warning: Sector map is smaller than expected.")
-				self.SECTOR_POS -= 1
+		if sector_size is not None:
 			return sector_size
+		elif isinstance(self.CONFIG["sector_size"], list):
+			return self.CONFIG["sector_size"][0][0]
 		else:
 			return self.CONFIG["sector_size"]
 	
@@ -633,10 +724,10 @@ class CFI:
 		return info
 
 class Flashcart_AGB_GBAMP(Flashcart):
-	def SectorErase(self, pos=0, buffer_pos=0, skip=False):
+	def SectorErase(self, pos=0, buffer_pos=0, skip=False, sector_size=None):
 		for i in range(0, 4):
 			sector = pos >> 13 << 16 | (pos & 0x1FFF) + (i * 4)
-			ret = super().SectorErase(sector, buffer_pos, skip)
+			ret = super().SectorErase(sector, buffer_pos, skip, sector_size)
 			if ret is False: break
 		return ret
 
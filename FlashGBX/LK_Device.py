@@ -2,14 +2,14 @@
 # FlashGBX
 # Author: Lesserkuma (github.com/lesserkuma)
 
-import time, math, struct, traceback, zlib, copy, hashlib, os, datetime, platform, json, base64
+import time, math, struct, traceback, zlib, copy, hashlib, os, datetime, platform, json
 import serial, serial.tools.list_ports
 from serial import SerialException
 from abc import ABC, abstractmethod
 from .RomFileDMG import RomFileDMG
 from .RomFileAGB import RomFileAGB
 from .Mapper import DMG_MBC, AGB_GPIO
-from .Flashcart import Flashcart, Flashcart_DMG_MMSA, Flashcart_AGB_GBAMP, Flashcart_DMG_BUNG_16M
+from .Flashcart import Flashcart, Flashcart_DMG_MMSA, Flashcart_AGB_GBAMP, Flashcart_DMG_BUNG_16M, SaveEraseTimes
 from .Util import ANSI, dprint, bitswap, ParseCFI
 from .GBMemory import GBMemoryMap
 from . import Util
@@ -19,10 +19,16 @@ class LK_Device(ABC):
 	DEVICE_MIN_FW = 0
 	DEVICE_MAX_FW = 0
 	DEVICE_LATEST_FW_TS = {}
+	DEVICE_USB_IDS = []
 	PCB_VERSIONS = {}
 	BAUDRATE = 1000000
 	MAX_BUFFER_READ = 0x2000
 	MAX_BUFFER_WRITE = 0x400
+	READ_PIPELINE_DEPTH = 4
+	READ_SIZE_CTRL = None
+	WRITE_SIZE_CTRL = None
+	TRANSFER_SIZES_KEY = None
+	TRANSFER_SIZES_SAVED = None
 	
 	DEVICE_CMD = {
 		"NULL":0x30,
@@ -123,6 +129,13 @@ class LK_Device(ABC):
 	FW = {}
 	FW_UPDATE_REQ = False
 	FW_VAR = {}
+	FW_VAR_HITS = 0
+	FW_VAR_MISSES = 0
+	WRITE_CHUNKS = 0
+	WRITE_TIME_HOST = 0
+	WRITE_TIME_DEVICE = 0
+	FW_VAR_VOLATILE = ( "ADDRESS", "DMG_ROM_BANK", "STATUS_REGISTER", "LAST_BANK_ACCESSED", "CART_MODE", "CART_POWERED" ) # changed by the firmware itself
+	FW_VAR_RESET_CMDS = ( "SET_MODE_AGB", "SET_MODE_DMG", "DMG_MBC_RESET", "CART_PWR_ON", "CART_PWR_OFF", "SET_VAR_STATE", "OFW_CART_PWR_ON", "OFW_CART_PWR_OFF", "OFW_CART_MODE", "OFW_GB_CART_MODE" )
 	MODE = None
 	PORT = ''
 	DEVICE = None
@@ -149,7 +162,21 @@ class LK_Device(ABC):
 	USER_ANSWER = None
 	
 	def __init__(self):
-		pass
+		# Mutable state must not be shared between instances, so that several devices can be used at the same time
+		self.SUPPORTED_CARTS = {}
+		self.FW = {}
+		self.FW_VAR = {}
+		self.FW_VAR_HITS = 0
+		self.FW_VAR_MISSES = 0
+		self.INFO = { "action":None, "last_action":None, "dump_info":{} }
+		self.ERROR = False
+		self.ERROR_ARGS = {}
+		self.CANCEL = False
+		self.CANCEL_ARGS = {}
+		self.READ_SIZE_CTRL = None
+		self.WRITE_SIZE_CTRL = None
+		self.TRANSFER_SIZES_KEY = None
+		self.TRANSFER_SIZES_SAVED = None
 	
 	@abstractmethod
 	def Initialize(self, flashcarts, port=None, max_baud=2000000):
@@ -238,6 +265,13 @@ class LK_Device(ABC):
 		else:
 			return False
 
+	def GetCandidatePorts(self):
+		ports = []
+		for comport in serial.tools.list_ports.comports():
+			if (comport.vid, comport.pid) in self.DEVICE_USB_IDS:
+				ports.append(comport.device)
+		return ports
+
 	def TryConnect(self, port, baudrate):
 		dprint("Trying to connect to {:s} at baud rate {:d} ({:s})".format(port, baudrate, type(self).__module__))
 		try:
@@ -246,6 +280,7 @@ class LK_Device(ABC):
 			dprint(f"Couldn’t connect to port {port:s} at baudrate {baudrate:d}:", e)
 			return False
 		self.DEVICE = dev
+		self.InvalidateFirmwareVariables()
 		check = self.LoadFirmwareVersion()
 		self.DEVICE = None
 		dev.close()
@@ -335,9 +370,9 @@ class LK_Device(ABC):
 				if cartPowerOff and self.CanPowerCycleCart():
 					self._set_fw_variable("AUTO_POWEROFF_TIME", 0)
 					if self.FW["fw_ver"] >= 12:
-						self._write(self.DEVICE_CMD["CART_PWR_OFF"], wait=True)
+						self._write_cmd("CART_PWR_OFF", wait=True)
 					else:
-						self._write(self.DEVICE_CMD["OFW_CART_PWR_OFF"], wait=False)
+						self._write_cmd("OFW_CART_PWR_OFF", wait=False)
 				else:
 					self._write(self.DEVICE_CMD["SET_VOLTAGE_3_3V"], wait=self.FW["fw_ver"] >= 12)
 				self.DEVICE.close()
@@ -426,6 +461,7 @@ class LK_Device(ABC):
 				return ack
 			retries -= 1
 			dprint("Retries left:", retries)
+			self.InvalidateFirmwareVariables()
 			
 			hp = 20
 			temp = 0
@@ -464,6 +500,11 @@ class LK_Device(ABC):
 		
 		if wait: return self.wait_for_ack()
 	
+	def _write_cmd(self, name, wait=False):
+		# Commands that reset the firmware state also clear the cached variable values
+		if name in self.FW_VAR_RESET_CMDS: self.InvalidateFirmwareVariables()
+		return self._write(self.DEVICE_CMD[name], wait=wait)
+	
 	def _read(self, count):
 		if self.DEVICE.in_waiting > 1000: dprint("Warning: in_waiting={:d} bytes".format(self.DEVICE.in_waiting))
 		buffer = self.DEVICE.read(count)
@@ -485,6 +526,7 @@ class LK_Device(ABC):
 			dprint("Timeout value:", self.DEVICE.timeout)
 			dprint("Traceback:\n", ''.join(traceback.format_stack()[:-1]))
 			self.READ_ERRORS += 1
+			self.InvalidateFirmwareVariables()
 			while self.DEVICE.in_waiting > 0:
 				self.DEVICE.reset_input_buffer()
 				time.sleep(0.5)
@@ -496,6 +538,39 @@ class LK_Device(ABC):
 		else:
 			return bytearray(buffer)
 
+	def _readinto(self, view):
+		count = len(view)
+		if self.DEVICE.in_waiting > 1000: dprint("Warning: in_waiting={:d} bytes".format(self.DEVICE.in_waiting))
+		received = self.DEVICE.readinto(view)
+
+		if received != count:
+			hp = 50
+			while (self.DEVICE.in_waiting != (count - received)) and hp > 0:
+				time.sleep(0.01)
+				hp -= 1
+			if hp > 0:
+				received += self.DEVICE.readinto(view[received:])
+		
+		if received != count:
+			tb_stack = traceback.extract_stack()
+			stack = tb_stack[len(tb_stack)-2] # caller only
+			dprint("Error: Received only {:d} of {:d} byte(s) ({:s}(), line {:d})".format(received, count, stack.name, stack.lineno))
+			dprint("Timeout value:", self.DEVICE.timeout)
+			self.READ_ERRORS += 1
+			self.InvalidateFirmwareVariables()
+			while self.DEVICE.in_waiting > 0:
+				self.DEVICE.reset_input_buffer()
+				time.sleep(0.5)
+			self.DEVICE.reset_output_buffer()
+			return False
+		
+		return received
+
+	def _discard_pending_reads(self, pending, length):
+		dprint("Discarding responses of {:d} pending read command(s)".format(pending))
+		self.DEVICE.read(pending * length)
+		self.DEVICE.reset_input_buffer()
+
 	def _get_fw_variable(self, key):
 		if self.FW["fw_ver"] < 10: return 0
 		dprint("Getting firmware variable {:s}".format(key))
@@ -521,31 +596,127 @@ class LK_Device(ABC):
 			dprint("Communication error:", temp)
 			return False
 
-	def _set_fw_variable(self, key, value):
-		# if key == "FLASH_WE_PIN" and not self.SupportsAudioAsWe(): return
-		dprint("Setting firmware variable {:s} to 0x{:X}".format(key, value))
-		self.FW_VAR[key] = value
+	def _get_transfer_size_key(self):
+		key = "{:s}_{:s}_{:d}_{:s}".format(str(self.FW["pcb_name"]), str(self.FW["pcb_ver"]), self.FW["fw_ver"], str(self.PORT))
+		return "TransferSize_" + "".join(c if c.isalnum() else "_" for c in key)
 
+	def GetSaveTransferSizes(self):
+		# Save data can be transferred in full device buffers since firmware L12; older firmware keeps the previous fixed sizes
+		if self.FW["fw_ver"] >= 12:
+			return (self.MAX_BUFFER_READ, self.MAX_BUFFER_WRITE)
+		return (64, 256)
+
+	def LoadTransferSizes(self):
+		read_size = self.MAX_BUFFER_READ
+		write_size = self.MAX_BUFFER_WRITE
+		self.TRANSFER_SIZES_KEY = self._get_transfer_size_key()
+		if Util.CONFIG_PATH != "":
+			sizes = Util.GetTransferSizes(self.TRANSFER_SIZES_KEY)
+			if sizes is not None: (read_size, write_size) = sizes
+		self.READ_SIZE_CTRL = Util.TransferSizeController(read_size, self.MAX_BUFFER_READ)
+		self.WRITE_SIZE_CTRL = Util.TransferSizeController(write_size, self.MAX_BUFFER_WRITE)
+		self.TRANSFER_SIZES_SAVED = (self.READ_SIZE_CTRL.SIZE, self.WRITE_SIZE_CTRL.SIZE)
+		dprint("Transfer sizes: read=0x{:X}, write=0x{:X}".format(self.READ_SIZE_CTRL.SIZE, self.WRITE_SIZE_CTRL.SIZE))
+
+	def SaveTransferSizes(self):
+		if self.READ_SIZE_CTRL is None or self.WRITE_SIZE_CTRL is None or Util.CONFIG_PATH == "": return
+		sizes = (self.READ_SIZE_CTRL.SIZE, self.WRITE_SIZE_CTRL.SIZE)
+		if sizes == self.TRANSFER_SIZES_SAVED: return
+		Util.SetTransferSizes(self.TRANSFER_SIZES_KEY, sizes)
+		self.TRANSFER_SIZES_SAVED = sizes
+
+	def InvalidateFirmwareVariables(self):
+		self.FW_VAR = {}
+
+	def GetFirmwareVariableStats(self):
+		return { "hits":self.FW_VAR_HITS, "misses":self.FW_VAR_MISSES }
+
+	def GetWriteTimingStats(self):
+		return { "chunks":self.WRITE_CHUNKS, "host":self.WRITE_TIME_HOST, "device":self.WRITE_TIME_DEVICE }
+
+	def _get_fw_variable_packet(self, key, value):
 		size = 0
 		for (k, v) in self.DEVICE_VAR.items():
 			if key in k:
 				if v[0] == 8: size = 1
 				elif v[0] == 16: size = 2
 				elif v[0] == 32: size = 4
+				name = k
 				key = v[1]
 				break
 		if size == 0:
 			raise KeyError("Unknown variable name specified.")
 		
+		# Skip the round-trip if the device already holds this value
+		if name not in self.FW_VAR_VOLATILE and self.FW_VAR.get(name) == value:
+			self.FW_VAR_HITS += 1
+			return (name, None)
+		self.FW_VAR_MISSES += 1
+		dprint("Setting firmware variable {:s} to 0x{:X}".format(name, value))
+		self.FW_VAR[name] = value
+
 		buffer = bytearray([self.DEVICE_CMD["SET_VARIABLE"], size])
 		buffer.extend(struct.pack(">I", key))
 		buffer.extend(struct.pack(">I", value))
+		return (name, buffer)
+
+	def _set_fw_variable(self, key, value):
+		# if key == "FLASH_WE_PIN" and not self.SupportsAudioAsWe(): return
+		(name, buffer) = self._get_fw_variable_packet(key, value)
+		if buffer is None: return True
 
 		if self.FW["fw_ver"] >= 12:
-			return self._try_write(buffer)
+			ret = self._try_write(buffer)
 		else:
-			return self._write(buffer)
+			ret = self._write(buffer)
+		if ret is False: self.FW_VAR.pop(name, None)
+		return ret
+	
+	# ↓↓↓ Transactions: variable sets and commands sent in one write, acks checked in one read
+	def _tx_begin(self):
+		return { "buffer":bytearray(), "acks":0, "items":[] }
+
+	def _tx_set_fw_variable(self, tx, key, value):
+		(name, buffer) = self._get_fw_variable_packet(key, value)
+		if buffer is None: return
+		tx["buffer"].extend(buffer)
+		tx["items"].append(["SET_VARIABLE", name, value])
+		if self.FW["fw_ver"] >= 12: tx["acks"] += 1
+
+	def _tx_write(self, tx, data, wait=False):
+		if not isinstance(data, bytearray):
+			data = bytearray([data])
+		tx["buffer"].extend(data)
+		tx["items"].append(["WRITE", data, wait])
+		if wait: tx["acks"] += 1
+
+	def _tx_commit(self, tx):
+		if len(tx["items"]) == 0: return True
+		self._write(tx["buffer"])
+		if tx["acks"] == 0: return True
+		temp = self._read(tx["acks"])
+		if isinstance(temp, int): temp = bytearray([temp])
+		if temp is not False and len(temp) == tx["acks"] and all(ack in (0x01, 0x03) for ack in temp):
+			return True
 		
+		dprint("Transaction of {:d} item(s) failed (response: {:s})".format(len(tx["items"]), str(temp)))
+		self.DEVICE.reset_input_buffer()
+		self.InvalidateFirmwareVariables()
+		if any(item[0] == "WRITE" for item in tx["items"]):
+			# Commands may have been executed already, so they can’t be repeated safely
+			if "from_user" in self.CANCEL_ARGS and self.CANCEL_ARGS["from_user"]: return False
+			self.CANCEL_ARGS.update({"info_type":"msgbox_critical", "info_msg":"A communication error has occured while sending commands to the cartridge (response = {:s}). Please make sure that the cartridge contacts are clean, re-connect the device and try again from the beginning.".format(str(temp))})
+			self.CANCEL = True
+			self.ERROR = True
+			return False
+		
+		# Fall back to setting the variables step by step
+		for item in tx["items"]:
+			ret = self._set_fw_variable(item[1], item[2])
+			if ret is False: return False
+		return True
+	# ↑↑↑ Transactions
+
 	def _cart_read(self, address, length=0, agb_save_flash=False):
 		if self.MODE == "DMG":
 			if length == 0:
@@ -574,7 +745,7 @@ class LK_Device(ABC):
 					return self.ReadROM(address, length)
 
 	def _cart_write(self, address, value, flashcart=False, sram=False):
-		dprint("Writing to cartridge: 0x{:X} = 0x{:X} (args: {:s}, {:s})".format(address, value & 0xFF, str(flashcart), str(sram)))
+		if Util.DEBUG: dprint("Writing to cartridge: 0x{:X} = 0x{:X} (args: {:s}, {:s})".format(address, value & 0xFF, str(flashcart), str(sram)))
 		if self.MODE == "DMG":
 			if flashcart:
 				buffer = bytearray([self.DEVICE_CMD["DMG_FLASH_WRITE_BYTE"]])
@@ -582,11 +753,13 @@ class LK_Device(ABC):
 				buffer.extend(struct.pack("B", value & 0xFF))
 			else:
 				if sram:
-					self._set_fw_variable("DMG_WRITE_CS_PULSE", 1)
-					self._set_fw_variable("ADDRESS", address)
-					self._set_fw_variable("TRANSFER_SIZE", 1)
-					self._write(self.DEVICE_CMD["DMG_CART_WRITE_SRAM"])
-					self._write(value, wait=True)
+					tx = self._tx_begin()
+					self._tx_set_fw_variable(tx, "DMG_WRITE_CS_PULSE", 1)
+					self._tx_set_fw_variable(tx, "ADDRESS", address)
+					self._tx_set_fw_variable(tx, "TRANSFER_SIZE", 1)
+					self._tx_write(tx, self.DEVICE_CMD["DMG_CART_WRITE_SRAM"])
+					self._tx_write(tx, value, wait=True)
+					self._tx_commit(tx)
 					return
 				else:
 					buffer = bytearray([self.DEVICE_CMD["DMG_CART_WRITE"]])
@@ -594,10 +767,12 @@ class LK_Device(ABC):
 					buffer.extend(struct.pack("B", value & 0xFF))
 		elif self.MODE == "AGB":
 			if sram:
-				self._set_fw_variable("TRANSFER_SIZE", 1)
-				self._set_fw_variable("ADDRESS", address)
-				self._write(self.DEVICE_CMD["AGB_CART_WRITE_SRAM"])
-				self._write(value, wait=True)
+				tx = self._tx_begin()
+				self._tx_set_fw_variable(tx, "TRANSFER_SIZE", 1)
+				self._tx_set_fw_variable(tx, "ADDRESS", address)
+				self._tx_write(tx, self.DEVICE_CMD["AGB_CART_WRITE_SRAM"])
+				self._tx_write(tx, value, wait=True)
+				self._tx_commit(tx)
 				return
 			elif flashcart:
 				buffer = bytearray([self.DEVICE_CMD["AGB_FLASH_WRITE_SHORT"]])
@@ -627,7 +802,7 @@ class LK_Device(ABC):
 			buffer.extend(struct.pack("B", 1 if flashcart else 0))
 		buffer.extend(struct.pack("B", num))
 		for i in range(0, num):
-			dprint("Writing to cartridge: 0x{:X} = 0x{:X} ({:d} of {:d})".format(commands[i][0], commands[i][1], i+1, num))
+			if Util.DEBUG: dprint("Writing to cartridge: 0x{:X} = 0x{:X} ({:d} of {:d})".format(commands[i][0], commands[i][1], i+1, num))
 			if self.MODE == "AGB" and flashcart:
 				buffer.extend(struct.pack(">I", commands[i][0] >> 1))
 			else:
@@ -730,9 +905,9 @@ class LK_Device(ABC):
 		dprint("Turning off the cartridge power")
 		if self.CanPowerCycleCart():
 			if self.FW["fw_ver"] >= 12:
-				self._write(self.DEVICE_CMD["CART_PWR_OFF"], wait=self.FW["fw_ver"] >= 12)
+				self._write_cmd("CART_PWR_OFF", wait=self.FW["fw_ver"] >= 12)
 			else:
-				self._write(self.DEVICE_CMD["OFW_CART_PWR_OFF"])
+				self._write_cmd("OFW_CART_PWR_OFF")
 			time.sleep(delay)
 		else:
 			self._write(self.DEVICE_CMD["SET_ADDR_AS_INPUTS"], wait=self.FW["fw_ver"] >= 12)
@@ -744,10 +919,10 @@ class LK_Device(ABC):
 				if self._read(1) == 0:
 					dprint("Turning on the cartridge power")
 					if self.MODE == "DMG":
-						self._write(self.DEVICE_CMD["SET_MODE_DMG"], wait=self.FW["fw_ver"] >= 12)
+						self._write_cmd("SET_MODE_DMG", wait=self.FW["fw_ver"] >= 12)
 					elif self.MODE == "AGB":
-						self._write(self.DEVICE_CMD["SET_MODE_AGB"], wait=self.FW["fw_ver"] >= 12)
-					self._write(self.DEVICE_CMD["CART_PWR_ON"])
+						self._write_cmd("SET_MODE_AGB", wait=self.FW["fw_ver"] >= 12)
+					self._write_cmd("CART_PWR_ON")
 					time.sleep(0.2)
 					hp = 10
 					while hp > 0: # Workaround for GBxCart RW, it sometimes glitches after cart power on?
@@ -779,7 +954,7 @@ class LK_Device(ABC):
 					
 					if self.MODE == "DMG":
 						dprint("Resetting Memory Bank Controller")
-						self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True) # Sachen (and Xploder GB?) may need this
+						self._write_cmd("DMG_MBC_RESET", wait=True) # Sachen (and Xploder GB?) may need this
 					elif self.MODE == "AGB":
 						dprint("Executing AGB Bootup Sequence")
 						self._write(self.DEVICE_CMD["AGB_BOOTUP_SEQUENCE"], wait=self.FW["fw_ver"] >= 12)
@@ -791,7 +966,7 @@ class LK_Device(ABC):
 				self._write(self.DEVICE_CMD["OFW_QUERY_CART_PWR"])
 				if self._read(1) == 0:
 					dprint("Turning on the cartridge power.")
-					self._write(self.DEVICE_CMD["OFW_CART_PWR_ON"])
+					self._write_cmd("OFW_CART_PWR_ON")
 					time.sleep(delay)
 					self.DEVICE.reset_input_buffer() # bug workaround
 		
@@ -811,7 +986,7 @@ class LK_Device(ABC):
 
 	def SetVarState(self, var_state):
 		dprint("Sending the state of variables ({:d} bytes)".format(len(var_state)))
-		self._write(self.DEVICE_CMD["SET_VAR_STATE"])
+		self._write_cmd("SET_VAR_STATE")
 		time.sleep(0.2)
 		self.DEVICE.write(var_state)
 
@@ -839,14 +1014,14 @@ class LK_Device(ABC):
 	
 	def SetMode(self, mode, delay=0.1):
 		if mode == "DMG":
-			self._write(self.DEVICE_CMD["SET_MODE_DMG"], wait=self.FW["fw_ver"] >= 12)
+			self._write_cmd("SET_MODE_DMG", wait=self.FW["fw_ver"] >= 12)
 			self._write(self.DEVICE_CMD["SET_VOLTAGE_5V"], wait=self.FW["fw_ver"] >= 12)
 			self._set_fw_variable("DMG_READ_METHOD", self.DMG_READ_METHOD)
 			self._set_fw_variable("CART_MODE", 1)
 			#if self.FW["fw_ver"] >= 14: self._set_fw_variable("DMG_AUDIO_ENABLED", 0)
 			self.MODE = "DMG"
 		elif mode == "AGB":
-			self._write(self.DEVICE_CMD["SET_MODE_AGB"], wait=self.FW["fw_ver"] >= 12)
+			self._write_cmd("SET_MODE_AGB", wait=self.FW["fw_ver"] >= 12)
 			self._write(self.DEVICE_CMD["SET_VOLTAGE_3_3V"], wait=self.FW["fw_ver"] >= 12)
 			self._set_fw_variable("AGB_READ_METHOD", self.AGB_READ_METHOD)
 			self._set_fw_variable("CART_MODE", 2)
@@ -911,7 +1086,7 @@ class LK_Device(ABC):
 		if self.FW["fw_ver"] >= 8: self._write(self.DEVICE_CMD["DISABLE_PULLUPS"], wait=True)
 		if self.MODE == "DMG":
 			self._write(self.DEVICE_CMD["SET_VOLTAGE_5V"], wait=self.FW["fw_ver"] >= 12)
-			self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True)
+			self._write_cmd("DMG_MBC_RESET", wait=True)
 			self._set_fw_variable("DMG_READ_CS_PULSE", 0)
 			self._set_fw_variable("DMG_WRITE_CS_PULSE", 0)
 		elif self.MODE == "AGB":
@@ -1111,7 +1286,9 @@ class LK_Device(ABC):
 		self.SetProgress({"action":"INITIALIZE", "abortable":False, "method":"DETECT_CART"})
 		signal = self.SIGNAL
 		self.SIGNAL = None
-		ret = self.DoDetectCartridge(mbc=None, limitVoltage=args["limitVoltage"], checkSaveType=args["checkSaveType"], signal=signal)
+		forceFull = "forceFull" in args and args["forceFull"] is True
+		cacheTTL = args["cacheTTL"] if "cacheTTL" in args else None
+		ret = self.DoDetectCartridge(mbc=None, limitVoltage=args["limitVoltage"], checkSaveType=args["checkSaveType"], signal=signal, forceFull=forceFull, cacheTTL=cacheTTL)
 		self.INFO["detect_cart"] = ret
 		self.INFO["last_action"] = self.ACTIONS["DETECT_CART"]
 		self.INFO["action"] = None
@@ -1119,7 +1296,7 @@ class LK_Device(ABC):
 		self.SetProgress({"action":"FINISHED"})
 		return True
 
-	def DoDetectCartridge(self, mbc=None, limitVoltage=False, checkSaveType=True, signal=None):
+	def DoDetectCartridge(self, mbc=None, limitVoltage=False, checkSaveType=True, signal=None, forceFull=False, cacheTTL=None):
 		self.SIGNAL = None
 		self.CANCEL = False
 		self.ERROR = False
@@ -1148,6 +1325,29 @@ class LK_Device(ABC):
 					_apot = self._get_fw_variable("AUTO_POWEROFF_TIME")
 					self._set_fw_variable("AUTO_POWEROFF_TIME", 5000)
 		
+		# ↓↓↓ Detection cache
+		cache_key = None
+		if cacheTTL is None: cacheTTL = Util.DETECT_CACHE_TTL
+		if cacheTTL > 0 and "raw" in info:
+			cache_key = Util.GetDetectionCacheKey(
+				mode=self.MODE,
+				device=[ self.FW["pcb_name"], self.FW["pcb_ver"], self.FW["fw_ver"] ],
+				header=info["raw"],
+				options=[ limitVoltage, checkSaveType, mbc ],
+				cart_names=list(self.SUPPORTED_CARTS[self.MODE].keys())
+			)
+			if not forceFull:
+				if signal is not None: self.SetProgress({"action":"UPDATE_INFO", "text":"Confirming cached cartridge..."}, signal=signal)
+				ret = self._DetectCartridgeCached(key=cache_key, info=info, limitVoltage=limitVoltage, max_age=cacheTTL)
+				if ret is not None:
+					self._write_cmd("DMG_MBC_RESET", wait=True)
+					self.INFO["last_action"] = 0
+					self.INFO["action"] = None
+					if self.CanPowerCycleCart() and _apoe is True:
+						self._set_fw_variable("AUTO_POWEROFF_TIME", _apot)
+					return ret
+		# ↑↑↑ Detection cache
+		
 		# Detect Flash Cart
 		if signal is not None: self.SetProgress({"action":"UPDATE_INFO", "text":"Detecting Flash..."}, signal=signal)
 		ret = self.DetectFlash(limitVoltage=limitVoltage)
@@ -1301,25 +1501,8 @@ class LK_Device(ABC):
 								save_size = 0
 						else:
 							dprint("Testing EEPROM")
-							# Check for 4K EEPROM
-							self._BackupRestoreRAM(args={ 'mode':2, 'path':None, 'mbc':mbc, 'save_type':1, 'rtc':False, 'detect':True })
-							save_size = Util.find_size(self.INFO["data"], len(self.INFO["data"]))
-							eeprom_4k = self.INFO["data"]
-							# Check for 64K EEPROM
-							self._BackupRestoreRAM(args={ 'mode':2, 'path':None, 'mbc':mbc, 'save_type':2, 'rtc':False, 'detect':True })
-							save_size = Util.find_size(self.INFO["data"], len(self.INFO["data"]))
-							eeprom_64k = self.INFO["data"]
-							if eeprom_64k in (bytearray([0xFF] * len(eeprom_64k)), bytearray([0] * len(eeprom_64k))):
-								save_size = 0
-								save_type = 0
-							elif (eeprom_4k == eeprom_64k[:len(eeprom_4k)]):
-								save_type = 2
-								save_size = 8192
-								checkBatterylessSRAM = False
-							else:
-								save_type = 1
-								save_size = 512
-								checkBatterylessSRAM = False
+							(save_type, save_size) = self._DetectEEPROMType(mbc=mbc)
+							if save_type > 0: checkBatterylessSRAM = False
 
 					if checkBatterylessSRAM:
 						batteryless = self.CheckBatterylessSRAM()
@@ -1328,7 +1511,10 @@ class LK_Device(ABC):
 							info["batteryless_sram"] = batteryless
 							self.INFO["dump_info"]["batteryless_sram"] = batteryless
 
-		self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True)
+		if cache_key is not None:
+			self._StoreDetectionCache(key=cache_key, info=info, limitVoltage=limitVoltage, save_checked=checkSaveType, ret=(save_size, save_type, save_chip, sram_unstable, cart_types, cart_type_id, cfi_s, cfi, flash_id, detected_size))
+
+		self._write_cmd("DMG_MBC_RESET", wait=True)
 		self.INFO["last_action"] = 0
 		self.INFO["action"] = None
 
@@ -1337,6 +1523,166 @@ class LK_Device(ABC):
 
 		return (info, save_size, save_type, save_chip, sram_unstable, cart_types, cart_type_id, cfi_s, cfi, flash_id, detected_size)
 	
+	def _IsDetectionCacheable(self, cart_type_id):
+		if cart_type_id == 0: return True
+		cart_type = list(self.SUPPORTED_CARTS[self.MODE].values())[cart_type_id]
+		if "command_set" not in cart_type or "commands" not in cart_type: return False
+		if "read_identifier" not in cart_type["commands"] or len(cart_type["commands"]["read_identifier"]) == 0: return False
+		if cart_type["command_set"] in ("BLAZE_XPLODER", "DATEL_ORBITV2", "GBMEMORY", "GBAMP", "BUNG_16M"): return False
+		if "m29w640" in cart_type or "dmg-mbc5-32m-flash" in cart_type: return False
+		if self.MODE == "DMG" and cart_type["commands"]["read_identifier"][0][0] > 0x7000: return False
+		return True
+
+	def _ReadFlashIDQuick(self, cart_type, limitVoltage=False):
+		# Sends a single reset/read identifier sequence of the given cart type, as done during the full flash detection
+		if self.MODE == "DMG":
+			if limitVoltage:
+				self._write(self.DEVICE_CMD["SET_VOLTAGE_3_3V"], wait=self.FW["fw_ver"] >= 12)
+			else:
+				self._write(self.DEVICE_CMD["SET_VOLTAGE_5V"], wait=self.FW["fw_ver"] >= 12)
+			self._write_cmd("SET_MODE_DMG", wait=self.FW["fw_ver"] >= 12)
+			if "write_pin" in cart_type and cart_type["write_pin"] == "AUDIO":
+				if not self.SupportsAudioAsWe(): return None
+				self._set_we_pin_audio()
+			else:
+				self._set_we_pin_wr()
+		elif self.MODE == "AGB":
+			read_method = self.AGB_READ_METHOD
+			self.SetAGBReadMethod(0)
+			self._write_cmd("SET_MODE_AGB", wait=self.FW["fw_ver"] >= 12)
+		else:
+			raise NotImplementedError
+
+		rom = self._cart_read(0, 8)
+		commands = cart_type["commands"]
+		if "unlock" in commands: self._cart_write_flash(commands["unlock"], flashcart=True)
+		if "reset" in commands: self._cart_write_flash(commands["reset"], flashcart=True)
+		self._cart_write_flash(commands["read_identifier"], flashcart=True)
+		cmp = self._cart_read(0, 8)
+		if "reset" in commands: self._cart_write_flash(commands["reset"], flashcart=True)
+
+		if self.MODE == "DMG":
+			self._write(self.DEVICE_CMD["SET_VOLTAGE_5V"], wait=self.FW["fw_ver"] >= 12)
+			self._set_we_pin_wr()
+			time.sleep(0.1)
+		elif self.MODE == "AGB":
+			self.SetAGBReadMethod(read_method)
+
+		if cmp == rom: return None
+		return list(cmp)
+
+	def _StoreDetectionCache(self, key, info, limitVoltage, save_checked, ret):
+		(save_size, save_type, save_chip, sram_unstable, cart_types, cart_type_id, cfi_s, cfi, flash_id, detected_size) = ret
+		if info["logo_correct"] is not True or "gbmem" in info: return
+		if not self._IsDetectionCacheable(cart_type_id): return
+		probe_id = None
+		if cart_type_id > 0:
+			probe_id = self._ReadFlashIDQuick(list(self.SUPPORTED_CARTS[self.MODE].values())[cart_type_id], limitVoltage=limitVoltage)
+			if probe_id is None: return
+		entry = {
+			"probe_id":probe_id,
+			"cart_types":cart_types,
+			"cart_type_id":cart_type_id,
+			"flash_id":flash_id,
+			"cfi_s":cfi_s,
+			"cfi_raw":cfi["raw"].hex() if isinstance(cfi, dict) else None,
+			"detected_size":detected_size,
+			"save_size":save_size,
+			"save_type":save_type,
+			"save_chip":save_chip,
+			"save_checked":save_checked,
+			"batteryless_sram":info["batteryless_sram"] if "batteryless_sram" in info else None,
+		}
+		dprint("Storing detection cache entry:", key)
+		Util.SetDetectionCache(key, entry)
+
+	def _DetectCartridgeCached(self, key, info, limitVoltage, max_age):
+		entry = Util.GetDetectionCache(key, max_age=max_age)
+		if entry is None: return None
+		try:
+			cart_type_id = entry["cart_type_id"]
+			supported_carts = list(self.SUPPORTED_CARTS[self.MODE].values())
+			if cart_type_id == 0:
+				# Retail cartridges have no flash ID to compare, so make sure no flash chip answers
+				ret = self.DetectFlash(limitVoltage=limitVoltage)
+				confirmed = ret is not False and len(ret[0]) == 0
+			else:
+				confirmed = self._ReadFlashIDQuick(supported_carts[cart_type_id], limitVoltage=limitVoltage) == entry["probe_id"]
+			if confirmed:
+				confirmed = self._ConfirmCachedSaveType(entry=entry, info=info)
+			if not confirmed:
+				dprint("Detection cache entry didn’t match the inserted cartridge:", key)
+				Util.SetDetectionCache(key, None)
+				return None
+
+			cfi = False
+			if entry["cfi_raw"] is not None:
+				cfi = ParseCFI(bytearray.fromhex(entry["cfi_raw"]))
+				cfi["raw"] = bytearray.fromhex(entry["cfi_raw"])
+			if entry["batteryless_sram"] is not None:
+				info["batteryless_sram"] = entry["batteryless_sram"]
+				self.INFO["dump_info"]["batteryless_sram"] = entry["batteryless_sram"]
+			dprint("Using cached detection result:", key)
+			# SRAM stability isn’t cached, so it is reported as unknown
+			return (info, entry["save_size"], entry["save_type"], entry["save_chip"], None, entry["cart_types"], cart_type_id, entry["cfi_s"], cfi, entry["flash_id"], entry["detected_size"])
+		except (KeyError, TypeError, ValueError, IndexError):
+			dprint("Discarding corrupt detection cache entry:", key)
+			Util.SetDetectionCache(key, None)
+			return None
+
+	def _ConfirmCachedSaveType(self, entry, info):
+		# Carts sharing a header can still differ in their save hardware, so re-check the cheap parts of the save type detection
+		if self.MODE != "AGB" or entry["save_checked"] is not True or info["3d_memory"] is True: return True
+		save_type = entry["save_type"]
+
+		ret = self.ReadFlashSaveID()
+		save_chip = None
+		if ret is not False and ret[0] != 0 and ret[0] in Util.AGB_Flash_Save_Chips:
+			save_chip = Util.AGB_Flash_Save_Chips[ret[0]]
+		if save_chip != entry["save_chip"]:
+			dprint("Cached save chip doesn’t match:", entry["save_chip"], save_chip)
+			return False
+		if save_chip is not None: return True
+
+		if save_type in (0, 1, 2):
+			(eeprom_type, _) = self._DetectEEPROMType()
+			if eeprom_type != save_type:
+				dprint("Cached EEPROM type doesn’t match:", save_type, eeprom_type)
+				return False
+			if save_type in (1, 2): return True
+
+		batteryless = self.CheckBatterylessSRAM()
+		if batteryless is False: batteryless = None
+		if batteryless != entry["batteryless_sram"]:
+			dprint("Cached batteryless SRAM information doesn’t match:", entry["batteryless_sram"], batteryless)
+			return False
+		return True
+	
+	def _DetectEEPROMType(self, mbc=None):
+		# Read the 4K address space with both 6-bit and 14-bit addressing; a 64K EEPROM returns the same blocks both times
+		self._BackupRestoreRAM(args={ 'mode':2, 'path':None, 'mbc':mbc, 'save_type':1, 'save_size':0x200, 'rtc':False, 'detect':True })
+		eeprom_4k = self.INFO["data"]
+		self._BackupRestoreRAM(args={ 'mode':2, 'path':None, 'mbc':mbc, 'save_type':2, 'save_size':0x200, 'rtc':False, 'detect':True })
+		eeprom_64k = self.INFO["data"]
+		eeprom_blank = len(eeprom_64k) > 0 and eeprom_64k[0] in (0x00, 0xFF) and Util.IsBlank(eeprom_64k, eeprom_64k[0])
+		if eeprom_blank: # only a blank start requires reading the rest of the 64K address space
+			npu = self.NO_PROG_UPDATE
+			self.NO_PROG_UPDATE = True
+			command = bytearray([ self.DEVICE_CMD["AGB_CART_READ_EEPROM"], 2 ])
+			for pos in range(0x200, 0x2000, 0x400):
+				length = min(0x400, 0x2000 - pos)
+				temp = self.ReadRAM(address=int(pos/8), length=length, command=command, max_length=self.GetSaveTransferSizes()[0])
+				if len(temp) != length or not Util.IsBlank(temp, eeprom_64k[0]):
+					eeprom_blank = False
+					break
+			self.NO_PROG_UPDATE = npu
+		if eeprom_blank:
+			return (0, 0)
+		elif eeprom_4k == eeprom_64k[:len(eeprom_4k)]:
+			return (2, 8192)
+		else:
+			return (1, 512)
+	
 	def CheckBatterylessSRAM(self):
 		bl_size = None
 		bl_offset = None
@@ -1452,17 +1798,29 @@ class LK_Device(ABC):
 	
 	def ReadROM(self, address, length, skip_init=False, max_length=64):
 		num = math.ceil(length / max_length)
-		dprint("Reading 0x{:X} bytes from cartridge ROM at 0x{:X} in {:d} iteration(s)".format(length, address, num))
 		if length > max_length: length = max_length
+		buffer = bytearray(num * length)
+		if self.ReadROMInto(address, memoryview(buffer), skip_init=skip_init, max_length=max_length) is False:
+			return bytearray()
+		return buffer
+
+	def ReadROMInto(self, address, view, skip_init=False, max_length=64):
+		if len(view) == 0: return 0
+		length = min(len(view), max_length)
+		num = math.ceil(len(view) / length)
+		dprint("Reading 0x{:X} bytes from cartridge ROM at 0x{:X} in {:d} iteration(s)".format(len(view), address, num))
+		if num * length != len(view):
+			raise ValueError("Buffer size must be a multiple of the transfer size.")
 
-		buffer = bytearray()
 		if not skip_init:
-			self._set_fw_variable("TRANSFER_SIZE", length)
+			tx = self._tx_begin()
+			self._tx_set_fw_variable(tx, "TRANSFER_SIZE", length)
 			if self.MODE == "DMG":
-				self._set_fw_variable("ADDRESS", address)
-				self._set_fw_variable("DMG_ACCESS_MODE", 1) # MODE_ROM_READ
+				self._tx_set_fw_variable(tx, "ADDRESS", address)
+				self._tx_set_fw_variable(tx, "DMG_ACCESS_MODE", 1) # MODE_ROM_READ
 			elif self.MODE == "AGB":
-				self._set_fw_variable("ADDRESS", address >> 1)
+				self._tx_set_fw_variable(tx, "ADDRESS", address >> 1)
+			self._tx_commit(tx)
 		
 		if self.MODE == "DMG":
 			command = "DMG_CART_READ"
@@ -1471,18 +1829,24 @@ class LK_Device(ABC):
 		else:
 			raise NotImplementedError
 		
+		# Keep multiple read commands in flight during dumps so the USB round-trip is not paid per chunk
+		depth = 1
+		if self.FAST_READ: depth = max(1, min(self.READ_PIPELINE_DEPTH, num))
+		pending = 0
 		for n in range(0, num):
-			self._write(self.DEVICE_CMD[command])
-			temp = self._read(length)
-			if temp is not False and isinstance(temp, int): temp = bytearray([temp])
-			if temp is False or len(temp) != length:
-				dprint("Error while trying to read 0x{:X} bytes from cartridge ROM at 0x{:X} in iteration {:d} of {:d} (response: {:s})".format(length, address, n, num, str(temp)))
-				return bytearray()
-			buffer += temp
+			while pending < depth and n + pending < num:
+				self._write(self.DEVICE_CMD[command])
+				pending += 1
+			temp = self._readinto(view[n*length:(n+1)*length])
+			pending -= 1
+			if temp is False:
+				dprint("Error while trying to read 0x{:X} bytes from cartridge ROM at 0x{:X} in iteration {:d} of {:d}".format(length, address, n, num))
+				if pending > 0: self._discard_pending_reads(pending, length)
+				return False
 			if self.INFO["action"] in (self.ACTIONS["ROM_READ"], self.ACTIONS["SAVE_READ"], self.ACTIONS["ROM_WRITE_VERIFY"]) and not self.NO_PROG_UPDATE:
-				self.SetProgress({"action":"READ", "bytes_added":len(temp)})
+				self.SetProgress({"action":"READ", "bytes_added":length})
 		
-		return buffer
+		return len(view)
 
 	def ReadROM_3DMemory(self, address, length, max_length=64):
 		buffer_size = 0x1000
@@ -1522,16 +1886,18 @@ class LK_Device(ABC):
 		dprint("Reading 0x{:X} bytes from cartridge RAM in {:d} iteration(s)".format(length, num))
 		if length > max_length: length = max_length
 		buffer = bytearray()
-		self._set_fw_variable("TRANSFER_SIZE", length)
+		tx = self._tx_begin()
+		self._tx_set_fw_variable(tx, "TRANSFER_SIZE", length)
 		
 		if self.MODE == "DMG":
-			self._set_fw_variable("ADDRESS", 0xA000 + address)
-			self._set_fw_variable("DMG_ACCESS_MODE", 3) # MODE_RAM_READ
-			self._set_fw_variable("DMG_READ_CS_PULSE", 1)
+			self._tx_set_fw_variable(tx, "ADDRESS", 0xA000 + address)
+			self._tx_set_fw_variable(tx, "DMG_ACCESS_MODE", 3) # MODE_RAM_READ
+			self._tx_set_fw_variable(tx, "DMG_READ_CS_PULSE", 1)
 			if command is None: command = self.DEVICE_CMD["DMG_CART_READ"]
 		elif self.MODE == "AGB":
-			self._set_fw_variable("ADDRESS", address)
+			self._tx_set_fw_variable(tx, "ADDRESS", address)
 			if command is None: command = self.DEVICE_CMD["AGB_CART_READ_SRAM"]
+		self._tx_commit(tx)
 
 		for _ in range(0, num):
 			self._write(command)
@@ -1608,26 +1974,30 @@ class LK_Device(ABC):
 		dprint("Writing 0x{:X} bytes to cartridge RAM in {:d} iteration(s)".format(length, num))
 		if length > max_length: length = max_length
 
-		self._set_fw_variable("TRANSFER_SIZE", length)
+		tx = self._tx_begin()
+		self._tx_set_fw_variable(tx, "TRANSFER_SIZE", length)
 		if self.MODE == "DMG":
-			self._set_fw_variable("ADDRESS", 0xA000 + address)
-			self._set_fw_variable("DMG_ACCESS_MODE", 4) # MODE_RAM_WRITE
-			self._set_fw_variable("DMG_WRITE_CS_PULSE", 1)
+			self._tx_set_fw_variable(tx, "ADDRESS", 0xA000 + address)
+			self._tx_set_fw_variable(tx, "DMG_ACCESS_MODE", 4) # MODE_RAM_WRITE
+			self._tx_set_fw_variable(tx, "DMG_WRITE_CS_PULSE", 1)
 			if command is None: command = self.DEVICE_CMD["DMG_CART_WRITE_SRAM"]
 		elif self.MODE == "AGB":
-			self._set_fw_variable("ADDRESS", address)
+			self._tx_set_fw_variable(tx, "ADDRESS", address)
 			if command is None: command = self.DEVICE_CMD["AGB_CART_WRITE_SRAM"]
+		self._tx_commit(tx)
 
 		for i in range(0, num):
 			self._write(command)
-			self._write(buffer[i*length:i*length+length], wait=True)
+			if self._write(buffer[i*length:i*length+length], wait=True) is False: return False
 			#self._read(1)
 			if self.INFO["action"] == self.ACTIONS["SAVE_WRITE"] and not self.NO_PROG_UPDATE:
 				self.SetProgress({"action":"WRITE", "bytes_added":length})
 		
 		if self.MODE == "DMG":
-			self._set_fw_variable("ADDRESS", 0)
-			self._set_fw_variable("DMG_WRITE_CS_PULSE", 0)
+			tx = self._tx_begin()
+			self._tx_set_fw_variable(tx, "ADDRESS", 0)
+			self._tx_set_fw_variable(tx, "DMG_WRITE_CS_PULSE", 0)
+			self._tx_commit(tx)
 		
 		return True
 
@@ -1644,7 +2014,7 @@ class LK_Device(ABC):
 			self._set_fw_variable("ADDRESS", address)
 			dprint("Now in iteration {:d}".format(i))
 
-			if buffer[i*length:i*length+length] == bytearray([0xFF] * length):
+			if Util.IsBlank(buffer[i*length:i*length+length]):
 				skip_write = True
 				address += length
 				continue
@@ -1730,7 +2100,7 @@ class LK_Device(ABC):
 	def WriteROM(self, address, buffer, flash_buffer_size=False, skip_init=False, rumble_stop=False, max_length=MAX_BUFFER_WRITE):
 		length = len(buffer)
 		num = math.ceil(length / max_length)
-		dprint("Writing 0x{:X} bytes to Flash ROM in {:d} iteration(s)".format(length, num))
+		if Util.DEBUG: dprint("Writing 0x{:X} bytes to Flash ROM in {:d} iteration(s)".format(length, num))
 		if length == 0:
 			dprint("Length is zero?")
 			return False
@@ -1742,14 +2112,22 @@ class LK_Device(ABC):
 		num_of_chunks = math.ceil(flash_buffer_size / length)
 		pos = 0
 
+		self._set_fw_variable("TRANSFER_SIZE", length)
 		if not skip_init:
-			self._set_fw_variable("TRANSFER_SIZE", length)
 			if flash_buffer_size is not False:
 				self._set_fw_variable("BUFFER_SIZE", flash_buffer_size)
 		
+		# The next chunk is prepared while the device is still busy with the current one
+		time_host = 0
+		time_device = 0
+		chunks = 0
+		ts = time.time()
+		next_data = bytearray(buffer[0:length])
+		next_blank = (num_of_chunks == 1 or flash_buffer_size == 0) and Util.IsBlank(next_data)
+		time_host += time.time() - ts
 		for i in range(0, num):
-			data = bytearray(buffer[i*length:i*length+length])
-			if (num_of_chunks == 1 or flash_buffer_size == 0) and (data == bytearray([0xFF] * len(data))):
+			data = next_data
+			if next_blank:
 				skip_init = False
 				skip_write = True
 			else:
@@ -1766,7 +2144,19 @@ class LK_Device(ABC):
 					skip_init = True
 				
 				if ret != 0x03: self._write(self.DEVICE_CMD["FLASH_PROGRAM"])
-				ret = self._write(data, wait=True)
+				self._write(data)
+			
+			ts = time.time()
+			if i + 1 < num:
+				next_data = bytearray(buffer[(i+1)*length:(i+1)*length+length])
+				next_blank = (num_of_chunks == 1 or flash_buffer_size == 0) and Util.IsBlank(next_data)
+			time_host += time.time() - ts
+			
+			if not skip_write:
+				ts = time.time()
+				ret = self.wait_for_ack()
+				time_device += time.time() - ts
+				chunks += 1
 				
 				if ret not in (0x01, 0x03):
 					dprint("Flash error at 0x{:X} in iteration {:d} of {:d} while trying to write a total of 0x{:X} bytes (response = {:s})".format(address, i, num, len(buffer), str(ret)))
@@ -1784,6 +2174,11 @@ class LK_Device(ABC):
 			if ((pos % length) * 10 == 0) and (self.INFO["action"] in (self.ACTIONS["ROM_WRITE"], self.ACTIONS["SAVE_WRITE"]) and not self.NO_PROG_UPDATE):
 				self.SetProgress({"action":"WRITE", "bytes_added":length, "skipping":skip_write})
 		
+		self.WRITE_CHUNKS += chunks
+		self.WRITE_TIME_HOST += time_host
+		self.WRITE_TIME_DEVICE += time_device
+		if chunks > 0:
+			if Util.DEBUG: dprint("Chunk timing: host {:.3f} ms, device {:.3f} ms (average of {:d} chunk(s))".format(time_host * 1000 / chunks, time_device * 1000 / chunks, chunks))
 		self.SKIPPING = skip_write
 	
 	def WriteROM_GBMEMORY(self, address, buffer, bank):
@@ -1799,7 +2194,7 @@ class LK_Device(ABC):
 			self._set_fw_variable("ADDRESS", address)
 			dprint("Now in iteration {:d}".format(i))
 			
-			if buffer[i*length:i*length+length] == bytearray([0xFF] * length):
+			if Util.IsBlank(buffer[i*length:i*length+length]):
 				skip_write = True
 				address += length
 				continue
@@ -1885,7 +2280,7 @@ class LK_Device(ABC):
 		max_length = 128
 		num = math.ceil(length / max_length)
 		if length > max_length: length = max_length
-		dprint("Writing 0x{:X} bytes to Flash ROM in {:d} iteration(s)".format(length, num))
+		if Util.DEBUG: dprint("Writing 0x{:X} bytes to Flash ROM in {:d} iteration(s)".format(length, num))
 		
 		skip_write = False
 		for i in range(0, num):
@@ -1893,7 +2288,7 @@ class LK_Device(ABC):
 			self._set_fw_variable("ADDRESS", address)
 			dprint("Now in iteration {:d}".format(i))
 			
-			if buffer[i*length:i*length+length] == bytearray([0xFF] * length):
+			if Util.IsBlank(buffer[i*length:i*length+length]):
 				skip_write = True
 				address += length
 				continue
@@ -2007,6 +2402,17 @@ class LK_Device(ABC):
 		buffer2 = self.ReadROM(0x80, 0x40)
 		return buffer1 == buffer2
 	
+	def GetCRC32(self, address, length):
+		if self.MODE == "DMG":
+			self._set_fw_variable("ADDRESS", address)
+		elif self.MODE == "AGB":
+			self._set_fw_variable("ADDRESS", address >> 1)
+		self._write(self.DEVICE_CMD["CALC_CRC32"])
+		self._write(bytearray(struct.pack(">I", length)))
+		temp = self._read(4)
+		if temp is False: return False
+		return struct.unpack(">I", temp)[0]
+
 	def CompareCRC32(self, buffer, offset, length, address, flashcart=None, max_length=0x20000, reset=False, mbc=None, bank=0):
 		left = length
 		chunk_pos = 0
@@ -2019,17 +2425,7 @@ class LK_Device(ABC):
 			crc32_expected = zlib.crc32(buffer[chunk_from:chunk_to])
 			
 			for i in range(0, 2 if (reset is True and flashcart is not None) else 1): # for retrying with reset
-				if self.MODE == "DMG":
-					self._set_fw_variable("ADDRESS", address + chunk_pos)
-				elif self.MODE == "AGB":
-					self._set_fw_variable("ADDRESS", (address + chunk_pos) >> 1)
-				self._write(self.DEVICE_CMD["CALC_CRC32"])
-				self._write(bytearray(struct.pack(">I", chunk_len)))
-				temp = self._read(4)
-				if temp is False:
-					crc32_calculated = False
-				else:
-					crc32_calculated = struct.unpack(">I", temp)[0]
+				crc32_calculated = self.GetCRC32(address=address + chunk_pos, length=chunk_len)
 				if crc32_expected != crc32_calculated:
 					if i == 0 and flashcart is not None:
 						flashcart.Reset(full_reset=True)
@@ -2048,6 +2444,21 @@ class LK_Device(ABC):
 
 		return verified
 
+	def FindCRC32Mismatch(self, buffer, offset, length, address, min_length=0x1000):
+		# Narrows down a mismatching range by comparing the CRC32 checksums of its halves
+		while length > min_length:
+			half = (length >> 1) & ~1
+			if self.CompareCRC32(buffer=buffer, offset=offset, length=half, address=address) is not True:
+				length = half
+			elif self.CompareCRC32(buffer=buffer, offset=offset+half, length=length-half, address=address+half) is not True:
+				offset += half
+				address += half
+				length -= half
+			else:
+				break
+		dprint("CRC32 mismatch narrowed down to 0x{:X}~0x{:X}".format(offset, offset+length))
+		return (offset, length)
+
 	def DetectFlash(self, limitVoltage=False):
 		supported_carts = list(self.SUPPORTED_CARTS[self.MODE].values())
 		fc_fncptr = {
@@ -2074,40 +2485,100 @@ class LK_Device(ABC):
 				self._write(self.DEVICE_CMD["SET_VOLTAGE_3_3V"], wait=self.FW["fw_ver"] >= 12)
 			else:
 				self._write(self.DEVICE_CMD["SET_VOLTAGE_5V"], wait=self.FW["fw_ver"] >= 12)
-			self._write(self.DEVICE_CMD["SET_MODE_DMG"], wait=self.FW["fw_ver"] >= 12)
+			self._write_cmd("SET_MODE_DMG", wait=self.FW["fw_ver"] >= 12)
 		
 		elif self.MODE == "AGB":
 			read_method = self.AGB_READ_METHOD
 			self.SetAGBReadMethod(0)
-			self._write(self.DEVICE_CMD["SET_MODE_AGB"], wait=self.FW["fw_ver"] >= 12)
+			self._write_cmd("SET_MODE_AGB", wait=self.FW["fw_ver"] >= 12)
 		
 		else:
 			raise NotImplementedError
 
 		rom = self._cart_read(0, 8)
 
+		# Compile the probe plan; definitions sharing identical command sequences are probed only once
+		probe_plan = []
+		probe_groups = {}
+		for (f, cart_type) in sorted(enumerate(supported_carts), key=lambda e: 'm29w640' not in e[1]): # m29w640 first because of corruption risk
+			if "command_set" not in cart_type: continue
+			if "manual_select" in cart_type and cart_type["manual_select"] is True: continue
+			if self.MODE == "DMG" and "m29w640" in cart_type:
+				kind = "M29W640"
+			elif self.MODE == "DMG" and cart_type["command_set"] in ("BLAZE_XPLODER", "DATEL_ORBITV2", "GBMEMORY", "BUNG_16M"):
+				kind = cart_type["command_set"]
+			elif self.MODE == "DMG" and "dmg-mbc5-32m-flash" in cart_type:
+				kind = "DMG-MBC5-32M-FLASH"
+			elif self.MODE == "AGB" and cart_type["command_set"] == "GBAMP":
+				kind = "GBAMP"
+			elif "commands" in cart_type:
+				kind = None
+			else:
+				continue
+			
+			if kind is None:
+				c = {
+					"reset":[],
+					"read_identifier":[],
+					"read_cfi":[],
+				}
+				if "reset" in cart_type["commands"]:
+					c["reset"] = cart_type["commands"]["reset"]
+				if "read_identifier" in cart_type["commands"]:
+					c["read_identifier"] = cart_type["commands"]["read_identifier"]
+				if "read_cfi" in cart_type["commands"]:
+					c["read_cfi"] = cart_type["commands"]["read_cfi"]
+				key = json.dumps([ kind, cart_type["commands"].get("reset"), cart_type["commands"].get("unlock"), cart_type["commands"].get("unlock_read"), c ])
+			else:
+				key = json.dumps([ kind, cart_type["commands"], cart_type.get("read_identifier_at") ])
+			
+			if key in probe_groups:
+				probe_groups[key]["members"].append(f)
+			else:
+				probe_groups[key] = { "kind":kind, "cart_type":cart_type, "members":[ f ] }
+				probe_plan.append(probe_groups[key])
+				if kind is None: probe_groups[key]["cmds"] = c
+		dprint(f"Probe plan: {len(probe_plan):d} unique command sequence(s) for {sum(len(p['members']) for p in probe_plan):d} cart type(s)")
+		
 		dprint("Resetting and unlocking all cart types")
 		cmds = []
 		cmds_reset = []
 		cmds_unlock_read = []
 
-		for cart_type in sorted(supported_carts, key=lambda c: 'm29w640' not in c): # m29w640 first because of corruption risk
-			f = supported_carts.index(cart_type)
-			if "command_set" not in cart_type: continue
-			if "manual_select" in cart_type and cart_type["manual_select"] is True: continue
-			if self.MODE == "DMG" and "m29w640" in cart_type:
+		for probe in probe_plan:
+			kind = probe["kind"]
+			cart_type = probe["cart_type"]
+			if kind is None:
+				c = probe["cmds"]
+				if "reset" in cart_type["commands"]:
+					if cart_type["commands"]["reset"] not in cmds_reset:
+						cmds_reset.append(cart_type["commands"]["reset"])
+				if "unlock_read" in cart_type["commands"]:
+					if cart_type["commands"]["unlock_read"] not in cmds_unlock_read:
+						cmds_unlock_read.append(cart_type["commands"]["unlock_read"])
+				if "unlock" in cart_type["commands"]:
+					if cart_type["commands"]["unlock"] not in cmds_reset:
+						cmds_reset.append(cart_type["commands"]["unlock"])
+					if cart_type["commands"]["reset"] not in cmds_reset:
+						cmds_reset.append(cart_type["commands"]["reset"])
+				if len(c["read_identifier"]) > 0:
+					if self.MODE == "DMG" and cart_type["commands"]["read_identifier"][0][0] > 0x7000: continue
+					if c not in cmds:
+						found = False
+						for t in cmds:
+							if c["read_identifier"] == t["read_identifier"]:
+								found = True
+						if not found:
+							cmds.append(c)
+				continue
+			
+			if kind == "M29W640":
 				self._cart_write_flash(cart_type["commands"]["reset"])
 				rom1 = self._cart_read(0, 8)
 				self._cart_write_flash(cart_type["commands"]["read_identifier"])
 				rom2 = self._cart_read(0, 8)
-				if rom1 != rom2 and list(rom2[:len(cart_type["flash_ids"][0])]) == cart_type["flash_ids"][0]:
-					found = True
-					flash_types.append(f)
-					dprint("Found a M29W640 cartridge")
-					self._cart_write_flash(cart_type["commands"]["reset"])
-					break
-				continue
-			elif self.MODE == "DMG" and cart_type["command_set"] == "BLAZE_XPLODER":
+				name = "M29W640 cartridge"
+			elif kind == "BLAZE_XPLODER":
 				self._cart_read(0x102, 1)
 				self._cart_write(6, 1)
 				self._cart_write_flash(cart_type["commands"]["reset"])
@@ -2116,66 +2587,35 @@ class LK_Device(ABC):
 				self._cart_write(6, 1)
 				self._cart_write_flash(cart_type["commands"]["read_identifier"])
 				rom2 = self._cart_read(0x4000, 8)
-				if rom1 != rom2 and list(rom2[:len(cart_type["flash_ids"][0])]) == cart_type["flash_ids"][0]:
-					found = True
-					flash_types.append(f)
-					dprint("Found a BLAZE Xploder GB")
-					self._cart_write_flash(cart_type["commands"]["reset"])
-					break
-				continue
-			elif self.MODE == "DMG" and cart_type["command_set"] == "DATEL_ORBITV2":
+				name = "BLAZE Xploder GB"
+			elif kind == "DATEL_ORBITV2":
 				rom1 = self._cart_read(cart_type["read_identifier_at"], 10)
 				for cmd in cart_type["commands"]["unlock_read"]: self._cart_read(cmd[0], 1)
 				self._cart_write_flash(cart_type["commands"]["unlock"])
 				self._cart_write_flash(cart_type["commands"]["read_identifier"])
 				rom2 = self._cart_read(cart_type["read_identifier_at"], 10)
-				if rom1 != rom2 and list(rom2[:len(cart_type["flash_ids"][0])]) == cart_type["flash_ids"][0]:
-					found = True
-					flash_types.append(f)
-					dprint("Found a GameShark or Action Replay")
-					self._cart_write_flash(cart_type["commands"]["reset"])
-					break
-				continue
-			elif self.MODE == "DMG" and cart_type["command_set"] == "GBMEMORY":
+				name = "GameShark or Action Replay"
+			elif kind == "GBMEMORY":
 				rom1 = self._cart_read(0, 8)
 				self._cart_write_flash(cart_type["commands"]["unlock"])
 				self._cart_write_flash(cart_type["commands"]["read_identifier"])
 				rom2 = self._cart_read(0, 8)
-				if rom1 != rom2 and list(rom2[:len(cart_type["flash_ids"][0])]) == cart_type["flash_ids"][0]:
-					found = True
-					flash_types.append(f)
-					dprint("Found a GB-Memory Cartridge")
-					self._cart_write_flash(cart_type["commands"]["reset"])
-					break
-				continue
-			elif self.MODE == "DMG" and "dmg-mbc5-32m-flash" in cart_type:
+				name = "GB-Memory Cartridge"
+			elif kind == "DMG-MBC5-32M-FLASH":
 				self._set_we_pin_audio()
 				self._cart_write_flash(cart_type["commands"]["unlock"], flashcart=False)
 				self._cart_write_flash(cart_type["commands"]["reset"])
 				rom1 = self._cart_read(0, 8)
 				self._cart_write_flash(cart_type["commands"]["read_identifier"])
 				rom2 = self._cart_read(0, 8)
-				if rom1 != rom2 and list(rom2[:len(cart_type["flash_ids"][0])]) == cart_type["flash_ids"][0]:
-					found = True
-					flash_types.append(f)
-					dprint("Found a DMG-MBC5-32M-FLASH Development Cartridge")
-					self._cart_write_flash(cart_type["commands"]["reset"])
-					break
-				self._set_we_pin_wr()
-				continue
-			elif self.MODE == "AGB" and cart_type["command_set"] == "GBAMP":
+				name = "DMG-MBC5-32M-FLASH Development Cartridge"
+			elif kind == "GBAMP":
 				rom1 = self._cart_read(0x1E8F << 1, 2) + self._cart_read(0x168F << 1, 2)
 				for cmd in cart_type["commands"]["unlock_read"]: self._cart_read(cmd[0] << 1)
 				self._cart_write_flash(cart_type["commands"]["read_identifier"], flashcart=True)
 				rom2 = self._cart_read(0x1E8F << 1, 2) + self._cart_read(0x168F << 1, 2)
-				if rom1 != rom2 and list(rom2[:len(cart_type["flash_ids"][0])]) == cart_type["flash_ids"][0]:
-					found = True
-					flash_types.append(f)
-					dprint("Found a GBA Movie Player v2")
-					self._cart_write_flash(cart_type["commands"]["reset"], flashcart=True)
-					break
-				continue
-			elif self.MODE == "DMG" and cart_type["command_set"] == "BUNG_16M":
+				name = "GBA Movie Player v2"
+			elif kind == "BUNG_16M":
 				self._set_we_pin_audio()
 				rom1 = self._cart_read(0, 4)
 				self._cart_write(0x2000, 0x02, flashcart=False)
@@ -2185,10 +2625,18 @@ class LK_Device(ABC):
 				self._cart_write(0x2000, 0x02, flashcart=False)
 				self._cart_write(0x6AAA, 0x90, flashcart=True)
 				rom2 = self._cart_read(0, 4)
-				if rom1 != rom2 and list(rom2[:len(cart_type["flash_ids"][0])]) == cart_type["flash_ids"][0]:
-					found = True
-					flash_types.append(f)
-					dprint("Found a BUNG Doctor GB Card 16M")
+				name = "BUNG Doctor GB Card 16M"
+			
+			found = False
+			if rom1 != rom2:
+				for f in probe["members"]:
+					if list(rom2[:len(supported_carts[f]["flash_ids"][0])]) == supported_carts[f]["flash_ids"][0]:
+						found = True
+						flash_types.append(f)
+						break
+			if found:
+				dprint("Found a {:s}".format(name))
+				if kind == "BUNG_16M":
 					self._cart_write(0x2000, 0x02, flashcart=False)
 					self._cart_write(0x6AAA, 0xAA, flashcart=True)
 					self._cart_write(0x2000, 0x01, flashcart=False)
@@ -2196,41 +2644,13 @@ class LK_Device(ABC):
 					self._cart_write(0x2000, 0x02, flashcart=False)
 					self._cart_write(0x6AAA, 0xF0, flashcart=True)
 					self._cart_write(0x2000, 0x00, flashcart=False)
-					break
+				elif kind == "GBAMP":
+					self._cart_write_flash(cart_type["commands"]["reset"], flashcart=True)
+				else:
+					self._cart_write_flash(cart_type["commands"]["reset"])
+				break
+			if kind in ("DMG-MBC5-32M-FLASH", "BUNG_16M"):
 				self._set_we_pin_wr()
-				continue
-
-			if "commands" in cart_type:
-				c = {
-					"reset":[],
-					"read_identifier":[],
-					"read_cfi":[],
-				}
-				if "reset" in cart_type["commands"]:
-					c["reset"] = cart_type["commands"]["reset"]
-					if cart_type["commands"]["reset"] not in cmds_reset:
-						cmds_reset.append(cart_type["commands"]["reset"])
-				if "unlock_read" in cart_type["commands"]:
-					if cart_type["commands"]["unlock_read"] not in cmds_unlock_read:
-						cmds_unlock_read.append(cart_type["commands"]["unlock_read"])
-				if "unlock" in cart_type["commands"]:
-					if cart_type["commands"]["unlock"] not in cmds_reset:
-						cmds_reset.append(cart_type["commands"]["unlock"])
-					if cart_type["commands"]["reset"] not in cmds_reset:
-						cmds_reset.append(cart_type["commands"]["reset"])
-				if "read_identifier" in cart_type["commands"]:
-					c["read_identifier"] = cart_type["commands"]["read_identifier"]
-				if "read_cfi" in cart_type["commands"]:
-					c["read_cfi"] = cart_type["commands"]["read_cfi"]
-				if len(c["read_identifier"]) > 0:
-					if self.MODE == "DMG" and cart_type["commands"]["read_identifier"][0][0] > 0x7000: continue
-					if c not in cmds:
-						found = False
-						for t in cmds:
-							if c["read_identifier"] == t["read_identifier"]:
-								found = True
-						if not found:
-							cmds.append(c)
 		
 		for c in cmds_reset:
 			for cmd in c:
@@ -2276,31 +2696,42 @@ class LK_Device(ABC):
 			self._cart_write_flash([[0, 0xFF]], True)
 			self._cart_write_flash([[0, 0xF0]], True)
 
-		for f in range(1, len(supported_carts)):
-			cart_type = supported_carts[f]
-			flashcart = Flashcart(config=cart_type, fncptr=fc_fncptr)
-			if "flash_ids" not in cart_type or len(cart_type["flash_ids"]) == 0: continue
-			if "commands" not in cart_type or len(cart_type["commands"]) == 0: continue
-			found = False
-			if flash_id_methods not in (None, []) and len(flash_id_methods) > 0:
-				for we, type, flash_id, _, cmd_rfi in flash_id_methods:
-					if (cmd_rfi != cart_type["commands"]["read_identifier"]): continue
-					if self.MODE == "DMG" and "write_pin" in cart_type and cart_type["write_pin"] != we_pins[we]: continue
-					fcm_flash_ids = list(map(list, {tuple(sublist) for sublist in cart_type["flash_ids"]}))
-					for fcm_flash_id in fcm_flash_ids:
-						if fcm_flash_id == flash_id[:len(fcm_flash_id)]:
-							if self.MODE == "DMG":
-								dprint("“{:s}” matches with Flash ID “{:s}” ({:s}/{:X}/{:X})".format(cart_type["names"][0], " ".join(format(x, '02X') for x in fcm_flash_id), we_pins[we], flash_id_cmds[type]["read_identifier"][0][0], flash_id_cmds[type]["read_identifier"][0][1]))
-							elif self.MODE == "AGB":
-								dprint("“{:s}” matches with Flash ID “{:s}” ({:X})/{:X}".format(cart_type["names"][0], " ".join(format(x, '02X') for x in fcm_flash_id), flash_id_cmds[type]["read_identifier"][0][0], flash_id_cmds[type]["read_identifier"][0][1]))
-							found = True
-							flash_type = f
-							flash_types.append(flash_type)
-							if "commands" in cart_type and "reset" in cart_type["commands"]:
-								self._cart_write_flash(cart_type["commands"]["reset"], flashcart=True)
-							break
-					if found is True: break
-			if found is False: continue
+		if len(flash_id_methods) > 0:
+			# Index of read identifier sequence → flash IDs → cart types
+			flash_id_index = {}
+			for f in range(1, len(supported_carts)):
+				cart_type = supported_carts[f]
+				if "flash_ids" not in cart_type or len(cart_type["flash_ids"]) == 0: continue
+				if "commands" not in cart_type or len(cart_type["commands"]) == 0: continue
+				if "read_identifier" not in cart_type["commands"]: continue
+				key = json.dumps(cart_type["commands"]["read_identifier"])
+				if key not in flash_id_index: flash_id_index[key] = {}
+				for fcm_flash_id in {tuple(sublist) for sublist in cart_type["flash_ids"]}:
+					if fcm_flash_id not in flash_id_index[key]: flash_id_index[key][fcm_flash_id] = []
+					flash_id_index[key][fcm_flash_id].append(f)
+			
+			matches = {}
+			for we, type, flash_id, _, cmd_rfi in flash_id_methods:
+				key = json.dumps(cmd_rfi)
+				if key not in flash_id_index: continue
+				for fcm_flash_id in flash_id_index[key]:
+					if list(fcm_flash_id) != flash_id[:len(fcm_flash_id)]: continue
+					for f in flash_id_index[key][fcm_flash_id]:
+						if f in matches: continue
+						cart_type = supported_carts[f]
+						if self.MODE == "DMG" and "write_pin" in cart_type and cart_type["write_pin"] != we_pins[we]: continue
+						if self.MODE == "DMG":
+							dprint("“{:s}” matches with Flash ID “{:s}” ({:s}/{:X}/{:X})".format(cart_type["names"][0], " ".join(format(x, '02X') for x in fcm_flash_id), we_pins[we], flash_id_cmds[type]["read_identifier"][0][0], flash_id_cmds[type]["read_identifier"][0][1]))
+						elif self.MODE == "AGB":
+							dprint("“{:s}” matches with Flash ID “{:s}” ({:X})/{:X}".format(cart_type["names"][0], " ".join(format(x, '02X') for x in fcm_flash_id), flash_id_cmds[type]["read_identifier"][0][0], flash_id_cmds[type]["read_identifier"][0][1]))
+						matches[f] = cart_type["commands"]["reset"] if "reset" in cart_type["commands"] else None
+			
+			cmds_reset_sent = []
+			for f in sorted(matches):
+				flash_types.append(f)
+				if matches[f] is not None and matches[f] not in cmds_reset_sent:
+					self._cart_write_flash(matches[f], flashcart=True)
+					cmds_reset_sent.append(matches[f])
 
 		dprint("Compatible flash types:", [(index, supported_carts[index]["names"][0]) for index in flash_types])
 
@@ -2383,7 +2814,7 @@ class LK_Device(ABC):
 		# Check flash size
 		if len(flash_types) > 0:
 			flash_type_id = flash_types[0]
-			flashcart = Flashcart(config=supported_carts[flash_type_id], fncptr=fc_fncptr)
+			flashcart = Flashcart(config=copy.deepcopy(supported_carts[flash_type_id]), fncptr=fc_fncptr)
 			if self.MODE == "DMG":
 				supp_flash_types = self.GetSupportedCartridgesDMG()
 			elif self.MODE == "AGB":
@@ -2557,7 +2988,7 @@ class LK_Device(ABC):
 				_mbc = args["verify_mbc"]
 			else:
 				_mbc = DMG_MBC().GetInstance(args=args, cart_write_fncptr=self._cart_write, cart_read_fncptr=self._cart_read, cart_powercycle_fncptr=self.CartPowerCycleOrAskReconnect, clk_toggle_fncptr=self._clk_toggle)
-			self._write(self.DEVICE_CMD["SET_MODE_DMG"], wait=self.FW["fw_ver"] >= 12)
+			self._write_cmd("SET_MODE_DMG", wait=self.FW["fw_ver"] >= 12)
 			
 			self._set_fw_variable("DMG_WRITE_CS_PULSE", 0)
 			self._set_fw_variable("DMG_READ_CS_PULSE", 0)
@@ -2579,7 +3010,7 @@ class LK_Device(ABC):
 		
 		elif self.MODE == "AGB":
 			self.INFO["dump_info"]["mapper_type"] = None
-			self._write(self.DEVICE_CMD["SET_MODE_AGB"], wait=self.FW["fw_ver"] >= 12)
+			self._write_cmd("SET_MODE_AGB", wait=self.FW["fw_ver"] >= 12)
 
 			buffer_len = 0x10000
 			size = 32 * 1024 * 1024
@@ -2691,12 +3122,16 @@ class LK_Device(ABC):
 					self._set_fw_variable("PULLUPS_ENABLED", enable_pullup_wr)
 
 		buffer = bytearray(size)
-		max_length = self.MAX_BUFFER_READ
+		digester = None
+		if not "verify_write" in args and not "bl_offset" in args:
+			digester = Util.Digester()
+		max_length = self.READ_SIZE_CTRL.SIZE
 		dprint("Max buffer size: 0x{:X}".format(max_length))
 		if is_3dmemory:
-			max_length = min(max_length, 0x1000)
+			max_length_cap = 0x1000
 		else:
-			max_length = min(max_length, 0x2000)
+			max_length_cap = 0x2000
+		max_length = min(max_length, max_length_cap)
 		self.INFO["dump_info"]["transfer_size"] = max_length
 		pos_total = 0
 		start_address = 0
@@ -2728,7 +3163,7 @@ class LK_Device(ABC):
 			if self.MODE == "DMG":
 				if _mbc.ResetBeforeBankChange(bank) is True:
 					dprint("Resetting the MBC")
-					self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True)
+					self._write_cmd("DMG_MBC_RESET", wait=True)
 				(start_address, bank_size) = _mbc.SelectBankROM(bank)
 				end_address = start_address + bank_size
 				buffer_len = min(buffer_len, _mbc.GetROMBankSize())
@@ -2764,6 +3199,7 @@ class LK_Device(ABC):
 						if file is not None: file.close()
 					except:
 						pass
+					if digester is not None: digester.Finish()
 					if self.CanPowerCycleCart(): self.CartPowerCycle()
 					return
 				
@@ -2778,6 +3214,11 @@ class LK_Device(ABC):
 						temp = self.ReadROM(address=pos, length=buffer_len, skip_init=skip_init, max_length=max_length)
 						if self.MODE == "AGB": self.SetAGBReadMethod(agb_read_method)
 						if self.MODE == "DMG": self.SetDMGReadMethod(dmg_read_method)
+					elif pos_total + buffer_len <= len(buffer) and buffer_len % min(buffer_len, max_length) == 0:
+						# Normal read, directly into the output buffer
+						temp = memoryview(buffer)[pos_total:pos_total+buffer_len]
+						if self.ReadROMInto(address=pos, view=temp, skip_init=skip_init, max_length=max_length) is False:
+							temp = bytearray()
 					else:
 						# Normal read
 						temp = self.ReadROM(address=pos, length=buffer_len, skip_init=skip_init, max_length=max_length)
@@ -2799,8 +3240,8 @@ class LK_Device(ABC):
 						dprint("Failed to receive 0x{:X} bytes from the device at position 0x{:X}.".format(buffer_len, pos_temp))
 					else:
 						dprint("Failed to receive 0x{:X} bytes from the device at position 0x{:X}. Decreasing maximum transfer buffer size to 0x{:X}.".format(buffer_len, pos_temp, max_length >> 1))
-						max_length >>= 1
-						self.MAX_BUFFER_READ = max_length
+						max_length = min(self.READ_SIZE_CTRL.Failure(max_length), max_length_cap)
+						self.READ_PIPELINE_DEPTH = max(1, self.READ_PIPELINE_DEPTH >> 1)
 						err_text += "\nBuffer size adjusted to {:d} bytes.".format(max_length)
 					if ".dev" in Util.VERSION_PEP440 and not Util.DEBUG: print(err_text)
 					
@@ -2818,6 +3259,13 @@ class LK_Device(ABC):
 				elif lives < 20:
 					lives = 20
 				
+				# Grow the transfer size again after a streak of clean transfers
+				if min(self.READ_SIZE_CTRL.Success(), max_length_cap) > max_length:
+					max_length = min(self.READ_SIZE_CTRL.SIZE, max_length_cap)
+					self.READ_PIPELINE_DEPTH = min(LK_Device.READ_PIPELINE_DEPTH, self.READ_PIPELINE_DEPTH << 1)
+					self.INFO["dump_info"]["transfer_size"] = max_length
+					skip_init = False
+				
 				if file is not None:
 					if "bl_layout" in args and args["bl_layout"] == 1:
 						file.write(temp[0x0000:0x2000])
@@ -2825,8 +3273,14 @@ class LK_Device(ABC):
 						file.write(temp[0x2000:0x4000])
 					else:
 						file.write(temp)
-				buffer[pos_total:pos_total+len(temp)] = temp
+				if not isinstance(temp, memoryview):
+					if digester is not None and pos_total + len(temp) > len(buffer):
+						# Buffer needs to grow, fall back to hashing it afterwards
+						digester.Finish()
+						digester = None
+					buffer[pos_total:pos_total+len(temp)] = temp
 				pos_total += len(temp)
+				if digester is not None: digester.Update(temp)
 				
 				if "verify_write" in args:
 					check = args["verify_write"][pos_total-len(temp):pos_total]
@@ -2923,10 +3377,17 @@ class LK_Device(ABC):
 					file.seek(0x1FFFF00)
 					file.write(buffer[0x1FFFF00:0x2000000])
 
-			self.INFO["file_crc32"] = zlib.crc32(buffer) & 0xFFFFFFFF
-			self.INFO["file_sha1"] = hashlib.sha1(buffer).hexdigest()
-			self.INFO["file_sha256"] = hashlib.sha256(buffer).hexdigest()
-			self.INFO["file_md5"] = hashlib.md5(buffer).hexdigest()
+			hashes = None
+			if digester is not None:
+				if digester.SIZE < len(buffer): digester.Update(memoryview(buffer)[digester.SIZE:])
+				hashes = digester.Finish()
+				if "eeprom_data" in self.INFO["dump_info"]: hashes = None # buffer was modified after the transfer
+			if hashes is None:
+				hashes = { "crc32":zlib.crc32(buffer) & 0xFFFFFFFF, "sha1":hashlib.sha1(buffer).hexdigest(), "sha256":hashlib.sha256(buffer).hexdigest(), "md5":hashlib.md5(buffer).hexdigest() }
+			self.INFO["file_crc32"] = hashes["crc32"]
+			self.INFO["file_sha1"] = hashes["sha1"]
+			self.INFO["file_sha256"] = hashes["sha256"]
+			self.INFO["file_md5"] = hashes["md5"]
 			self.INFO["dump_info"]["hash_crc32"] = self.INFO["file_crc32"]
 			self.INFO["dump_info"]["hash_sha1"] = self.INFO["file_sha1"]
 			self.INFO["dump_info"]["hash_sha256"] = self.INFO["file_sha256"]
@@ -2949,7 +3410,7 @@ class LK_Device(ABC):
 		if self.MODE == "DMG":
 			if _mbc.ResetBeforeBankChange(0) is True:
 				dprint("Resetting the MBC")
-				self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True)
+				self._write_cmd("DMG_MBC_RESET", wait=True)
 			_mbc.SelectBankROM(0)
 			self.SetDMGReadMethod(dmg_read_method)
 		elif self.MODE == "AGB":
@@ -3012,7 +3473,7 @@ class LK_Device(ABC):
 		self._set_fw_variable("STATUS_REGISTER_VALUE", 0x80)
 
 		if self.MODE == "DMG":
-			self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True) # fixes Taobao FRAM cart save data
+			self._write_cmd("DMG_MBC_RESET", wait=True) # fixes Taobao FRAM cart save data
 			_mbc = DMG_MBC().GetInstance(args=args, cart_write_fncptr=self._cart_write, cart_read_fncptr=self._cart_read, cart_powercycle_fncptr=self.CartPowerCycleOrAskReconnect, clk_toggle_fncptr=self._clk_toggle)
 			if not self.IsSupportedMbc(args["mbc"]):
 				msg = "This cartridge uses a mapper that is not supported by {:s} using your {:s} device.".format(Util.APPNAME, self.GetFullName())
@@ -3026,7 +3487,7 @@ class LK_Device(ABC):
 			ram_banks = _mbc.GetRAMBanks(save_size)
 
 			buffer_len = min(0x200, _mbc.GetRAMBankSize())
-			self._write(self.DEVICE_CMD["SET_MODE_DMG"], wait=self.FW["fw_ver"] >= 12)
+			self._write_cmd("SET_MODE_DMG", wait=self.FW["fw_ver"] >= 12)
 			self._set_fw_variable("DMG_WRITE_CS_PULSE", 0)
 			self._set_fw_variable("DMG_READ_CS_PULSE", 0)
 
@@ -3095,7 +3556,7 @@ class LK_Device(ABC):
 			_mbc.EnableRAM(enable=True)
 		
 		elif self.MODE == "AGB":
-			self._write(self.DEVICE_CMD["SET_MODE_AGB"], wait=self.FW["fw_ver"] >= 12)
+			self._write_cmd("SET_MODE_AGB", wait=self.FW["fw_ver"] >= 12)
 			self._write(self.DEVICE_CMD["SET_VOLTAGE_3_3V"], wait=self.FW["fw_ver"] >= 12)
 			buffer_len = 0x2000
 			if "save_size" in args:
@@ -3160,11 +3621,6 @@ class LK_Device(ABC):
 				if self.FW["fw_ver"] >= 12: self.wait_for_ack()
 				# ↑↑↑ Load commands into firmware
 			
-			# Bootleg mapper
-			if cart_type is not None and "flash_bank_select_type" in cart_type and cart_type["flash_bank_select_type"] == 1:
-				sram_5 = struct.unpack("B", bytes(self._cart_read(address=5, length=1, agb_save_flash=True)))[0]
-				self._cart_write(address=5, value=1, sram=True)
-			
 			commands = [ # save type commands
 				[ [None], [None] ], # No save
 				[ bytearray([ self.DEVICE_CMD["AGB_CART_READ_EEPROM"], 1]), bytearray([ self.DEVICE_CMD["AGB_CART_WRITE_EEPROM"], 1]) ], # 4K EEPROM
@@ -3220,11 +3676,44 @@ class LK_Device(ABC):
 						while len(buffer) < save_size:
 							buffer += bytearray(buffer)
 
+		# ↓↓↓ Differential restore
+		save_current = None
+		diff_regions = []
+		if args["mode"] == 3 and "compare_sectors" in args and args["compare_sectors"] is True:
+			if self.MODE == "DMG":
+				differential = _mbc.GetName() not in ("MBC6", "MBC7", "TAMA5", "Xploder GB") and args["save_type"] != 0x204
+			else:
+				differential = args["save_type"] in (1, 2, 3, 7, 8) or (args["save_type"] in (4, 5) and agb_flash_chip != 0x1F3D and not ("ereader" in self.INFO and self.INFO["ereader"] is True))
+			if differential:
+				self.SetProgress({"action":"INITIALIZE", "method":"SAVE_READ", "size":save_size})
+				read_args = copy.copy(args)
+				read_args.update({"mode":2, "path":None, "rtc":False, "verify_write":buffer})
+				self.INFO["data"] = None
+				if self._BackupRestoreRAM(read_args) is not True: return False
+				save_current = self.INFO["data"]
+				diff_target = buffer
+				if self.MODE == "DMG" and _mbc.GetName() == "MBC2":
+					save_current = bytearray([ x & 0x0F for x in save_current ])
+					diff_target = bytearray([ x & 0x0F for x in buffer ])
+				chunks = [ o for o in range(0, save_size, buffer_len) if save_current[o:o+buffer_len] != diff_target[o:o+buffer_len] ]
+				print("Save data chunks to update: {:d} of {:d} ({:s})".format(len(chunks), math.ceil(save_size / buffer_len), Util.formatFileSize(size=min(save_size, len(chunks) * buffer_len))))
+		# ↑↑↑ Differential restore
+
+		# Bootleg mapper (set up after the differential restore pre-read, which restores address 5 when it finishes)
+		if self.MODE == "AGB" and cart_type is not None and "flash_bank_select_type" in cart_type and cart_type["flash_bank_select_type"] == 1:
+			sram_5 = struct.unpack("B", bytes(self._cart_read(address=5, length=1, agb_save_flash=True)))[0]
+			self._cart_write(address=5, value=1, sram=True)
+
 		# Main loop
 		if not (args["mode"] == 2 and "verify_write" in args and args["verify_write"]):
 			self.INFO["action"] = self.ACTIONS[action]
 			self.SetProgress({"action":"INITIALIZE", "method":action, "size":save_size+extra_size})
 		
+		(read_size, write_size) = self.GetSaveTransferSizes()
+		read_size_ctrl = Util.TransferSizeController(read_size, read_size)
+		write_size_ctrl = Util.TransferSizeController(write_size, write_size)
+		dprint("Save data transfer sizes: read=0x{:X}, write=0x{:X}".format(read_size, write_size))
+		
 		buffer_offset = 0
 		for bank in range(0, ram_banks):
 			if self.MODE == "DMG":
@@ -3271,7 +3760,6 @@ class LK_Device(ABC):
 						dprint("Unknown bank switching method")
 					time.sleep(0.05)
 
-			max_length = 64
 			dprint("start_address=0x{:X}, end_address=0x{:X}, buffer_len=0x{:X}, buffer_offset=0x{:X}".format(start_address, end_address, buffer_len, buffer_offset))
 			pos = start_address
 			while pos < end_address:
@@ -3284,7 +3772,11 @@ class LK_Device(ABC):
 					if self.CanPowerCycleCart(): self.CartPowerCycle()
 					return
 				
-				if args["mode"] == 2: # Backup
+				if args["mode"] == 2 and "read_regions" in args and not any(start < buffer_offset + buffer_len and end > buffer_offset for (start, end) in args["read_regions"]): # Left unchanged by differential restore
+					buffer += args["verify_write"][buffer_offset:buffer_offset+buffer_len]
+					self.SetProgress({"action":"UPDATE_POS", "pos":len(buffer)})
+				
+				elif args["mode"] == 2: # Backup
 					in_temp = [None] * 2
 					if "verify_read" in args and args["verify_read"]: # Read twice for detecting instabilities
 						xe = 2
@@ -3296,35 +3788,38 @@ class LK_Device(ABC):
 						else:
 							self.NO_PROG_UPDATE = False
 						
-						if self.MODE == "DMG" and _mbc.GetName() == "MBC7":
-							in_temp[x] = self.ReadRAM_MBC7(address=pos, length=buffer_len)
-						elif self.MODE == "DMG" and _mbc.GetName() == "MBC6" and bank > 7: # MBC6 flash save memory
-							in_temp[x] = self.ReadROM(address=pos, length=buffer_len, skip_init=False, max_length=max_length)
-						elif self.MODE == "DMG" and _mbc.GetName() == "TAMA5":
-							in_temp[x] = self.ReadRAM_TAMA5()
-						elif self.MODE == "DMG" and _mbc.GetName() == "Xploder GB":
-							in_temp[x] = self.ReadROM(address=0x20000+pos, length=buffer_len, skip_init=False, max_length=max_length)
-						elif self.MODE == "AGB" and args["save_type"] in (1, 2): # EEPROM
-							in_temp[x] = self.ReadRAM(address=int(pos/8), length=buffer_len, command=command, max_length=max_length)
-						elif self.MODE == "AGB" and args["save_type"] == 6: # DACS
-							in_temp[x] = self.ReadROM(address=0x1F00000+pos, length=buffer_len, skip_init=False, max_length=max_length)
-						elif self.MODE == "DMG" and _mbc.GetName() == "MBC2":
-							in_temp[x] = self.ReadRAM(address=pos, length=buffer_len, command=command, max_length=max_length)
-							for i in range(0, len(in_temp[x])):
-								in_temp[x][i] = in_temp[x][i] & 0x0F
-						else:
-							in_temp[x] = self.ReadRAM(address=pos, length=buffer_len, command=command, max_length=max_length)
-
-						if len(in_temp[x]) != buffer_len:
-							if (max_length >> 1) < 64:
-								dprint("Received 0x{:X} bytes instead of 0x{:X} bytes from the device at position 0x{:X}!".format(len(in_temp[x]), buffer_len, len(buffer)))
-								max_length = 64
+						while True:
+							max_length = min(read_size_ctrl.SIZE, buffer_len)
+							if self.MODE == "DMG" and _mbc.GetName() == "MBC7":
+								in_temp[x] = self.ReadRAM_MBC7(address=pos, length=buffer_len)
+							elif self.MODE == "DMG" and _mbc.GetName() == "MBC6" and bank > 7: # MBC6 flash save memory
+								in_temp[x] = self.ReadROM(address=pos, length=buffer_len, skip_init=False, max_length=max_length)
+							elif self.MODE == "DMG" and _mbc.GetName() == "TAMA5":
+								in_temp[x] = self.ReadRAM_TAMA5()
+							elif self.MODE == "DMG" and _mbc.GetName() == "Xploder GB":
+								in_temp[x] = self.ReadROM(address=0x20000+pos, length=buffer_len, skip_init=False, max_length=max_length)
+							elif self.MODE == "AGB" and args["save_type"] in (1, 2): # EEPROM
+								in_temp[x] = self.ReadRAM(address=int(pos/8), length=buffer_len, command=command, max_length=max_length)
+							elif self.MODE == "AGB" and args["save_type"] == 6: # DACS
+								in_temp[x] = self.ReadROM(address=0x1F00000+pos, length=buffer_len, skip_init=False, max_length=max_length)
+							elif self.MODE == "DMG" and _mbc.GetName() == "MBC2":
+								in_temp[x] = self.ReadRAM(address=pos, length=buffer_len, command=command, max_length=max_length)
+								for i in range(0, len(in_temp[x])):
+									in_temp[x][i] = in_temp[x][i] & 0x0F
 							else:
-								dprint("Received 0x{:X} bytes instead of 0x{:X} bytes from the device at position 0x{:X}! Decreasing maximum transfer buffer length to 0x{:X}.".format(len(in_temp[x]), buffer_len, len(buffer), max_length >> 1))
-								max_length >>= 1
+								in_temp[x] = self.ReadRAM(address=pos, length=buffer_len, command=command, max_length=max_length)
+
+							if len(in_temp[x]) == buffer_len:
+								read_size_ctrl.Success()
+								break
 							self.DEVICE.reset_input_buffer()
 							self.DEVICE.reset_output_buffer()
-							continue
+							if max_length <= read_size_ctrl.MIN_SIZE:
+								dprint("Received 0x{:X} bytes instead of 0x{:X} bytes from the device at position 0x{:X}!".format(len(in_temp[x]), buffer_len, len(buffer)))
+								self.SetProgress({"action":"ABORT", "info_type":"msgbox_critical", "info_msg":"Failed to read save data. Please ensure that the cartridge contacts are clean.", "abortable":False})
+								return False
+							dprint("Received 0x{:X} bytes instead of 0x{:X} bytes from the device at position 0x{:X}! Decreasing maximum transfer buffer length to 0x{:X}.".format(len(in_temp[x]), buffer_len, len(buffer), max(read_size_ctrl.MIN_SIZE, max_length >> 1)))
+							read_size_ctrl.Failure(max_length)
 					
 					if xe == 2 and in_temp[0] != in_temp[1]:
 						self.SetProgress({"action":"ABORT", "info_type":"msgbox_critical", "info_msg":"Failed to read save data consistently. Please ensure that the cartridge contacts are clean.", "abortable":False})
@@ -3334,7 +3829,11 @@ class LK_Device(ABC):
 					buffer += temp
 					self.SetProgress({"action":"UPDATE_POS", "pos":len(buffer)})
 				
+				elif args["mode"] == 3 and save_current is not None and save_current[buffer_offset:buffer_offset+buffer_len] == diff_target[buffer_offset:buffer_offset+buffer_len]: # Differential restore
+					self.SetProgress({"action":"UPDATE_POS", "pos":buffer_offset+buffer_len})
+				
 				elif args["mode"] == 3: # Restore
+					if save_current is not None: diff_regions.append((buffer_offset, buffer_offset + buffer_len))
 					if self.MODE == "DMG" and _mbc.GetName() == "MBC7":
 						self.WriteEEPROM_MBC7(address=pos, buffer=buffer[buffer_offset:buffer_offset+buffer_len])
 					elif self.MODE == "DMG" and _mbc.GetName() == "MBC6" and bank > 7: # MBC6 flash save memory
@@ -3348,7 +3847,11 @@ class LK_Device(ABC):
 					elif self.MODE == "DMG" and _mbc.GetName() == "Xploder GB":
 						self.WriteROM_DMG_EEPROM(address=pos, buffer=buffer[buffer_offset:buffer_offset+buffer_len], bank=bank+8)
 					elif self.MODE == "AGB" and args["save_type"] in (1, 2): # EEPROM
-						self.WriteRAM(address=int(pos/8), buffer=buffer[buffer_offset:buffer_offset+buffer_len], command=command)
+						(span_from, span_to) = (0, buffer_len)
+						if save_current is not None: # only rewrite the changed 8 byte blocks
+							blocks = [ i for i in range(0, buffer_len, 8) if save_current[buffer_offset+i:buffer_offset+i+8] != buffer[buffer_offset+i:buffer_offset+i+8] ]
+							(span_from, span_to) = (blocks[0], blocks[-1] + 8)
+						self.WriteRAM(address=int((pos+span_from)/8), buffer=buffer[buffer_offset+span_from:buffer_offset+span_to], command=command)
 					elif self.MODE == "AGB" and args["save_type"] in (4, 5): # FLASH
 						sector_address = pos % 0x10000
 						if agb_flash_chip == 0x1F3D: # Atmel AT29LV512
@@ -3443,7 +3946,23 @@ class LK_Device(ABC):
 						else:
 							dprint("DACS: Skipping read-only area 0x{:X}–0x{:X}".format(0x1F00000+pos, 0x1F00000+pos+buffer_len-1))
 					else:
-						self.WriteRAM(address=pos, buffer=buffer[buffer_offset:buffer_offset+buffer_len], command=command)
+						while True:
+							max_length = min(write_size_ctrl.SIZE, buffer_len)
+							if self.WriteRAM(address=pos, buffer=buffer[buffer_offset:buffer_offset+buffer_len], command=command, max_length=max_length) is not False:
+								write_size_ctrl.Success()
+								break
+							if "from_user" in self.CANCEL_ARGS and self.CANCEL_ARGS["from_user"]: break
+							if max_length <= write_size_ctrl.MIN_SIZE:
+								self.SetProgress({"action":"ABORT", "info_type":"msgbox_critical", "info_msg":"Failed to write save data. Please ensure that the cartridge contacts are clean.", "abortable":False})
+								return False
+							dprint("Failed to write 0x{:X} bytes at position 0x{:X}. Decreasing maximum transfer buffer length to 0x{:X}.".format(buffer_len, pos, max(write_size_ctrl.MIN_SIZE, max_length >> 1)))
+							write_size_ctrl.Failure(max_length)
+							self.ERROR = False
+							self.CANCEL = False
+							self.CANCEL_ARGS = {}
+							self.InvalidateFirmwareVariables()
+							self.DEVICE.reset_input_buffer()
+							self.DEVICE.reset_output_buffer()
 					self.SetProgress({"action":"UPDATE_POS", "pos":buffer_offset+buffer_len})
 				
 				pos += buffer_len
@@ -3546,6 +4065,7 @@ class LK_Device(ABC):
 
 				path = args["path"] # backup path
 				verify_args.update({"mode":2, "verify_write":buffer, "path":None})
+				if save_current is not None: verify_args["read_regions"] = diff_regions
 				self.ReadROM(0, 4) # dummy read
 				self.INFO["data"] = None
 				if self._BackupRestoreRAM(verify_args) is False: return
@@ -3612,6 +4132,14 @@ class LK_Device(ABC):
 		return True
 	
 	def _FlashROM(self, args):
+		if "buffer" in args:
+			data_import = Util.RomImage(source=args["buffer"])
+		else:
+			data_import = Util.RomImage(path=args["path"])
+		with data_import:
+			return self._DoFlashROM(args, data_import)
+
+	def _DoFlashROM(self, args, data_import):
 		# Initialization
 		self.FAST_READ = True
 		temp = None
@@ -3621,37 +4149,27 @@ class LK_Device(ABC):
 		verify_len = 0
 		enable_pullup_wr = False
 
-		if "buffer" in args:
-			data_import = args["buffer"]
-		else:
-			with open(args["path"], "rb") as file: data_import = bytearray(file.read())
-		
 		flash_offset = 0 # Batteryless SRAM or Transfer Resume
 		if "flash_offset" in args:
 			flash_offset = args["flash_offset"]
 		if "start_addr" in args and args["start_addr"] > 0:
-			data_import = bytearray(b'\xFF' * args["start_addr"]) + data_import
+			data_import.Prepend(args["start_addr"])
 		
 		# Batteryless SRAM
 		if "bl_layout" in args and args["bl_layout"] in (1, 2):
 			args["bl_size"] <<= 1
 			args["flash_size"] <<= 1
-			bl_data_import = bytearray(b'\xFF' * args["bl_size"])
-			
 			if args["bl_layout"] == 1:
-				for i in range(0, args["bl_size"] // 0x4000):
-					bl_data_import[i*0x4000:i*0x4000+0x2000] = data_import[i*0x2000:i*0x2000+0x2000]
+				data_import.Interleave(size=args["bl_size"], block_size=0x2000, offset=0)
 			elif args["bl_layout"] == 2:
-				for i in range(0, args["bl_size"] // 0x4000):
-					bl_data_import[i*0x4000+0x2000:i*0x4000+0x2000+0x2000] = data_import[i*0x2000:i*0x2000+0x2000]
-			data_import = bl_data_import
+				data_import.Interleave(size=args["bl_size"], block_size=0x2000, offset=0x2000)
 		
 		# Pad data
 		if len(data_import) > 0:
 			if len(data_import) < 0x400:
-				data_import += bytearray([0xFF] * (0x400 - len(data_import)))
+				data_import.Append(0x400 - len(data_import))
 			if len(data_import) % 0x4000 > 0:
-				data_import += bytearray([0xFF] * (0x4000 - len(data_import) % 0x4000))
+				data_import.Append(0x4000 - len(data_import) % 0x4000)
 			
 			# Skip writing the last 256 bytes of 32 MiB ROMs with EEPROM save type
 			if self.MODE == "AGB" and len(data_import) == 0x2000000:
@@ -3668,7 +4186,7 @@ class LK_Device(ABC):
 					temp_ver = "N/A"
 				if "EEPROM" in temp_ver:
 					print("{:s}Note: The last 256 bytes of this 32 MiB ROM will not be written as this area is reserved by the EEPROM save type.{:s}".format(ANSI.YELLOW, ANSI.RESET))
-					data_import = data_import[:0x1FFFF00]
+					data_import.Truncate(0x1FFFF00)
 		
 		# Fix bootlogo and header
 		if "fix_bootlogo" in args and isinstance(args["fix_bootlogo"], bytearray):
@@ -3782,15 +4300,11 @@ class LK_Device(ABC):
 		if not flashcart.SupportsChipErase() and flashcart.SupportsSectorErase() and args["prefer_chip_erase"]:
 			print("{:s}Note: Chip erase mode is not supported for this flash cartridge type. Sector erase mode will be used.{:s}\n".format(ANSI.YELLOW, ANSI.RESET))
 			# Pad data if the user wants to erase the entire cartridge
-			if data_import == bytearray([0xFF] * len(data_import)):
+			if Util.BlankMap(data_import, chunk_size=0x4000).IsBlank(0, len(data_import)):
 				flash_size = flashcart.GetFlashSize()
 				if flash_size is not False and len(data_import) < flash_size:
-					# Pad with FF till the end (with MemoryError fix)
-					pad_len = flash_size - len(data_import)
-					while pad_len > 0x2000000:
-						data_import += bytearray([0xFF] * 0x2000000)
-						pad_len -= 0x2000000
-					data_import += bytearray([0xFF] * (flash_size - len(data_import)))
+					# Pad with FF till the end
+					data_import.Append(flash_size - len(data_import))
 		# ↑↑↑ Pad data for full chip erase on sector erase mode
 
 		# ↓↓↓ Flashcart configuration
@@ -3813,7 +4327,7 @@ class LK_Device(ABC):
 		_mbc = None
 		errmsg_mbc_selection = ""
 		if self.MODE == "DMG":
-			self._write(self.DEVICE_CMD["SET_MODE_DMG"], wait=self.FW["fw_ver"] >= 12)
+			self._write_cmd("SET_MODE_DMG", wait=self.FW["fw_ver"] >= 12)
 			mbc = flashcart.GetMBC()
 			if mbc is not False and isinstance(mbc, int):
 				args["mbc"] = mbc
@@ -3847,7 +4361,7 @@ class LK_Device(ABC):
 				errmsg_mbc_selection += "\n- Check mapper type ROM size limit: likely up to {:s}".format(Util.formatFileSize(size=_mbc.GetMaxROMSize()))
 
 		elif self.MODE == "AGB":
-			self._write(self.DEVICE_CMD["SET_MODE_AGB"], wait=self.FW["fw_ver"] >= 12)
+			self._write_cmd("SET_MODE_AGB", wait=self.FW["fw_ver"] >= 12)
 			if flashcart and "flash_bank_size" in cart_type:
 				end_bank = math.ceil(len(data_import) / cart_type["flash_bank_size"])
 			else:
@@ -3866,7 +4380,7 @@ class LK_Device(ABC):
 				if os.path.exists(os.path.splitext(args["path"])[0] + ".map"):
 					with open(os.path.splitext(args["path"])[0] + ".map", "rb") as file: args["buffer_map"] = file.read()
 				else:
-					temp = data_import
+					temp = data_import[0:len(data_import)]
 					if len(temp) == 0: temp = bytearray([0xFF] * 0x180)
 					try:
 						gbmem = GBMemoryMap(rom=temp, oldmap=_mbc.ReadHiddenSector())
@@ -4046,6 +4560,7 @@ class LK_Device(ABC):
 		# ↑↑↑ Preparations
 		
 		# ↓↓↓ Read Flash ID
+		flash_id = None
 		if "flash_ids" in cart_type:
 			(verified, flash_id) = flashcart.VerifyFlashID()
 			if not verified and not command_set_type == "BLAZE_XPLODER":
@@ -4061,7 +4576,11 @@ class LK_Device(ABC):
 		write_sectors = []
 		verify_sectors = []
 		sector_pos = 0
-		delta_state_new = None
+		delta_state_key = None
+		delta_state_old = None
+		delta_changed = None
+		compare_sectors = "compare_sectors" in args and args["compare_sectors"] is True
+		plan_confirmed = False
 		flash_capacity = len(data_import)
 		if sector_map is not None and sector_map is not False:
 			smallest_sector_size = flashcart.GetSmallestSectorSize()
@@ -4071,13 +4590,34 @@ class LK_Device(ABC):
 				if flash_capacity < len(data_import) and not (flashcart.SupportsChipErase() and args["prefer_chip_erase"]):
 					sector_offsets = flashcart.GetSectorOffsets(rom_size=len(data_import), rom_bank_size=rom_bank_size)
 
-			sector_offsets_hash = base64.urlsafe_b64encode(hashlib.sha1(str(sector_offsets).encode("UTF-8")).digest()).decode("ASCII", "ignore")[:4]
-
 			# Delta flashing
 			if len(sector_offsets) > 1:
+				if compare_sectors and self.FW["fw_ver"] >= 12 and not cart_type["command_set"] == "GBAMP":
+					delta_state_key = Util.GetDeltaStateKey(mode=self.MODE, flash_id=flash_id, cfi=flashcart.CONFIG["cfi"] if "cfi" in flashcart.CONFIG else None, sector_offsets=sector_offsets)
+					delta_state_old = Util.GetDeltaState(delta_state_key)
+					if delta_state_old is not None:
+						# Cheap check whether the cartridge still holds what was written last time
+						(fp_address, fp_length, fp_crc32) = delta_state_old["fingerprint"]
+						flashcart.Reset(full_reset=True)
+						flashcart.SelectBankROM(0)
+						if self.GetCRC32(address=fp_address, length=fp_length) != fp_crc32:
+							dprint("Delta flashing state is stale, the cartridge content has changed since")
+							Util.SetDeltaState(delta_state_key, None)
+							delta_state_old = None
+						if flashcart.Unlock() is False: return False
+				
 				splitext = os.path.splitext(args["path"])
-				if splitext[0].endswith(".delta") and os.path.exists(splitext[0][:-6] + splitext[1]):
-					delta_state_new = []
+				if delta_state_old is not None and not ("flash_sectors" in args and len(args["flash_sectors"]) > 0) and not flash_offset > 0:
+					# The stored state only decides which sectors are known to differ; all others are still compared on the cartridge
+					delta_changed = set()
+					for (s_from, s_size) in sector_offsets:
+						if s_from >= len(data_import): break
+						if delta_state_old["sectors"].get(s_from) != [ s_size, zlib.crc32(data_import[s_from:s_from+s_size]) & 0xFFFFFFFF ]:
+							delta_changed.add(s_from)
+						write_sectors.append([ s_from, s_size ])
+					dprint("Sectors known to differ from the last written state:", len(delta_changed))
+				
+				elif splitext[0].endswith(".delta") and os.path.exists(splitext[0][:-6] + splitext[1]):
 					with open(splitext[0][:-6] + splitext[1], "rb") as f:
 						for i in range(0, len(sector_offsets)):
 							s_from = sector_offsets[i][0]
@@ -4085,27 +4625,8 @@ class LK_Device(ABC):
 							s_to = s_from + s_size
 							if data_import[s_from:s_to] != f.read(s_to - s_from):
 								x = [ s_from, s_size, zlib.crc32(data_import[s_from:s_to]) & 0xFFFFFFFF ]
-								delta_state_new.append(x)
+								write_sectors.append(x)
 								dprint("Sector differs:", x)
-					write_sectors = copy.copy(delta_state_new)
-					json_file = "{:s}_{:s}.json".format(splitext[0], sector_offsets_hash)
-					if os.path.exists(json_file):
-						with open(json_file, "rb") as f:
-							try:
-								delta_state_old = json.loads(f.read().decode("UTF-8-SIG"))
-							except:
-								delta_state_old = []
-							if len(delta_state_old) > 0:
-								for x in delta_state_old:
-									if x in write_sectors:
-										del(write_sectors[write_sectors.index(x)])
-										dprint("Skipping sector:", x)
-									else:
-										write_sectors2 = []
-										for y in write_sectors: write_sectors2.append(y[:-1])
-										if x[:-1] not in write_sectors2:
-											write_sectors.append(x)
-											dprint("Forcing sector:", x)
 					
 					if len(write_sectors) == 0:
 						self.SetProgress({"action":"ABORT", "info_type":"msgbox_critical", "info_msg":"No flash sectors were found that would need to be updated for delta flashing.", "abortable":False})
@@ -4119,7 +4640,7 @@ class LK_Device(ABC):
 						flash_size = len(data_import) - flash_offset
 					else:
 						flash_size = args["flash_size"]
-						data_import = data_import[:flash_size]
+						data_import.Truncate(flash_size)
 					bl_sectors = []
 					for sector in sector_offsets:
 						if flash_offset > sector[0]: continue
@@ -4127,7 +4648,7 @@ class LK_Device(ABC):
 						bl_sectors.append(sector)
 					write_sectors = bl_sectors
 					if "bl_save" in args:
-						data_import = bytearray([0] * bl_sectors[0][0]) + data_import
+						data_import.Prepend(bl_sectors[0][0], fill=0)
 				else:
 					write_sectors = []
 					for item in sector_offsets:
@@ -4174,6 +4695,9 @@ class LK_Device(ABC):
 			buffer_len = 0x2000
 		dprint("Transfer buffer length is 0x{:X}".format(buffer_len))
 		
+		blank_map = Util.BlankMap(data_import, chunk_size=min(buffer_len, 0x1000))
+		dprint("Blank regions in the ROM data:", ", ".join("0x{:X}~0x{:X}".format(r[0], r[1]) for r in blank_map.GetRanges()))
+		
 		current_bank = 0
 		start_bank = 0
 		start_address = 0
@@ -4186,6 +4710,124 @@ class LK_Device(ABC):
 			self.SetProgress({"action":"ABORT", "info_type":"msgbox_critical", "info_msg":"Coulnd’t start writing ROM because the flash cart couldn’t be detected properly.", "abortable":False})
 			return False
 
+		# ↓↓↓ Plan sector updates
+		if not chip_erase and self.FW["fw_ver"] >= 12 and not (flashcart and cart_type["command_set"] == "GBAMP"):
+			# Split the sectors that need to be compared on the cartridge at ROM bank boundaries
+			segments = []
+			for sector in write_sectors:
+				if sector[:2] not in sector_offsets or sector[0] >= len(data_import):
+					continue
+				if delta_changed is not None and sector[0] in delta_changed:
+					continue
+				if not compare_sectors and not blank_map.IsBlank(sector[0], sector[1]):
+					# Blank sectors are always checked, as they can be skipped entirely if the cartridge is blank there as well
+					continue
+				pos = sector[0]
+				while pos < sector[0] + sector[1]:
+					bank = math.floor(pos / rom_bank_size)
+					length = min(sector[0] + sector[1], (bank + 1) * rom_bank_size) - pos
+					segments.append((sector[0], bank, pos, length))
+					pos += length
+			
+			# Contiguous segments within the same bank are compared with a single CRC32 request; mismatching runs are bisected
+			runs = []
+			for segment in segments:
+				if len(runs) > 0 and runs[-1][-1][1] == segment[1] and runs[-1][-1][2] + runs[-1][-1][3] == segment[2]:
+					runs[-1].append(segment)
+				else:
+					runs.append([segment])
+			
+			mismatched = set()
+			selected_bank = None
+			bank_address = 0
+			pending = list(reversed(runs))
+			while len(pending) > 0:
+				if self.CANCEL:
+					cancel_args = {"action":"ABORT", "abortable":False}
+					cancel_args.update(self.CANCEL_ARGS)
+					self.CANCEL_ARGS = {}
+					self.ERROR_ARGS = {}
+					self.SetProgress(cancel_args)
+					if self.CanPowerCycleCart(): self.CartPowerCycle()
+					return
+				
+				run = [segment for segment in pending.pop() if segment[0] not in mismatched]
+				if len(run) == 0: continue
+				bank = run[0][1]
+				
+				# ↓↓↓ Switch ROM bank
+				if self.MODE == "DMG":
+					if bank != selected_bank:
+						if _mbc.ResetBeforeBankChange(bank) is True:
+							dprint("Resetting the MBC")
+							self._write_cmd("DMG_MBC_RESET", wait=True)
+						(bank_address, _) = _mbc.SelectBankROM(bank)
+						if flashcart.PulseResetAfterWrite():
+							if bank == 0:
+								if self.FW["fw_ver"] < 2:
+									self._write_cmd("OFW_GB_CART_MODE")
+								else:
+									self._write_cmd("SET_MODE_DMG", wait=self.FW["fw_ver"] >= 12)
+								self._write_cmd("DMG_MBC_RESET", wait=True)
+						self._set_fw_variable("DMG_ROM_BANK", bank)
+						if "start_addr" in flashcart.CONFIG and bank == 0: bank_address = flashcart.CONFIG["start_addr"]
+						selected_bank = bank
+				
+				elif self.MODE == "AGB":
+					if "flash_bank_select_type" in cart_type and cart_type["flash_bank_select_type"] > 0:
+						if bank != current_bank:
+							flashcart.Reset(full_reset=True)
+							flashcart.SelectBankROM(bank)
+							current_bank = bank
+				# ↑↑↑ Switch ROM bank
+				
+				buffer_pos = run[0][2]
+				length = run[-1][2] + run[-1][3] - buffer_pos
+				verified = self.CompareCRC32(buffer=data_import, offset=buffer_pos, length=length, address=bank_address + (buffer_pos % rom_bank_size), flashcart=flashcart, reset=True, mbc=_mbc, bank=bank)
+				if verified is True or len(run) == 1:
+					self.SetProgress({"action":"UPDATE_POS", "pos":buffer_pos + length})
+				if verified is True:
+					continue
+				if len(run) == 1:
+					mismatched.add(run[0][0])
+				else:
+					pending.append(run[len(run) // 2:])
+					pending.append(run[:len(run) // 2])
+			
+			checked = set(segment[0] for segment in segments)
+			update_sectors = []
+			for sector in write_sectors:
+				if sector[0] in checked and sector[0] not in mismatched:
+					dprint("Skipping sector #{:d}, because the CRC32 matched".format(sector_offsets.index(sector[:2])))
+				else:
+					update_sectors.append(sector)
+			dprint("Compared {:d} sector(s) in {:d} run(s)".format(len(checked), len(runs)))
+			
+			# Rough time estimate based on the timings reported by the flash chip
+			cfi = flashcart.CONFIG["cfi"] if "cfi" in flashcart.CONFIG and isinstance(flashcart.CONFIG["cfi"], dict) else {}
+			erase_time = cfi["sector_erase_time_avg"] / 1000 if cfi.get("sector_erase") is True else 0.5
+			if cfi.get("buffer_write") is True and "buffer_size" in cfi:
+				write_speed = cfi["buffer_size"] / (cfi["buffer_write_time_avg"] / 1000000)
+			else:
+				write_speed = 0x10000
+			update_size = sum(min(sector[1], max(0, len(data_import) - sector[0])) for sector in update_sectors if not blank_map.IsBlank(sector[0], sector[1]))
+			time_estimated = len(update_sectors) * erase_time + update_size / write_speed
+			plan_text = "Sectors to update: {:d} of {:d} ({:s}), estimated time: {:s}".format(len(update_sectors), len(write_sectors), Util.formatFileSize(size=update_size), Util.formatProgressTime(time_estimated))
+			dprint(plan_text)
+			if len(update_sectors) == 0:
+				self.SetProgress({"action":"UPDATE_INFO", "text":"The cartridge already contains this ROM, no flash sectors need to be updated.", "abortable":True})
+			elif compare_sectors:
+				self.SetProgress({"action":"UPDATE_INFO", "text":plan_text, "abortable":True})
+			dprint("Update plan:", update_sectors)
+			write_sectors = update_sectors
+			plan_confirmed = True # every skipped sector was compared on the cartridge
+			buffer_pos = 0
+			start_bank = 0
+			start_address = 0
+			end_address = len(data_import)
+			self.SetProgress({"action":"UPDATE_POS", "pos":flash_offset, "force_update":True})
+		# ↑↑↑ Plan sector updates
+
 		for sector in write_sectors:
 			if chip_erase is False:
 				if retry_hp == 0:
@@ -4217,82 +4859,6 @@ class LK_Device(ABC):
 			
 			bank = start_bank
 			
-			# ↓↓↓ Check if data matches already
-			if not chip_erase and self.FW["fw_ver"] >= 12 and "compare_sectors" in args and args["compare_sectors"] is True and not (flashcart and cart_type["command_set"] == "GBAMP"):
-				buffer_pos_matchcheck = buffer_pos
-				verified = False
-				ts_se_start = time.time()
-				while bank < end_bank:
-					status = None
-					# ↓↓↓ Switch ROM bank
-					if self.MODE == "DMG":
-						if _mbc.ResetBeforeBankChange(bank) is True:
-							dprint("Resetting the MBC")
-							self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True)
-						(start_address, bank_size) = _mbc.SelectBankROM(bank)
-						if flashcart.PulseResetAfterWrite():
-							if bank == 0:
-								if self.FW["fw_ver"] < 2:
-									self._write(self.DEVICE_CMD["OFW_GB_CART_MODE"])
-								else:
-									self._write(self.DEVICE_CMD["SET_MODE_DMG"], wait=self.FW["fw_ver"] >= 12)
-								self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True)
-						self._set_fw_variable("DMG_ROM_BANK", bank)
-						
-						buffer_len = min(buffer_len, bank_size)
-						if "start_addr" in flashcart.CONFIG and bank == 0: start_address = flashcart.CONFIG["start_addr"]
-						end_address = start_address + bank_size
-						start_address += (buffer_pos % rom_bank_size)
-						if end_address > start_address + sector[1]:
-							end_address = start_address + sector[1]
-
-					elif self.MODE == "AGB":
-						if "flash_bank_select_type" in cart_type and cart_type["flash_bank_select_type"] > 0:
-							if bank != current_bank:
-								flashcart.Reset(full_reset=True)
-								flashcart.SelectBankROM(bank)
-								temp = end_address - start_address
-								start_address %= cart_type["flash_bank_size"]
-								end_address = min(cart_type["flash_bank_size"], start_address + temp)
-								current_bank = bank
-					# ↑↑↑ Switch ROM bank
-
-					pos = start_address
-					#dprint("pos=0x{:X}, buffer_pos=0x{:X}, start_address=0x{:X}, end_address=0x{:X}".format(pos, buffer_pos_matchcheck, start_address, end_address))
-					verified = self.CompareCRC32(buffer=data_import, offset=buffer_pos_matchcheck, length=end_address - pos, address=pos, flashcart=flashcart, reset=True, mbc=_mbc, bank=bank)
-					self.SetProgress({"action":"UPDATE_POS", "pos":buffer_pos_matchcheck})
-					if verified is not True:
-						break
-					buffer_pos_matchcheck += (end_address - pos)
-					bank += 1
-
-				if verified is True:
-					dprint("Skipping sector #{:d}, because the CRC32 matched".format(sector_pos))
-					if flashcart.FlashCommandsOnBank1(): _mbc.SelectBankROM(bank)
-					self.NO_PROG_UPDATE = True
-					se_ret = flashcart.SectorErase(pos=pos, buffer_pos=buffer_pos, skip=verified)
-					self.NO_PROG_UPDATE = False
-					
-					if self.CANCEL:
-						cancel_args = {"action":"ABORT", "abortable":False}
-						cancel_args.update(self.CANCEL_ARGS)
-						self.CANCEL_ARGS = {}
-						self.ERROR_ARGS = {}
-						self.SetProgress(cancel_args)
-						if self.CanPowerCycleCart(): self.CartPowerCycle()
-						return
-					
-					ts_se_elapsed = time.time() - ts_se_start
-					if se_ret:
-						sector_size = se_ret
-						dprint("Next sector size: 0x{:X}".format(sector_size))
-					buffer_pos += sector_size
-					continue
-				else:
-					verified = False
-					bank = start_bank
-			# ↑↑↑ Check if data matches already
-			
 			while bank < end_bank:
 				if self.CANCEL:
 					cancel_args = {"action":"ABORT", "abortable":False}
@@ -4308,15 +4874,15 @@ class LK_Device(ABC):
 				if self.MODE == "DMG":
 					if _mbc.ResetBeforeBankChange(bank) is True:
 						dprint("Resetting the MBC")
-						self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True)
+						self._write_cmd("DMG_MBC_RESET", wait=True)
 					(start_address, bank_size) = _mbc.SelectBankROM(bank)
 					if flashcart.PulseResetAfterWrite():
 						if bank == 0:
 							if self.FW["fw_ver"] < 2:
-								self._write(self.DEVICE_CMD["OFW_GB_CART_MODE"])
+								self._write_cmd("OFW_GB_CART_MODE")
 							else:
-								self._write(self.DEVICE_CMD["SET_MODE_DMG"], wait=self.FW["fw_ver"] >= 12)
-							self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True)
+								self._write_cmd("SET_MODE_DMG", wait=self.FW["fw_ver"] >= 12)
+							self._write_cmd("DMG_MBC_RESET", wait=True)
 					self._set_fw_variable("DMG_ROM_BANK", bank)
 					
 					buffer_len = min(buffer_len, bank_size)
@@ -4365,7 +4931,8 @@ class LK_Device(ABC):
 							sector_pos += 1
 							if flashcart.FlashCommandsOnBank1(): _mbc.SelectBankROM(bank)
 							self.NO_PROG_UPDATE = True
-							se_ret = flashcart.SectorErase(pos=pos, buffer_pos=buffer_pos, skip=False)
+							# The update plan may skip sectors, so the sector size is taken from the sector map by offset
+							se_ret = flashcart.SectorErase(pos=pos, buffer_pos=buffer_pos, skip=False, sector_size=sector_offsets[sector_pos - 1][1])
 							self.NO_PROG_UPDATE = False
 							if "from_user" in self.CANCEL_ARGS and self.CANCEL_ARGS["from_user"]:
 								continue
@@ -4375,8 +4942,8 @@ class LK_Device(ABC):
 							ts_se_elapsed = time.time() - ts_se_start
 							if se_ret:
 								self.SetProgress({"action":"UPDATE_POS", "pos":buffer_pos, "sector_pos":sector_pos, "sector_erase_time":ts_se_elapsed, "force_update":True})
-								sector_size = se_ret
-								dprint("Next sector size: 0x{:X}".format(sector_size))
+								if sector_pos < len(sector_offsets):
+									dprint("Next sector size: 0x{:X}".format(sector_offsets[sector_pos][1]))
 							skip_init = False
 					# ↑↑↑ Sector erase
 					
@@ -4395,8 +4962,12 @@ class LK_Device(ABC):
 							status = self.WriteROM(address=(pos | (bank << 24)), buffer=data_import[buffer_pos:buffer_pos+buffer_len], flash_buffer_size=flash_buffer_size, skip_init=(skip_init and not self.SKIPPING))
 						elif command_set_type == "DATEL_ORBITV2" and self.FW["fw_ver"] < 12:
 							status = self.WriteROM_DMG_DatelOrbitV2(address=pos, buffer=data_import[buffer_pos:buffer_pos+buffer_len], bank=bank)
+						elif blank_map.IsBlank(buffer_pos, buffer_len):
+							# Erased flash already reads as 0xFF
+							status = None
+							self.SKIPPING = True
 						else:
-							max_buffer_write = self.MAX_BUFFER_WRITE
+							max_buffer_write = self.WRITE_SIZE_CTRL.SIZE
 							if (len(data_import) == 0x1FFFF00) and (buffer_pos+buffer_len > len(data_import)):
 								# 32 MiB ROM + EEPROM cart
 								max_buffer_write = 256
@@ -4453,6 +5024,7 @@ class LK_Device(ABC):
 									self.CANCEL_ARGS.update({"info_type":"msgbox_critical", "info_msg":"An error occured while writing 0x{:X} bytes at position 0x{:X} ({:s}). Please re-connect the device and try again from the beginning.\n\nTroubleshooting advice:\n- Clean cartridge contacts\n- Check soldering if it’s a DIY cartridge\n- Avoid passive USB hubs and try different USB ports/cables\n- Check cartridge type selection\n- Check cartridge ROM storage size (at least {:s} is required){:s}\n- Check cartridge profile used: {:s}{:s}\n- The cartridge may also be incompatible with your “{:s}” device\n\nStatus Register: {:s}".format(buffer_len, buffer_pos, Util.formatFileSize(size=buffer_pos, asInt=False), Util.formatFileSize(size=len(data_import), asInt=False), errmsg_mbc_selection, cart_name, enable_pullup_wr_str, self.GetFullNameLabel(), sr), "abortable":False})
 									continue
 
+							self.WRITE_SIZE_CTRL.Failure()
 							rev_buffer_pos = sector_offsets[sector_pos - 1][0]
 							buffer_pos = rev_buffer_pos
 							bank = start_bank
@@ -4488,6 +5060,7 @@ class LK_Device(ABC):
 							continue
 					
 					skip_init = True
+					self.WRITE_SIZE_CTRL.Success()
 					
 					buffer_pos += buffer_len
 					pos += buffer_len
@@ -4540,6 +5113,7 @@ class LK_Device(ABC):
 				if sector[0] >= len(data_import): break
 
 				verified = False
+				crc32_mismatch = None
 				if self.FW["fw_ver"] >= 10 and not (flashcart and cart_type["command_set"] == "GBAMP"):
 					if self.MODE == "AGB":
 						dprint("Verifying sector:", hex(sector[0]), hex(sector[1]))
@@ -4568,16 +5142,16 @@ class LK_Device(ABC):
 						if self.MODE == "DMG":
 							if _mbc.ResetBeforeBankChange(bank) is True:
 								dprint("Resetting the MBC")
-								self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True)
+								self._write_cmd("DMG_MBC_RESET", wait=True)
 							(start_address, bank_size) = _mbc.SelectBankROM(bank)
 							verify_len = bank_size
 							if flashcart.PulseResetAfterWrite():
 								if bank == 0:
 									if self.FW["fw_ver"] < 2:
-										self._write(self.DEVICE_CMD["OFW_GB_CART_MODE"])
+										self._write_cmd("OFW_GB_CART_MODE")
 									else:
-										self._write(self.DEVICE_CMD["SET_MODE_DMG"], wait=self.FW["fw_ver"] >= 12)
-									self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True)
+										self._write_cmd("SET_MODE_DMG", wait=self.FW["fw_ver"] >= 12)
+									self._write_cmd("DMG_MBC_RESET", wait=True)
 							self._set_fw_variable("DMG_ROM_BANK", bank)
 							
 							buffer_len = min(buffer_len, bank_size)
@@ -4612,6 +5186,7 @@ class LK_Device(ABC):
 							elif verified is not True and len(verified) == 2:
 								crc32_errors += 1
 								dprint("Mismatch during CRC32 verification at 0x{:X}".format(pos_from), "Errors:", crc32_errors)
+								crc32_mismatch = self.FindCRC32Mismatch(buffer=data_import, offset=pos_from, length=verify_len, address=start_address)
 								verified = False
 								break
 
@@ -4623,41 +5198,48 @@ class LK_Device(ABC):
 						bank += 1
 				
 				if not verified:
-					verify_args = copy.copy(args)
-					verify_args.update({"verify_write":data_import[sector[0]:sector[0]+sector[1]], "rom_size":len(data_import), "verify_from":sector[0], "path":"", "rtc_area":flashcart.HasRTC(), "verify_mbc":_mbc})
-					verify_args["verify_base_pos"] = sector[0]
-					verify_args["verify_len"] = len(verify_args["verify_write"])
-					verify_args["rom_size"] = len(verify_args["verify_write"])
-
-					self.NO_PROG_UPDATE = True
-					self.ReadROM(0, 4) # dummy read
-					self.NO_PROG_UPDATE = False
-					start_address = 0
-					end_address = buffer_pos
-
-					verified_size = self._BackupROM(verify_args)
-					if isinstance(verified_size, int): dprint("args[\"verify_len\"]=0x{:X}, verified_size=0x{:X}".format(verify_args["verify_len"], verified_size))
-					if self.CANCEL or self.ERROR:
-						cancel_args = {"action":"ABORT", "abortable":False}
-						cancel_args.update(self.CANCEL_ARGS)
-						self.CANCEL_ARGS = {}
-						self.ERROR_ARGS = {}
-						self.SetProgress(cancel_args)
-						if self.CanPowerCycleCart(): self.CartPowerCycle()
-						verified = False
-						return
-					elif (verified_size is not True) and (verify_args["verify_len"] != verified_size):
-						if verified_size is None:
-							print("{:s}Verification failed! Sector: {:s}{:s}".format(ANSI.RED, str(sector), ANSI.RESET))
+					# Only read back the part that failed the CRC32 check if it could be narrowed down, otherwise the whole sector
+					verify_ranges = [ (sector[0], sector[1]) ]
+					if crc32_mismatch is not None and crc32_mismatch != verify_ranges[0]: verify_ranges.insert(0, crc32_mismatch)
+					for (verify_from, verify_len) in verify_ranges:
+						verify_args = copy.copy(args)
+						verify_args.update({"verify_write":data_import[verify_from:verify_from+verify_len], "rom_size":len(data_import), "verify_from":verify_from, "path":"", "rtc_area":flashcart.HasRTC(), "verify_mbc":_mbc})
+						verify_args["verify_base_pos"] = verify_from
+						verify_args["verify_len"] = len(verify_args["verify_write"])
+						verify_args["rom_size"] = len(verify_args["verify_write"])
+
+						self.NO_PROG_UPDATE = True
+						self.ReadROM(0, 4) # dummy read
+						self.NO_PROG_UPDATE = False
+						start_address = 0
+						end_address = buffer_pos
+
+						verified_size = self._BackupROM(verify_args)
+						if isinstance(verified_size, int): dprint("args[\"verify_len\"]=0x{:X}, verified_size=0x{:X}".format(verify_args["verify_len"], verified_size))
+						if self.CANCEL or self.ERROR:
+							cancel_args = {"action":"ABORT", "abortable":False}
+							cancel_args.update(self.CANCEL_ARGS)
+							self.CANCEL_ARGS = {}
+							self.ERROR_ARGS = {}
+							self.SetProgress(cancel_args)
+							if self.CanPowerCycleCart(): self.CartPowerCycle()
+							verified = False
+							return
+						elif (verified_size is not True) and (verify_args["verify_len"] != verified_size):
+							if verified_size is None:
+								print("{:s}Verification failed! Sector: {:s}{:s}".format(ANSI.RED, str(sector), ANSI.RESET))
+							else:
+								print("{:s}Verification failed at 0x{:X}! Sector: {:s}{:s}".format(ANSI.RED, verify_from+verified_size, str(sector), ANSI.RESET))
+							if sector not in broken_sectors:
+								broken_sectors.append(sector)
+							break
+						elif (verify_from, verify_len) != (sector[0], sector[1]):
+							dprint("No mismatch found by normal reading between 0x{:X} and 0x{:X}, checking the whole sector".format(verify_from, verify_from+verify_len))
 						else:
-							print("{:s}Verification failed at 0x{:X}! Sector: {:s}{:s}".format(ANSI.RED, sector[0]+verified_size, str(sector), ANSI.RESET))
-						if sector not in broken_sectors:
-							broken_sectors.append(sector)
-						continue
-					else:
-						dprint("Verification between 0x{:X} and 0x{:X} successful by normal reading.".format(sector[0], sector[0]+sector[1]))
-						verified = True
+							dprint("Verification between 0x{:X} and 0x{:X} successful by normal reading.".format(sector[0], sector[0]+sector[1]))
+							verified = True
 			
+			if len(verify_sectors) == 0: verified = plan_confirmed # nothing had to be written
 			self.SetProgress({"action":"UPDATE_POS", "pos":len(data_import), "force_update":True})
 			if len(broken_sectors) > 0:
 				self.INFO["broken_sectors"] = broken_sectors
@@ -4673,18 +5255,44 @@ class LK_Device(ABC):
 				verified = False
 		# ↑↑↑ Flash verify
 
-		if delta_state_new is not None and not chip_erase and not "broken_sectors" in self.INFO:
-			try:
-				with open(json_file, "wb") as f:
-					f.write(json.dumps(delta_state_new).encode("UTF-8-SIG"))
-			except PermissionError:
-				print("Error: Couldn’t update write-protected file “{:s}”".format(json_file))
+		# ↓↓↓ Update delta flashing state
+		if delta_state_key is not None:
+			if "verify_write" in args and args["verify_write"] is True and not "broken_sectors" in self.INFO and "photo_mode" not in args:
+				if delta_state_old is None or chip_erase:
+					delta_state_new = { "sectors":{} }
+				else:
+					delta_state_new = delta_state_old
+				if flash_offset > 0 and not chip_erase:
+					# Batteryless SRAM data isn’t tracked
+					for sector in write_sectors:
+						delta_state_new["sectors"].pop(sector[0], None)
+				else:
+					if chip_erase or not ("flash_sectors" in args and len(args["flash_sectors"]) > 0):
+						updated_sectors = sector_offsets
+					else:
+						updated_sectors = write_sectors
+					for sector in updated_sectors:
+						if sector[0] >= len(data_import): break
+						delta_state_new["sectors"][sector[0]] = [ sector[1], zlib.crc32(data_import[sector[0]:sector[0]+sector[1]]) & 0xFFFFFFFF ]
+						if sector[0] == 0:
+							fp_address = flashcart.CONFIG["start_addr"] if self.MODE == "DMG" and "start_addr" in flashcart.CONFIG else 0
+							fp_length = min(0x200, len(data_import), sector[1])
+							delta_state_new["fingerprint"] = [ fp_address, fp_length, zlib.crc32(data_import[:fp_length]) & 0xFFFFFFFF ]
+				if "fingerprint" in delta_state_new:
+					Util.SetDeltaState(delta_state_key, delta_state_new)
+				else:
+					Util.SetDeltaState(delta_state_key, None)
+			else:
+				Util.SetDeltaState(delta_state_key, None)
+		# ↑↑↑ Update delta flashing state
 		
+		SaveEraseTimes()
+
 		# ↓↓↓ Switch to first ROM bank
 		if self.MODE == "DMG":
 			if _mbc.ResetBeforeBankChange(0) is True:
 				dprint("Resetting the MBC")
-				self._write(self.DEVICE_CMD["DMG_MBC_RESET"], wait=True)
+				self._write_cmd("DMG_MBC_RESET", wait=True)
 			_mbc.SelectBankROM(0)
 			self._set_fw_variable("DMG_ROM_BANK", 0)
 		elif self.MODE == "AGB":
@@ -4728,12 +5336,20 @@ class LK_Device(ABC):
 				dprint("args:", temp)
 				del(temp)
 				self.NO_PROG_UPDATE = False
+				if self.READ_SIZE_CTRL is None or self.TRANSFER_SIZES_KEY != self._get_transfer_size_key():
+					self.LoadTransferSizes()
+				self.WRITE_CHUNKS = 0
+				self.WRITE_TIME_HOST = 0
+				self.WRITE_TIME_DEVICE = 0
 				if args['mode'] == 1: ret = self._BackupROM(args)
 				elif args['mode'] == 2: ret = self._BackupRestoreRAM(args)
 				elif args['mode'] == 3: ret = self._BackupRestoreRAM(args)
 				elif args['mode'] == 4: ret = self._FlashROM(args)
 				elif args['mode'] == 5: ret = self._DetectCartridge(args)
 				elif args['mode'] == 0xFF: self.Debug()
+				dprint("Firmware variable cache:", self.GetFirmwareVariableStats())
+				if self.WRITE_CHUNKS > 0: dprint("Flash write timing:", self.GetWriteTimingStats())
+				self.SaveTransferSizes()
 				if self.FW is None: return False
 				if self.FW["fw_ver"] >= 2 and self.FW["pcb_name"] == "GBxCart RW":
 					if ret is True:
@@ -131,12 +131,7 @@ class DMG_MBC:
 		return 32*1024
 
 	def CalcChecksum(self, buffer):
-		chk = 0
-		for i in range(0, len(buffer), 2):
-			if i != 0x14E:
-				chk = chk + buffer[i + 1]
-				chk = chk + buffer[i]
-		return chk & 0xFFFF
+		return Util.CalcChecksumGlobalDMG(buffer)
 
 	def EnableMapper(self):
 		return True
@@ -659,15 +654,8 @@ class DMG_MMM01(DMG_MBC):
 		return "MMM01"
 	
 	def CalcChecksum(self, buffer):
-		chk = 0
-		temp_data = buffer[0:-0x8000]
-		temp_menu = buffer[-0x8000:]
-		temp_dump = temp_menu + temp_data
-		for i in range(0, len(temp_dump), 2):
-			if i != 0x14E:
-				chk = chk + temp_dump[i + 1]
-				chk = chk + temp_dump[i]
-		return chk & 0xFFFF
+		# The menu in the last 32 KiB holds the header; summing is order-independent so no reordering is needed
+		return Util.CalcChecksumGlobalDMG(buffer, header_offset=max(0, len(buffer) - 0x8000))
 
 	def ResetBeforeBankChange(self, index):
 		return ((index % 0x20) == 0)
@@ -2,7 +2,7 @@
 # FlashGBX
 # Author: Lesserkuma (github.com/lesserkuma)
 
-import hashlib, re, zlib, string, os, json, copy, struct
+import hashlib, re, zlib, string, copy, struct
 from . import Util
 
 try:
@@ -204,22 +204,20 @@ class RomFileAGB:
 	def GetDatabaseEntry(self):
 		data = self.DATA
 		db_entry = None
-		if os.path.exists("{0:s}/db_AGB.json".format(Util.CONFIG_PATH)):
-			with open("{0:s}/db_AGB.json".format(Util.CONFIG_PATH), encoding="UTF-8") as f:
-				db = f.read()
-				db = json.loads(db)
-				if data["header_sha1"] in db.keys():
-					db_entry = db[data["header_sha1"]]
-					if db_entry["gc"] in ("ZMAJ", "ZMBJ", "ZMDE"):
-						db_entry["gc"] = "AGS-{:s}".format(db_entry["gc"])
-					elif db_entry["gc"] == "ZBBJ":
-						db_entry["gc"] = "NTR-{:s}".format(db_entry["gc"])
-					elif db_entry["gc"] == "PEAJ":
-						db_entry["gc"] = "PEC-{:s}".format(db_entry["gc"])
-					elif db_entry["gc"] in ("PSAJ", "PSAE"):
-						db_entry["gc"] = "PES-{:s}".format(db_entry["gc"])
-					else:
-						db_entry["gc"] = "AGB-{:s}".format(db_entry["gc"])
+		db = Util.GetGameDatabase("AGB")
+		if db is not None:
+			if data["header_sha1"] in db:
+				db_entry = copy.deepcopy(db[data["header_sha1"]])
+				if db_entry["gc"] in ("ZMAJ", "ZMBJ", "ZMDE"):
+					db_entry["gc"] = "AGS-{:s}".format(db_entry["gc"])
+				elif db_entry["gc"] == "ZBBJ":
+					db_entry["gc"] = "NTR-{:s}".format(db_entry["gc"])
+				elif db_entry["gc"] == "PEAJ":
+					db_entry["gc"] = "PEC-{:s}".format(db_entry["gc"])
+				elif db_entry["gc"] in ("PSAJ", "PSAE"):
+					db_entry["gc"] = "PES-{:s}".format(db_entry["gc"])
+				else:
+					db_entry["gc"] = "AGB-{:s}".format(db_entry["gc"])
 		else:
 			print("FAIL: Database for Game Boy Advance titles not found at {0:s}/db_AGB.json".format(Util.CONFIG_PATH))
 		return db_entry
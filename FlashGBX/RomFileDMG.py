@@ -2,7 +2,7 @@
 # FlashGBX
 # Author: Lesserkuma (github.com/lesserkuma)
 
-import hashlib, re, string, struct, os, json, copy
+import hashlib, re, string, struct, copy
 from . import Util
 
 try:
@@ -40,17 +40,10 @@ class RomFileDMG:
 		return checksum
 	
 	def CalcChecksumGlobal(self, fix=False):
-		temp1 = self.ROMFILE[0x14E]
-		temp2 = self.ROMFILE[0x14F]
-		self.ROMFILE[0x14E] = 0
-		self.ROMFILE[0x14F] = 0
-		checksum = sum(self.ROMFILE) & 0xFFFF
+		checksum = Util.CalcChecksumGlobalDMG(self.ROMFILE)
 		if fix:
 			self.ROMFILE[0x14E] = checksum >> 8
 			self.ROMFILE[0x14F] = checksum & 0xFF
-		else:
-			self.ROMFILE[0x14E] = temp1
-			self.ROMFILE[0x14F] = temp2
 		return checksum
 	
 	def FixHeader(self):
@@ -456,12 +449,10 @@ class RomFileDMG:
 	def GetDatabaseEntry(self):
 		data = self.DATA
 		db_entry = None
-		if os.path.exists("{0:s}/db_DMG.json".format(Util.CONFIG_PATH)):
-			with open("{0:s}/db_DMG.json".format(Util.CONFIG_PATH), encoding="UTF-8") as f:
-				db = f.read()
-				db = json.loads(db)
-				if data["header_sha1"] in db.keys():
-					db_entry = db[data["header_sha1"]]
+		db = Util.GetGameDatabase("DMG")
+		if db is not None:
+			if data["header_sha1"] in db:
+				db_entry = copy.deepcopy(db[data["header_sha1"]])
 		else:
 			print("FAIL: Database for Game Boy titles not found at {0:s}/db_DMG.json".format(Util.CONFIG_PATH))
 		return db_entry
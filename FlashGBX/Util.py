@@ -2,7 +2,7 @@
 # FlashGBX
 # Author: Lesserkuma (github.com/lesserkuma)
 
-import math, time, datetime, copy, configparser, threading, os, platform, traceback, io, struct, re, statistics, random, sys
+import math, time, datetime, copy, configparser, threading, os, platform, traceback, io, struct, re, statistics, random, sys, collections, queue, zlib, hashlib, json, mmap, bisect
 from io import StringIO
 from enum import Enum
 
@@ -12,9 +12,12 @@ VERSION_PEP440 = "4.4"
 VERSION = "v{:s}".format(VERSION_PEP440)
 VERSION_TIMESTAMP = 1748007939
 DEBUG = False
-DEBUG_LOG = []
+DEBUG_LOG = collections.deque(maxlen=64*1024)
 APP_PATH = ""
 CONFIG_PATH = ""
+GAME_DB = {}
+DETECT_CACHE_TTL = 7 * 24 * 60 * 60
+STATE_FILE_LOCK = threading.RLock() # guards read-modify-write cycles of the JSON state files in the config directory
 
 AGB_Header_ROM_Sizes = [ "32 KiB", "64 KiB", "128 KiB", "256 KiB", "512 KiB", "1 MiB", "2 MiB", "4 MiB", "8 MiB", "16 MiB", "32 MiB", "64 MiB", "128 MiB", "256 MiB", "512 MiB" ]
 AGB_Header_ROM_Sizes_Map = [ 0x8000, 0x10000, 0x20000, 0x40000, 0x80000, 0x100000, 0x200000, 0x400000, 0x800000, 0x1000000, 0x2000000, 0x4000000, 0x8000000, 0x10000000, 0x20000000 ]
@@ -124,6 +127,8 @@ class Progress():
 	WAITER = None
 	
 	def __init__(self, updater, waiter):
+		self.MUTEX = threading.Lock()
+		self.PROGRESS = {}
 		self.UPDATER = updater
 		self.WAITER = waiter
 	
@@ -287,7 +292,241 @@ class Progress():
 		finally:
 			self.MUTEX.release()
 
+class TransferSizeController():
+	# Halves the transfer size on errors and doubles it again after a streak of clean transfers
+	SIZE = 0
+	MIN_SIZE = 0x40
+	MAX_SIZE = 0
+	STREAK = 0
+	STREAK_GOAL = 32
+
+	def __init__(self, size, max_size, min_size=0x40, streak_goal=32):
+		self.MAX_SIZE = max_size
+		self.MIN_SIZE = min(min_size, max_size)
+		self.SIZE = max(self.MIN_SIZE, min(size, max_size))
+		self.STREAK = 0
+		self.STREAK_GOAL = streak_goal
+	
+	def Success(self):
+		self.STREAK += 1
+		if self.STREAK >= self.STREAK_GOAL and self.SIZE < self.MAX_SIZE:
+			self.SIZE = min(self.MAX_SIZE, self.SIZE << 1)
+			self.STREAK = 0
+			dprint("Transfer size increased to 0x{:X}".format(self.SIZE))
+		return self.SIZE
+	
+	def Failure(self, size=None):
+		if size is None: size = self.SIZE
+		self.SIZE = max(self.MIN_SIZE, min(self.SIZE, size) >> 1)
+		self.STREAK = 0
+		dprint("Transfer size decreased to 0x{:X}".format(self.SIZE))
+		return self.SIZE
+
+class Digester():
+	# Calculates all file hashes on a worker thread while the data is still being transferred
+	QUEUE = None
+	THREAD = None
+	CRC32 = 0
+	HASHES = None
+	SIZE = 0
+
+	def __init__(self):
+		self.QUEUE = queue.Queue(maxsize=256)
+		self.CRC32 = 0
+		self.HASHES = { "sha1":hashlib.sha1(), "sha256":hashlib.sha256(), "md5":hashlib.md5() }
+		self.SIZE = 0
+		self.THREAD = threading.Thread(target=self._run, daemon=True)
+		self.THREAD.start()
+	
+	def _run(self):
+		while True:
+			data = self.QUEUE.get()
+			if data is None: break
+			self.CRC32 = zlib.crc32(data, self.CRC32)
+			for h in self.HASHES.values():
+				h.update(data)
+	
+	def Update(self, data):
+		self.SIZE += len(data)
+		self.QUEUE.put(data)
+	
+	def Finish(self):
+		if self.THREAD.is_alive():
+			self.QUEUE.put(None)
+			self.THREAD.join()
+		return {
+			"crc32":self.CRC32 & 0xFFFFFFFF,
+			"sha1":self.HASHES["sha1"].hexdigest(),
+			"sha256":self.HASHES["sha256"].hexdigest(),
+			"md5":self.HASHES["md5"].hexdigest(),
+		}
+
+	
+class BlankMap():
+	# Map of all chunks of a buffer that only contain 0xFF bytes
+	CHUNK_SIZE = 0x200
+	SIZE = 0
+	MAP = None
+
+	def __init__(self, buffer, chunk_size=0x200):
+		self.CHUNK_SIZE = chunk_size
+		self.SIZE = len(buffer)
+		self.MAP = bytearray(math.ceil(self.SIZE / chunk_size))
+		view = memoryview(buffer) if not isinstance(buffer, RomImage) else buffer
+		blank = bytes([0xFF] * chunk_size)
+		for i in range(0, self.SIZE // chunk_size):
+			if view[i*chunk_size:(i+1)*chunk_size] == blank: self.MAP[i] = 1
+		if self.SIZE % chunk_size > 0:
+			self.MAP[-1] = view[(len(self.MAP)-1)*chunk_size:] == blank[:self.SIZE % chunk_size]
+		if isinstance(view, memoryview): view.release()
+	
+	def IsBlank(self, offset, length):
+		start = offset // self.CHUNK_SIZE
+		end = min(len(self.MAP), math.ceil((offset + length) / self.CHUNK_SIZE))
+		return self.MAP.find(0, start, end) == -1
+	
+	def GetRanges(self):
+		ranges = []
+		for i in range(0, len(self.MAP)):
+			if not self.MAP[i]: continue
+			if len(ranges) > 0 and ranges[-1][1] == i * self.CHUNK_SIZE:
+				ranges[-1][1] = min(self.SIZE, (i + 1) * self.CHUNK_SIZE)
+			else:
+				ranges.append([ i * self.CHUNK_SIZE, min(self.SIZE, (i + 1) * self.CHUNK_SIZE) ])
+		return ranges
+
+class RomImage():
+	# Read-only view of ROM data that is assembled from file contents and padding on access,
+	# so large files don’t need to be copied in memory for every layout transformation
+	SEGMENTS = None
+	OFFSETS = None
+	PATCHES = None
+	SIZE = 0
+	MMAP = None
+
+	def __init__(self, source=None, path=None):
+		self.SEGMENTS = []
+		self.PATCHES = []
+		self.SIZE = 0
+		self.MMAP = None
+		if path is not None:
+			with open(path, "rb") as f:
+				try:
+					source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+					self.MMAP = source
+				except ValueError: # empty file
+					source = b""
+		if source is not None and len(source) > 0:
+			self.SEGMENTS.append([ 0, len(source), source, 0 ])
+			self.SIZE = len(source)
+		self._update()
+	
+	def __enter__(self):
+		return self
+	
+	def __exit__(self, *args):
+		self.close()
 	
+	def close(self):
+		# Releases the memory mapped file, which otherwise stays locked on Windows
+		if self.MMAP is not None:
+			self.MMAP.close()
+			self.MMAP = None
+	
+	def _update(self):
+		self.OFFSETS = [ s[0] for s in self.SEGMENTS ]
+	
+	def __len__(self):
+		return self.SIZE
+	
+	def __getitem__(self, key):
+		if isinstance(key, int):
+			if key < 0: key += self.SIZE
+			if key < 0 or key >= self.SIZE: raise IndexError("RomImage index out of range")
+			return self[key:key+1][0]
+		(start, stop, step) = key.indices(self.SIZE)
+		if step != 1: raise ValueError("RomImage doesn’t support extended slices")
+		if stop <= start: return bytearray()
+		data = bytearray()
+		i = bisect.bisect_right(self.OFFSETS, start) - 1
+		pos = start
+		while pos < stop:
+			(s_from, s_len, s_source, s_offset) = self.SEGMENTS[i]
+			length = min(stop, s_from + s_len) - pos
+			if isinstance(s_source, int):
+				data += bytes([s_source]) * length
+			else:
+				chunk = s_source[s_offset + pos - s_from:s_offset + pos - s_from + length]
+				data += chunk
+				if len(chunk) < length: data += bytes([0xFF]) * (length - len(chunk))
+			pos += length
+			i += 1
+		for (p_from, p_data) in self.PATCHES:
+			p_to = p_from + len(p_data)
+			if p_to <= start or p_from >= stop: continue
+			data[max(p_from, start) - start:min(p_to, stop) - start] = p_data[max(p_from, start) - p_from:min(p_to, stop) - p_from]
+		return data
+	
+	def __setitem__(self, key, value):
+		(start, stop, _) = key.indices(self.SIZE)
+		if len(value) != stop - start: raise ValueError("RomImage patches can’t change the size")
+		self.PATCHES.append((start, bytes(value)))
+	
+	def Append(self, length, fill=0xFF):
+		if length <= 0: return
+		self.SEGMENTS.append([ self.SIZE, length, fill, 0 ])
+		self.SIZE += length
+		self._update()
+	
+	def Prepend(self, length, fill=0xFF):
+		if length <= 0: return
+		for segment in self.SEGMENTS: segment[0] += length
+		self.SEGMENTS.insert(0, [ 0, length, fill, 0 ])
+		self.PATCHES = [ (p_from + length, p_data) for (p_from, p_data) in self.PATCHES ]
+		self.SIZE += length
+		self._update()
+	
+	def Truncate(self, length):
+		if length >= self.SIZE: return
+		segments = []
+		for segment in self.SEGMENTS:
+			if segment[0] >= length: break
+			segment[1] = min(segment[1], length - segment[0])
+			segments.append(segment)
+		self.SEGMENTS = segments
+		self.PATCHES = [ (p_from, p_data[:length - p_from]) for (p_from, p_data) in self.PATCHES if p_from < length ]
+		self.SIZE = length
+		self._update()
+	
+	def Interleave(self, size, block_size, offset, fill=0xFF):
+		# Spreads the data into blocks of block_size at the given offset within every block of 2*block_size
+		source = RomImage()
+		source.SEGMENTS = self.SEGMENTS
+		source.PATCHES = self.PATCHES
+		source.SIZE = self.SIZE
+		source._update()
+		self.SEGMENTS = []
+		self.PATCHES = []
+		pos = 0
+		for i in range(0, size // (block_size * 2)):
+			for (s_from, s_len, s_source) in ((0, offset, fill), (offset, block_size, source), (offset + block_size, block_size * 2 - offset - block_size, fill)):
+				if s_len <= 0: continue
+				if s_source is source:
+					self.SEGMENTS.append([ pos, s_len, source, i * block_size ])
+				else:
+					self.SEGMENTS.append([ pos, s_len, fill, 0 ])
+				pos += s_len
+		self.SIZE = pos
+		self._update()
+	
+	def find(self, sub, window=0x100000):
+		pos = 0
+		while pos < self.SIZE:
+			found = self[pos:pos+window+len(sub)-1].find(sub)
+			if found >= 0: return pos + found
+			pos += window
+		return -1
+
 class TAMA5_CMD(Enum):
 	RAM_WRITE = 0x0
 	RAM_READ = 0x1
@@ -402,6 +641,16 @@ def bitswap(n, s):
 		n ^= (1 << q)
 	return n
 
+def CalcChecksumGlobalDMG(buffer, header_offset=0):
+	# Sum of all bytes except the global checksum field itself
+	chk = sum(buffer)
+	if len(buffer) >= header_offset + 0x150:
+		chk -= buffer[header_offset + 0x14E] + buffer[header_offset + 0x14F]
+	return chk & 0xFFFF
+
+def IsBlank(data, value=0xFF):
+	return data.count(value) == len(data)
+
 def DecodeBCD(value):
 	return (((value) & 0x0F) + (((value) >> 4) * 10))
 def EncodeBCD(value):
@@ -894,6 +1143,220 @@ def GenerateFileName(mode, header, settings=None):
 	
 	return path
 
+def GetGameDatabase(mode):
+	# Parsed once per process; reloaded only if the file on disk changes
+	path = "{0:s}/db_{1:s}.json".format(CONFIG_PATH, mode)
+	try:
+		stat = os.stat(path)
+	except OSError:
+		return None
+	key = (path, stat.st_mtime_ns, stat.st_size)
+	if mode not in GAME_DB or GAME_DB[mode][0] != key:
+		dprint("Loading game database from {:s}".format(path))
+		with open(path, encoding="UTF-8") as f:
+			GAME_DB[mode] = (key, json.load(f))
+	return GAME_DB[mode][1]
+
+def GetDeltaStateKey(mode, flash_id, cfi, sector_offsets):
+	# Identifies a flash cartridge model by its flash ID, CFI data and sector layout
+	h = hashlib.sha1()
+	h.update(mode.encode("ASCII"))
+	h.update(bytes(flash_id) if flash_id is not None else b"")
+	h.update(json.dumps(cfi, sort_keys=True, default=list).encode("UTF-8"))
+	h.update(json.dumps([ s[:2] for s in sector_offsets ]).encode("UTF-8"))
+	return h.hexdigest()
+
+def _delta_state_checksum(entry):
+	return zlib.crc32(json.dumps([ entry["fingerprint"], entry["sectors"] ], sort_keys=True).encode("UTF-8")) & 0xFFFFFFFF
+
+def _load_state_file(name):
+	try:
+		with open(CONFIG_PATH + "/" + name, "rb") as f:
+			data = json.loads(f.read().decode("UTF-8-SIG"))
+		if not isinstance(data, dict): return {}
+		return data
+	except (OSError, ValueError):
+		return {}
+
+def _save_state_file(name, data):
+	# Written to a temporary file first, so readers never see a partially written file
+	path = CONFIG_PATH + "/" + name
+	path_temp = "{:s}.{:d}.tmp".format(path, os.getpid())
+	try:
+		with open(path_temp, "wb") as f:
+			f.write(json.dumps(data).encode("UTF-8-SIG"))
+		os.replace(path_temp, path)
+		return True
+	except OSError:
+		try:
+			os.remove(path_temp)
+		except OSError:
+			pass
+		return False
+
+def LoadDeltaStates():
+	with STATE_FILE_LOCK:
+		return _load_state_file("delta_state.json")
+
+def GetDeltaState(key):
+	with STATE_FILE_LOCK:
+		states = LoadDeltaStates()
+		if key not in states: return None
+		entry = states[key]
+		try:
+			if entry["checksum"] != _delta_state_checksum(entry): raise ValueError
+			return { "fingerprint":entry["fingerprint"], "sectors":{ int(k):v for (k, v) in entry["sectors"].items() } }
+		except (KeyError, TypeError, ValueError, AttributeError):
+			dprint("Discarding corrupt delta flashing state:", key)
+			SetDeltaState(key, None)
+			return None
+
+def SetDeltaState(key, entry, max_entries=64):
+	with STATE_FILE_LOCK:
+		states = LoadDeltaStates()
+		if entry is None:
+			if key not in states: return
+			del(states[key])
+		else:
+			entry = { "fingerprint":entry["fingerprint"], "sectors":{ str(k):v for (k, v) in entry["sectors"].items() }, "time":int(time.time()) }
+			entry["checksum"] = _delta_state_checksum(entry)
+			states[key] = entry
+			if len(states) > max_entries:
+				for k in sorted(states, key=lambda k: states[k].get("time", 0) if isinstance(states[k], dict) else 0)[:len(states) - max_entries]:
+					del(states[k])
+		if not _save_state_file("delta_state.json", states):
+			print("Error: Couldn’t update the delta flashing state file in “{:s}”".format(CONFIG_PATH))
+
+def LoadEraseTimes():
+	with STATE_FILE_LOCK:
+		return _load_state_file("erase_times.json")
+
+def SaveEraseTimes(times):
+	with STATE_FILE_LOCK:
+		if not _save_state_file("erase_times.json", times):
+			print("Error: Couldn’t update the erase times file in “{:s}”".format(CONFIG_PATH))
+
+def GetTransferSizes(key):
+	with STATE_FILE_LOCK:
+		sizes = _load_state_file("transfer_sizes.json").get(key)
+	try:
+		(read_size, write_size) = [ int(x) for x in sizes ]
+		return (read_size, write_size)
+	except (TypeError, ValueError):
+		return None
+
+def SetTransferSizes(key, sizes):
+	with STATE_FILE_LOCK:
+		entries = _load_state_file("transfer_sizes.json")
+		entries[key] = list(sizes)
+		if not _save_state_file("transfer_sizes.json", entries):
+			print("Error: Couldn’t update the transfer sizes file in “{:s}”".format(CONFIG_PATH))
+
+def GetDetectionCacheKey(mode, device, header, options, cart_names):
+	# Cheap fingerprint of the inserted cartridge and everything else the detection result depends on
+	h = hashlib.sha1()
+	h.update(mode.encode("ASCII"))
+	h.update(json.dumps([ device, options ], sort_keys=True, default=str).encode("UTF-8"))
+	h.update(bytes(header))
+	h.update(json.dumps(cart_names).encode("UTF-8"))
+	return h.hexdigest()
+
+def LoadDetectionCache():
+	with STATE_FILE_LOCK:
+		return _load_state_file("detect_cache.json")
+
+def GetDetectionCache(key, max_age=DETECT_CACHE_TTL):
+	with STATE_FILE_LOCK:
+		cache = LoadDetectionCache()
+		if key not in cache: return None
+		entry = cache[key]
+		if not isinstance(entry, dict) or not isinstance(entry.get("time"), int) or (time.time() - entry["time"]) > max_age:
+			dprint("Discarding expired detection cache entry:", key)
+			SetDetectionCache(key, None)
+			return None
+		return entry
+
+def SetDetectionCache(key, entry, max_entries=256):
+	with STATE_FILE_LOCK:
+		cache = LoadDetectionCache()
+		if entry is None:
+			if key not in cache: return
+			del(cache[key])
+		else:
+			entry = dict(entry)
+			entry["time"] = int(time.time())
+			cache[key] = entry
+			if len(cache) > max_entries:
+				for k in sorted(cache, key=lambda k: cache[k].get("time", 0) if isinstance(cache[k], dict) else 0)[:len(cache) - max_entries]:
+					del(cache[k])
+		if not _save_state_file("detect_cache.json", cache):
+			print("Error: Couldn’t update the detection cache file in “{:s}”".format(CONFIG_PATH))
+
+def ClearDetectionCache():
+	with STATE_FILE_LOCK:
+		try:
+			os.remove(CONFIG_PATH + "/detect_cache.json")
+		except OSError:
+			pass
+
+def _port_sort_key(port):
+	# Natural sort order, so that COM2 comes before COM10
+	return [ int(t) if t.isdigit() else t.lower() for t in re.split(r"(\d+)", str(port)) ]
+
+def ProbeDevices(hw_devices, flashcarts=None, port=None, max_baud=2000000, timeout=10):
+	# Probes all candidate ports at the same time; device types sharing a port are tried in order
+	candidates = {}
+	for hw_index in range(0, len(hw_devices)):
+		if port is not None:
+			hw_ports = [ port ]
+		else:
+			hw_ports = hw_devices[hw_index].GbxDevice().GetCandidatePorts()
+		for hw_port in hw_ports:
+			if hw_port not in candidates: candidates[hw_port] = []
+			candidates[hw_port].append(hw_index)
+	
+	found = []
+	messages = []
+	lock = threading.Lock()
+	state = { "expired":False }
+	def probe(hw_port, hw_indices):
+		for hw_index in hw_indices:
+			dev = hw_devices[hw_index].GbxDevice()
+			try:
+				ret = dev.Initialize(flashcarts, port=hw_port, max_baud=max_baud)
+			except Exception:
+				dprint("Error while probing port {:s}:\n{:s}".format(hw_port, traceback.format_exc()))
+				continue
+			with lock:
+				if isinstance(ret, list):
+					for msg in ret:
+						messages.append((hw_index, hw_port, msg))
+				if ret is not False and dev.IsConnected() and dev.CheckActive() is not False:
+					if state["expired"]:
+						dprint("Ignoring device on port {:s} found after the deadline".format(hw_port))
+						dev.Close()
+					else:
+						found.append((hw_index, hw_port, dev))
+					return
+	
+	threads = []
+	for (hw_port, hw_indices) in candidates.items():
+		thread = threading.Thread(target=probe, args=(hw_port, hw_indices), daemon=True)
+		thread.start()
+		threads.append(thread)
+	deadline = time.time() + timeout
+	for thread in threads:
+		thread.join(max(0, deadline - time.time()))
+	with lock:
+		state["expired"] = True
+		found.sort(key=lambda x: (x[0], _port_sort_key(x[1])))
+		messages.sort(key=lambda x: (x[0], _port_sort_key(x[1])))
+		ret_messages = []
+		for (_, _, msg) in messages:
+			if msg not in ret_messages: ret_messages.append(msg)
+		dprint("Found {:d} device(s) on {:d} port(s) in {:.2f}s".format(len(found), len(candidates), time.time() - deadline + timeout))
+		return ([ x[2] for x in found ], ret_messages)
+
 def compare_mbc(a, b):
 	for v in DMG_Mapper_Types.values():
 		if a in v and b in v: return True
@@ -948,32 +1411,41 @@ def bitmap2pixmap(data, scale_factor=4):
 		return False
 
 def dprint(*args, **kwargs):
-	stack = traceback.extract_stack()
-	stack = stack[len(stack)-2]
+	if not DEBUG: return
+	_add_debug_record(args, sys._getframe(1))
 
-	msg = "[{:s}] [{:s}:{:d}] {:s}(): {:s}".format(datetime.datetime.now().astimezone().replace(microsecond=0).isoformat(), os.path.split(stack.filename)[1], stack.lineno, stack.name, " ".join(map(str, args)), **kwargs)
-	DEBUG_LOG.append(msg)
-	if len(DEBUG_LOG) > 64*1024: DEBUG_LOG.pop(0)
+def _add_debug_record(args, frame):
+	# Only capture what is needed to render the message later on
+	args = tuple(a if isinstance(a, (str, int, float, bool, type(None))) else str(a) for a in args)
+	record = (time.time(), frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name, args)
+	DEBUG_LOG.append(record)
 	if DEBUG:
-		msg = "{:s}{:s}".format(ANSI.CLEAR_LINE, msg)
+		msg = "{:s}{:s}".format(ANSI.CLEAR_LINE, format_debug_record(record))
 		print(msg)
 
+def format_debug_record(record):
+	(timestamp, filename, lineno, name, args) = record
+	return "[{:s}] [{:s}:{:d}] {:s}(): {:s}".format(datetime.datetime.fromtimestamp(timestamp).astimezone().replace(microsecond=0).isoformat(), os.path.split(filename)[1], lineno, name, " ".join(map(str, args)))
+
 def write_debug_log(device=False):
-	dprint("{:s} version: {:s} ({:d})".format(APPNAME, VERSION_PEP440, VERSION_TIMESTAMP))
-	dprint("Platform: {:s}".format(platform.platform()))
+	# Always recorded, so the log file identifies the setup even if debug mode is off
+	header = [ "{:s} version: {:s} ({:d})".format(APPNAME, VERSION_PEP440, VERSION_TIMESTAMP), "Platform: {:s}".format(platform.platform()) ]
 	if device is not False:
 		if device is not None:
-			dprint("Connected device: {:s}".format(device))
+			header.append("Connected device: {:s}".format(device))
 		else:
-			dprint("No device connected")
-	dprint("Now writing debug log file")
+			header.append("No device connected")
+	header.append("Now writing debug log file")
+	for line in header:
+		_add_debug_record((line,), sys._getframe(0))
 	try:
 		fn = CONFIG_PATH + "/debug.log"
+		log = [ format_debug_record(record) for record in list(DEBUG_LOG) ]
 		with open(fn, "wb") as f:
 			if platform.system() == "Windows":
-				f.write("\r\n".join(DEBUG_LOG).encode("UTF-8-SIG"))
+				f.write("\r\n".join(log).encode("UTF-8-SIG"))
 			else:
-				f.write("\n".join(DEBUG_LOG).encode("UTF-8-SIG"))
+				f.write("\n".join(log).encode("UTF-8-SIG"))
 			print("debug.log written")
 		return True
 	except:
@@ -11,9 +11,10 @@ class GbxDevice(LK_Device):
 	DEVICE_MAX_FW = 12
 	DEVICE_LATEST_FW_TS = { 5:1747991884, 10:1747991884, 11:1747991884, 12:1747991884, 13:1747991884 }
 	PCB_VERSIONS = { 5:'', 12:'v1.2', 13:'v1.3' }
+	DEVICE_USB_IDS = [ (0x1A86, 0x7523) ]
 	
 	def __init__(self):
-		pass
+		super().__init__()
 	
 	def Initialize(self, flashcarts, port=None, max_baud=2000000):
 		if self.IsConnected(): self.DEVICE.close()
@@ -22,10 +23,7 @@ class GbxDevice(LK_Device):
 		if port is not None:
 			ports = [ port ]
 		else:
-			comports = serial.tools.list_ports.comports()
-			for i in range(0, len(comports)):
-				if comports[i].vid == 0x1A86 and comports[i].pid == 0x7523:
-					ports.append(comports[i].device)
+			ports = self.GetCandidatePorts()
 			if len(ports) == 0: return False
 		
 		for i in range(0, len(ports)):
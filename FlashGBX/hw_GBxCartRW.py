@@ -11,6 +11,7 @@ class GbxDevice(LK_Device):
 	DEVICE_MAX_FW = 1
 	DEVICE_LATEST_FW_TS = { 4:1709317610, 5:1747991884, 6:1747991884, 2:0, 90:0, 100:0 }
 	PCB_VERSIONS = { 5:'v1.4', 6:'v1.4a/b/c', 2:'v1.1/v1.2', 4:'v1.3', 90:'XMAS v1.0', 100:'Mini v1.0' }
+	DEVICE_USB_IDS = [ (0x1A86, 0x7523) ]
 	BAUDRATE = 1000000
 	MAX_BUFFER_READ = 0x1000
 	MAX_BUFFER_WRITE = 0x400
@@ -24,10 +25,7 @@ class GbxDevice(LK_Device):
 		if port is not None:
 			ports = [ port ]
 		else:
-			comports = serial.tools.list_ports.comports()
-			for i in range(0, len(comports)):
-				if comports[i].vid == 0x1A86 and comports[i].pid == 0x7523:
-					ports.append(comports[i].device)
+			ports = self.GetCandidatePorts()
 			if len(ports) == 0: return False
 		
 		for i in range(0, len(ports)):
@@ -303,7 +301,7 @@ class GbxDevice(LK_Device):
 
 	def ResetLEDs(self):
 		if self.DEVICE in (None, False): return
-		self._write(self.DEVICE_CMD["OFW_CART_MODE"]) # Reset LEDs
+		self._write_cmd("OFW_CART_MODE") # Reset LEDs
 		self._read(1)
 	
 	def SupportsBootloaderReset(self):
@@ -11,9 +11,10 @@ class GbxDevice(LK_Device):
 	DEVICE_MAX_FW = 12
 	DEVICE_LATEST_FW_TS = 1747991884
 	PCB_VERSIONS = { -1:"", 0x01:"V2", 0x81:"V2", 0x02:"V2C", 0x82:"V2C", 0x03:"V2CC", 0x83:"V2CC/V2++" }
+	DEVICE_USB_IDS = [ (0x483, 0x5740) ]
 	
 	def __init__(self):
-		pass
+		super().__init__()
 	
 	def Initialize(self, flashcarts, port=None, max_baud=2000000):
 		if self.IsConnected(): self.DEVICE.close()
@@ -22,10 +23,7 @@ class GbxDevice(LK_Device):
 		if port is not None:
 			ports = [ port ]
 		else:
-			comports = serial.tools.list_ports.comports()
-			for i in range(0, len(comports)):
-				if comports[i].vid == 0x483 and comports[i].pid == 0x5740:
-					ports.append(comports[i].device)
+			ports = self.GetCandidatePorts()
 			if len(ports) == 0: return False
 		
 		for i in range(0, len(ports)):
@@ -298,7 +296,7 @@ class GbxDevice(LK_Device):
 			try:
 				if cartPowerOff and self.CanPowerCycleCart():
 					self._set_fw_variable("AUTO_POWEROFF_TIME", 0)
-					self._write(self.DEVICE_CMD["CART_PWR_OFF"], wait=self.FW["fw_ver"] >= 12)
+					self._write_cmd("CART_PWR_OFF", wait=self.FW["fw_ver"] >= 12)
 				else:
 					self._write(self.DEVICE_CMD["SET_VOLTAGE_3_3V"], wait=self.FW["fw_ver"] >= 12)
 				self.DEVICE.write(b'KL') # Disable LK firmware